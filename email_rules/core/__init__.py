@@ -1,3 +1,9 @@
+from email_rules.core.batch import (
+    EmailBatch,
+    EmailColumn,
+    create_mask,
+    iterate_mask_indices,
+)
 from email_rules.core.type_defs import (
     INBOX,
     Email,
@@ -8,11 +14,15 @@ from email_rules.core.type_defs import (
     EmailSubject,
     EmailTag,
     EmailTo,
+    NormalizedEmail,
+    RuntimeEmailState,
 )
 
 __all__ = (
     "Email",
     "EmailAddress",
+    "EmailBatch",
+    "EmailColumn",
     "EmailFolder",
     "EmailFrom",
     "EmailState",
@@ -20,4 +30,8 @@ __all__ = (
     "EmailTag",
     "EmailTo",
     "INBOX",
+    "NormalizedEmail",
+    "RuntimeEmailState",
+    "create_mask",
+    "iterate_mask_indices",
 )
@@ -0,0 +1,315 @@
+import weakref
+from functools import cache, cached_property
+from itertools import count
+from pathlib import PurePath
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    NewType,
+    Self,
+    SupportsIndex,
+    TypeVar,
+    overload,
+)
+
+from pydantic import BaseModel, ConfigDict
+
+T = TypeVar("T")
+
+# Content versions are never reused, so a value computed at one version is never mistaken for a later one
+_content_versions = count(1)
+_set_slot = object.__setattr__
+_SCALAR_TYPES = (str, bytes, int, float, PurePath)
+
+_TrackedParents = weakref.ref[Any] | list[weakref.ref[Any]] | None
+
+
+@cache
+def _get_cached_property_names(cls: type[BaseModel]) -> tuple[str, ...]:
+    return tuple(
+        name for klass in cls.__mro__ for name, value in vars(klass).items() if isinstance(value, cached_property)
+    )
+
+
+# Cached properties are derived from the fields, so they are dropped whenever a field is reassigned or the model is
+# copied (model_copy would otherwise carry them over) or pickled. Changes made inside a mutable field are only detected
+# for a TrackedModel.
+class CachedPropertiesModel(BaseModel):
+    def clear_cached_properties(self) -> None:
+        for name in _get_cached_property_names(type(self)):
+            self.__dict__.pop(name, None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        self.clear_cached_properties()
+
+    def __copy__(self) -> Self:
+        copied = super().__copy__()
+        copied.clear_cached_properties()
+        return copied
+
+    def __deepcopy__(self, memo: dict[int, Any] | None = None) -> Self:
+        copied = super().__deepcopy__(memo)
+        copied.clear_cached_properties()
+        return copied
+
+    def __getstate__(self) -> dict[Any, Any]:
+        # Cached properties can hold compiled closures, which cannot be pickled, and are recomputed after unpickling
+        state = super().__getstate__()
+        cached_property_names = _get_cached_property_names(type(self))
+        state["__dict__"] = {
+            name: value for name, value in state["__dict__"].items() if name not in cached_property_names
+        }
+        return state
+
+
+def get_content_version(tracked: object) -> int:
+    # Changes whenever the model or list, or anything it contains, is modified in place
+    return getattr(tracked, "_content_version", 0)
+
+
+def _add_tracked_parent(tracked: "TrackedModel | TrackedList[Any]", parent: "TrackedModel | TrackedList[Any]") -> None:
+    # Parents are weakly referenced, as a filter can be shared by many rules that are discarded independently. Most
+    # models only have one parent, which is stored as is rather than in a list. References to discarded parents are
+    # dropped whenever the number of parents doubles.
+    parents: _TrackedParents = getattr(tracked, "_tracked_parents", None)
+    parent_reference = weakref.ref(parent)
+    if parents is None:
+        _set_slot(tracked, "_tracked_parents", parent_reference)
+    elif isinstance(parents, weakref.ref):
+        if parents is not parent_reference:
+            _set_slot(tracked, "_tracked_parents", [parents, parent_reference])
+    else:
+        parents.append(parent_reference)
+        if len(parents) >= 8 and len(parents) & (len(parents) - 1) == 0:
+            parents[:] = [reference for reference in parents if reference() is not None]
+
+
+def _iterate_tracked_parents(tracked: object) -> Iterator[Any]:
+    parents: _TrackedParents = getattr(tracked, "_tracked_parents", None)
+    parent_references = (parents,) if isinstance(parents, weakref.ref) else parents or ()
+    for parent_reference in parent_references:
+        parent = parent_reference()
+        if parent is not None:
+            yield parent
+
+
+def mark_content_changed(tracked: "TrackedModel | TrackedList[Any]") -> None:
+    # Gives the model or list and everything containing it a new content version, and drops their cached properties.
+    # Models and lists that do not contain it keep their versions, so their compiled forms stay cached.
+    content_version = next(_content_versions)
+    pending: list[Any] = [tracked]
+    while pending:
+        current = pending.pop()
+        if get_content_version(current) == content_version:
+            # Reached through another parent
+            continue
+        _set_slot(current, "_content_version", content_version)
+        if isinstance(current, BaseModel):
+            for name in _get_cached_property_names(type(current)):
+                current.__dict__.pop(name, None)
+        pending.extend(_iterate_tracked_parents(current))
+
+
+def _is_scalar_annotation(annotation: Any) -> bool:
+    while isinstance(annotation, NewType):
+        annotation = annotation.__supertype__
+    return isinstance(annotation, type) and issubclass(annotation, _SCALAR_TYPES)
+
+
+@cache
+def _get_tracked_field_names(cls: type[BaseModel]) -> tuple[str, ...]:
+    # Fields annotated with a scalar type, like the values of most filters and email fields, can never hold a model or
+    # a list
+    return tuple(
+        name for name, field_info in cls.__pydantic_fields__.items() if not _is_scalar_annotation(field_info.annotation)
+    )
+
+
+# Looked up by type, as isinstance checks against models go through ABCMeta, which is slow for the strings making up
+# most fields
+_is_tracked_model_by_type: dict[type[object], bool] = {}
+
+
+def _is_tracked_model(value: object) -> bool:
+    cls = type(value)
+    is_tracked_model = _is_tracked_model_by_type.get(cls)
+    if is_tracked_model is None:
+        is_tracked_model = _is_tracked_model_by_type[cls] = issubclass(cls, TrackedModel)
+    return is_tracked_model
+
+
+def create_tracked_list(values: Iterable[T]) -> "TrackedList[T]":
+    tracked_list = TrackedList(values)
+    tracked_list._track_items(tracked_list)
+    return tracked_list
+
+
+class TrackedList(list[T]):
+    # Marks the content as changed whenever the list is modified in place, items added to it are tracked by it. Lists
+    # should be created with create_tracked_list, which tracks the initial items.
+    __slots__ = ("_content_version", "_tracked_parents", "__weakref__")
+
+    def _track_items(self, values: Iterable[T]) -> None:
+        for value in values:
+            if _is_tracked_model(value):
+                _add_tracked_parent(value, self)  # type: ignore[arg-type]
+
+    def append(self, value: T) -> None:
+        super().append(value)
+        self._track_items((value,))
+        mark_content_changed(self)
+
+    def extend(self, values: Iterable[T]) -> None:
+        values = list(values)
+        super().extend(values)
+        self._track_items(values)
+        mark_content_changed(self)
+
+    def insert(self, index: SupportsIndex, value: T) -> None:
+        super().insert(index, value)
+        self._track_items((value,))
+        mark_content_changed(self)
+
+    def pop(self, index: SupportsIndex = -1) -> T:
+        value = super().pop(index)
+        mark_content_changed(self)
+        return value
+
+    def remove(self, value: T) -> None:
+        super().remove(value)
+        mark_content_changed(self)
+
+    def clear(self) -> None:
+        super().clear()
+        mark_content_changed(self)
+
+    def sort(self, *args: Any, **kwargs: Any) -> None:
+        super().sort(*args, **kwargs)
+        mark_content_changed(self)
+
+    def reverse(self) -> None:
+        super().reverse()
+        mark_content_changed(self)
+
+    @overload
+    def __setitem__(self, index: SupportsIndex, value: T) -> None: ...
+
+    @overload
+    def __setitem__(self, index: slice, value: Iterable[T]) -> None: ...
+
+    def __setitem__(self, index: Any, value: Any) -> None:
+        if isinstance(index, slice):
+            value = list(value)
+            super().__setitem__(index, value)
+            self._track_items(value)
+        else:
+            super().__setitem__(index, value)
+            self._track_items((value,))
+        mark_content_changed(self)
+
+    def __delitem__(self, index: SupportsIndex | slice) -> None:
+        super().__delitem__(index)
+        mark_content_changed(self)
+
+    def __iadd__(self, values: Iterable[T]) -> Self:  # type: ignore[override,misc]
+        values = list(values)
+        super().__iadd__(values)
+        self._track_items(values)
+        mark_content_changed(self)
+        return self
+
+    def __imul__(self, count: SupportsIndex) -> Self:
+        super().__imul__(count)
+        mark_content_changed(self)
+        return self
+
+    def __reduce__(self) -> tuple[Callable[[list[T]], "TrackedList[T]"], tuple[list[T]]]:
+        # Copies and unpickled lists are created in one go rather than appended to, and are tracked by the model they
+        # belong to once it is copied or unpickled
+        return create_tracked_list, (list(self),)
+
+
+class tracked_cached_property(cached_property[T]):
+    # Same as cached_property, but computed again once the content version of the model changed since it was computed,
+    # i.e. once anything the model contains was modified in place. Stores the content version along with the value,
+    # and is a data descriptor so that it is always looked up.
+    @overload
+    def __get__(self, instance: None, owner: type[Any] | None = None) -> Self: ...
+
+    @overload
+    def __get__(self, instance: object, owner: type[Any] | None = None) -> T: ...
+
+    def __get__(self, instance: object | None, owner: type[Any] | None = None) -> "T | Self":
+        if instance is None:
+            return self
+        assert self.attrname is not None, "Should be assigned to a class attribute"
+        content_version = get_content_version(instance)
+        cached = instance.__dict__.get(self.attrname)
+        if cached is None or cached[0] != content_version:
+            cached = (content_version, self.func(instance))
+            instance.__dict__[self.attrname] = cached
+        return cached[1]
+
+    def __set__(self, instance: object, value: T) -> None:
+        assert self.attrname is not None, "Should be assigned to a class attribute"
+        instance.__dict__[self.attrname] = (get_content_version(instance), value)
+
+
+# Any in place modification of the model, of the lists in its fields or of the tracked models they contain marks the
+# content of the model and of every tracked model containing it as changed. Each model keeps weak references to the
+# models and lists containing it, which are set up whenever it is assigned to a field or added to a list of one.
+class TrackedModel(BaseModel):
+    __slots__ = ("_content_version", "_tracked_parents")
+    model_config = ConfigDict(ignored_types=(tracked_cached_property,))
+
+    def model_post_init(self, context: Any) -> None:
+        self._track_fields()
+
+    def _track_fields(self) -> None:
+        # Only called for new models, including copies and unpickled models
+        _set_slot(self, "_content_version", 0)
+        _set_slot(self, "_tracked_parents", None)
+        for name in _get_tracked_field_names(type(self)):
+            self._track_field(name)
+
+    def _track_field(self, name: str) -> None:
+        # Lists are replaced by tracked lists
+        value: Any = self.__dict__.get(name)
+        if isinstance(value, list):
+            if not isinstance(value, TrackedList):
+                value = self.__dict__[name] = create_tracked_list(value)
+        elif not _is_tracked_model(value):
+            return
+        _add_tracked_parent(value, self)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in type(self).__pydantic_fields__:
+            self._track_field(name)
+        mark_content_changed(self)
+
+    def __copy__(self) -> Self:
+        copied = super().__copy__()
+        copied._track_fields()
+        return copied
+
+    def __deepcopy__(self, memo: dict[int, Any] | None = None) -> Self:
+        copied = super().__deepcopy__(memo)
+        copied._track_fields()
+        return copied
+
+    def __setstate__(self, state: dict[Any, Any]) -> None:
+        super().__setstate__(state)
+        self._track_fields()
+
+    def model_copy(self, *, update: Mapping[str, Any] | None = None, deep: bool = False) -> Self:
+        # The updated fields are set without __setattr__
+        copied = super().model_copy(update=update, deep=deep)
+        for name in update or ():
+            if name in type(copied).__pydantic_fields__:
+                copied._track_field(name)
+        return copied
@@ -0,0 +1,106 @@
+from functools import cached_property
+from typing import Callable, Collection, Generic, Hashable, Iterable, Sequence, TypeVar
+
+from email_rules.core._cached_properties import CachedPropertiesModel
+from email_rules.core.type_defs import (
+    Email,
+    EmailAddress,
+    EmailFrom,
+    EmailSubject,
+    EmailTo,
+)
+
+T = TypeVar("T", bound=Hashable)
+U = TypeVar("U", bound=Hashable)
+
+
+def create_mask(indices: Iterable[int], size: int) -> int:
+    # Bit i of the mask is set when the email at index i is selected
+    mask_bytes = bytearray((size + 7) // 8)
+    for index in indices:
+        mask_bytes[index >> 3] |= 1 << (index & 7)
+    return int.from_bytes(mask_bytes, "little")
+
+
+def iterate_mask_indices(mask: int) -> Iterable[int]:
+    # Goes through the bytes rather than shifting the mask, which would copy it for every set bit
+    mask_bytes = mask.to_bytes((mask.bit_length() + 7) // 8, "little")
+    for byte_index, mask_byte in enumerate(mask_bytes):
+        if not mask_byte:
+            continue
+        for bit in range(8):
+            if mask_byte >> bit & 1:
+                yield byte_index * 8 + bit
+
+
+class EmailColumn(Generic[T]):
+    # One entry per email, each entry holds all of the values of that email e.g. every recipient
+    def __init__(self, entries: Sequence[Collection[T]]) -> None:
+        self.entries = entries
+
+    @staticmethod
+    def from_values(values: Iterable[T]) -> "EmailColumn[T]":
+        return EmailColumn([(value,) for value in values])
+
+    @cached_property
+    def indices_by_value(self) -> dict[T, list[int]]:
+        indices_by_value: dict[T, list[int]] = {}
+        for index, entry in enumerate(self.entries):
+            for value in entry:
+                indices = indices_by_value.setdefault(value, [])
+                # Entries can repeat a value, the index should only be added once
+                if not indices or indices[-1] != index:
+                    indices.append(index)
+        return indices_by_value
+
+    def map_values(self, map_value: Callable[[T], U]) -> "EmailColumn[U]":
+        # Each distinct value is only mapped once
+        mapped_values = {value: map_value(value) for value in self.indices_by_value}
+        return EmailColumn([tuple(mapped_values[value] for value in entry) for entry in self.entries])
+
+    def get_eq_mask(self, value: T) -> int:
+        return create_mask(self.indices_by_value.get(value, ()), len(self.entries))
+
+    def get_mask_where(self, predicate: Callable[[T], bool]) -> int:
+        # Only the distinct values are checked, which is where repeated subjects and senders pay off
+        return create_mask(
+            (index for value, indices in self.indices_by_value.items() if predicate(value) for index in indices),
+            len(self.entries),
+        )
+
+
+# Columnar view of a list of emails, filters evaluated against it return a bitmask of the matching emails. The
+# normalized columns match NormalizedEmail, but only normalize the distinct values rather than every email.
+class EmailBatch(CachedPropertiesModel):
+    # Any sequence, so that the emails of a batch built from columns can be created only when a custom filter needs them
+    emails: Sequence[Email]
+
+    def get_full_mask(self) -> int:
+        return (1 << len(self.emails)) - 1
+
+    def get_emails_in_mask(self, mask: int) -> list[Email]:
+        return [self.emails[index] for index in iterate_mask_indices(mask)]
+
+    @cached_property
+    def email_from(self) -> EmailColumn[EmailFrom]:
+        return EmailColumn.from_values(email.email_from for email in self.emails)
+
+    @cached_property
+    def email_to(self) -> EmailColumn[EmailTo]:
+        return EmailColumn([email.email_to for email in self.emails])
+
+    @cached_property
+    def email_subject(self) -> EmailColumn[EmailSubject]:
+        return EmailColumn.from_values(email.email_subject for email in self.emails)
+
+    @cached_property
+    def normalized_email_from(self) -> EmailColumn[EmailFrom]:
+        return self.email_from.map_values(lambda value: EmailFrom(EmailAddress(value.lower())))
+
+    @cached_property
+    def normalized_email_to(self) -> EmailColumn[EmailTo]:
+        return self.email_to.map_values(lambda value: EmailTo(EmailAddress(value.lower())))
+
+    @cached_property
+    def normalized_email_subject(self) -> EmailColumn[EmailSubject]:
+        return self.email_subject.map_values(lambda value: EmailSubject(value.lower()))
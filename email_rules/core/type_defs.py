@@ -1,7 +1,10 @@
+from functools import cached_property
 from pathlib import PurePosixPath
-from typing import NewType, Self
+from typing import NamedTuple, NewType, Self
 
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
+
+from email_rules.core._cached_properties import CachedPropertiesModel, TrackedModel
 
 EmailSubject = NewType("EmailSubject", str)
 EmailAddress = NewType("EmailAddress", str)
@@ -16,21 +19,62 @@ EmailFolder = NewType("EmailFolder", PurePosixPath)
 INBOX = EmailFolder(PurePosixPath("inbox"))
 
 
-class Email(BaseModel):
+# Tracked so that the normalized email is recomputed once the recipients are modified in place
+class Email(CachedPropertiesModel, TrackedModel):
     email_from: EmailFrom
     email_to: list[EmailTo]
     email_subject: EmailSubject
 
+    @cached_property
+    def normalized(self) -> "NormalizedEmail":
+        # Computed once per email and shared by every case insensitive filter
+        return NormalizedEmail.from_email(self)
+
+
+class NormalizedEmail(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    email_from: EmailFrom
+    email_to: frozenset[EmailTo]
+    email_subject: EmailSubject
+
+    @classmethod
+    def from_email(cls, email: Email) -> Self:
+        # The fields are already validated on the email
+        return cls.model_construct(
+            email_from=EmailFrom(EmailAddress(email.email_from.lower())),
+            email_to=frozenset(EmailTo(EmailAddress(email_to.lower())) for email_to in email.email_to),
+            email_subject=EmailSubject(email.email_subject.lower()),
+        )
 
+
+# Immutable so that a state history can share states between steps, actions return an updated copy instead
 class EmailState(BaseModel):
-    tags: set[EmailTag]
+    model_config = ConfigDict(frozen=True)
+
+    tags: frozenset[EmailTag]
     current_folder: EmailFolder
     is_read: bool
 
     @classmethod
     def create_initial_state(cls) -> Self:
         return cls(
-            tags=set(),
+            tags=frozenset(),
             current_folder=INBOX,
             is_read=False,
         )
+
+
+# Used by the engine in place of EmailState while applying actions, creating a tuple skips the validation and copying
+# of a pydantic model. Converted from and to EmailState once per email at the API boundary.
+class RuntimeEmailState(NamedTuple):
+    tags: frozenset[EmailTag]
+    current_folder: EmailFolder
+    is_read: bool
+
+    @staticmethod
+    def from_email_state(email_state: EmailState) -> "RuntimeEmailState":
+        return RuntimeEmailState(email_state.tags, email_state.current_folder, email_state.is_read)
+
+    def to_email_state(self) -> EmailState:
+        return EmailState(tags=self.tags, current_folder=self.current_folder, is_read=self.is_read)
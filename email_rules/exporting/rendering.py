@@ -1,5 +1,6 @@
 from itertools import chain
 from pathlib import Path
+from typing import Callable, TypeVar
 
 from email_rules.exporting.templates import Templates
 from email_rules.exporting.type_defs import (
@@ -14,6 +15,7 @@ from email_rules.exporting.type_defs import (
 )
 from email_rules.rules import (
     AggregatedRuleFilter,
+    ConstantRuleFilter,
     NegatedRuleFilter,
     Rule,
     RuleAction,
@@ -23,10 +25,13 @@ from email_rules.rules import (
     RuleActionStopProcessingAllFiles,
     RuleActionStopProcessingCurrentFile,
     RuleFilter,
+    RuleFilterProfile,
     RuleFromEq,
     RuleSubjectContains,
     RuleSubjectEq,
     RuleToEq,
+    get_optimized_filter_expr,
+    reorder_rule_filter,
 )
 from email_rules.rules._base_filters import (
     GenericRuleTextContains,
@@ -34,8 +39,31 @@ from email_rules.rules._base_filters import (
     GenericRuleTextListContains,
 )
 
+T = TypeVar("T")
+
 
 class SieveRenderer:
+    def __init__(self, rule_filter_profile: RuleFilterProfile | None = None) -> None:
+        # Orders anyof/allof arguments the same way as the compiled filters when given
+        self.rule_filter_profile = rule_filter_profile
+        # Set while an optimized filter is rendered, so that its nested filters are not optimized again
+        self._is_rule_filter_optimized = False
+
+    def optimize_rule_filter(self, rule_filter: RuleFilter) -> RuleFilter:
+        rule_filter = rule_filter.simplify()
+        if self.rule_filter_profile is None:
+            return rule_filter
+        return reorder_rule_filter(rule_filter, self.rule_filter_profile)
+
+    def _call_with_optimized_rule_filter(self, method: Callable[[RuleFilter], T], rule_filter: RuleFilter) -> T:
+        # The method recurses through the nested filters of the optimized filter, which are already optimized
+        was_rule_filter_optimized = self._is_rule_filter_optimized
+        self._is_rule_filter_optimized = True
+        try:
+            return method(rule_filter)
+        finally:
+            self._is_rule_filter_optimized = was_rule_filter_optimized
+
     def render_rule_action(self, rule_action: RuleAction) -> RenderedRuleAction:
         if type(rule_action) is RuleActionAddTag:
             return RenderedRuleAction(
@@ -73,6 +101,14 @@ class SieveRenderer:
         return RenderedExtensions(f"require [{deps_as_str}];")
 
     def render_rule_filter(self, rule_filter: RuleFilter) -> RenderedRuleFilter:
+        # Filters are optimized once, along with all of their nested filters
+        if not self._is_rule_filter_optimized:
+            return self._call_with_optimized_rule_filter(
+                self.render_rule_filter, self.optimize_rule_filter(rule_filter)
+            )
+        if type(rule_filter) is ConstantRuleFilter:
+            return RenderedRuleFilter("true" if rule_filter.value else "false")
+
         if type(rule_filter) is AggregatedRuleFilter and rule_filter.is_operator_and():
             return RenderedRuleFilter(
                 Templates.FILTER_COMBINE_AND_OR(
@@ -149,12 +185,22 @@ class SieveRenderer:
         return RenderedRule(
             Templates.EMAIL_RULE(
                 comment=rule.comment,
-                condition=self.render_rule_filter(rule.filter_expr),
+                condition=self._call_with_optimized_rule_filter(
+                    self.render_rule_filter, get_optimized_filter_expr(rule, self.rule_filter_profile)
+                ),
                 actions=[self.render_rule_action(action) for action in rule.actions],
             ).render()
         )
 
     def get_rule_filter_extensions(self, rule_filter: RuleFilter) -> list[SieveExtension]:
+        if not self._is_rule_filter_optimized:
+            return self._call_with_optimized_rule_filter(
+                self.get_rule_filter_extensions, self.optimize_rule_filter(rule_filter)
+            )
+
+        if type(rule_filter) is ConstantRuleFilter:
+            return []
+
         if type(rule_filter) is AggregatedRuleFilter:
             return list(chain(*[self.get_rule_filter_extensions(arg) for arg in rule_filter.args]))
 
@@ -186,7 +232,11 @@ class SieveRenderer:
 
     def get_rule_extension_requirements(self, rule: Rule) -> list[SieveExtension]:
         extensions = []
-        extensions.extend(self.get_rule_filter_extensions(rule.filter_expr))
+        extensions.extend(
+            self._call_with_optimized_rule_filter(
+                self.get_rule_filter_extensions, get_optimized_filter_expr(rule, self.rule_filter_profile)
+            )
+        )
         for action in rule.actions:
             extensions.extend(self.get_rule_action_extensions(action))
         return extensions
@@ -0,0 +1,84 @@
+from email_rules.ingestion.corpus import (
+    CORPUS_MAGIC,
+    CorpusEmailBatch,
+    CorpusEmails,
+    EmailCorpus,
+    write_email_corpus,
+)
+from email_rules.ingestion.headers import (
+    HEADER_CACHE_SIZE,
+    HeaderData,
+    decode_header_value,
+    extract_email,
+    find_header_block_end,
+    parse_address_list,
+    parse_email_headers,
+)
+from email_rules.ingestion.maildir import (
+    DEFAULT_MAX_WORKERS,
+    DEFAULT_READ_SIZE,
+    MAILDIR_SUBDIRECTORIES,
+    iterate_maildir_emails,
+    iterate_maildir_paths,
+    read_header_block,
+    read_maildir_email,
+)
+from email_rules.ingestion.mbox import (
+    iterate_mbox_emails,
+    iterate_mbox_header_blocks,
+    iterate_mbox_message_spans,
+)
+from email_rules.ingestion.records import (
+    DEFAULT_CSV_RECIPIENT_SEPARATOR,
+    DEFAULT_VALIDATION_CHUNK_SIZE,
+    RECORD_FIELD_NAMES,
+    EmailRecord,
+    create_trusted_email,
+    iterate_csv_emails,
+    iterate_csv_records,
+    iterate_emails_from_records,
+    iterate_jsonl_emails,
+    iterate_jsonl_records,
+    validate_email_records,
+)
+
+__all__ = (
+    # corpus.py
+    "CORPUS_MAGIC",
+    "CorpusEmailBatch",
+    "CorpusEmails",
+    "EmailCorpus",
+    "write_email_corpus",
+    # headers.py
+    "HEADER_CACHE_SIZE",
+    "HeaderData",
+    "decode_header_value",
+    "extract_email",
+    "find_header_block_end",
+    "parse_address_list",
+    "parse_email_headers",
+    # maildir.py
+    "DEFAULT_MAX_WORKERS",
+    "DEFAULT_READ_SIZE",
+    "MAILDIR_SUBDIRECTORIES",
+    "iterate_maildir_emails",
+    "iterate_maildir_paths",
+    "read_header_block",
+    "read_maildir_email",
+    # mbox.py
+    "iterate_mbox_emails",
+    "iterate_mbox_header_blocks",
+    "iterate_mbox_message_spans",
+    # records.py
+    "DEFAULT_CSV_RECIPIENT_SEPARATOR",
+    "DEFAULT_VALIDATION_CHUNK_SIZE",
+    "RECORD_FIELD_NAMES",
+    "EmailRecord",
+    "create_trusted_email",
+    "iterate_csv_emails",
+    "iterate_csv_records",
+    "iterate_emails_from_records",
+    "iterate_jsonl_emails",
+    "iterate_jsonl_records",
+    "validate_email_records",
+)
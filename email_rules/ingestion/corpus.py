@@ -0,0 +1,264 @@
+import mmap
+import os
+import sys
+from array import array
+from functools import cached_property
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Iterable, Iterator, Self, Sequence, overload
+
+from pydantic import ConfigDict
+
+from email_rules.core import (
+    Email,
+    EmailAddress,
+    EmailBatch,
+    EmailColumn,
+    EmailFrom,
+    EmailSubject,
+    EmailTo,
+)
+
+# File layout, every number is an unsigned little endian 64 bit integer:
+#   magic, email count, recipient count
+#   sender offsets (email count + 1), sender blob
+#   subject offsets (email count + 1), subject blob
+#   first recipient of each email (email count + 1), recipient offsets (recipient count + 1), recipient blob
+# Blobs hold the UTF-8 encoded strings back to back and are padded to a multiple of 8 bytes, so every offset array is
+# aligned. String i of a column is blob[offsets[i]:offsets[i + 1]].
+CORPUS_MAGIC = b"EMLCORP1"
+_ITEM_SIZE = 8
+_HEADER_SIZE = len(CORPUS_MAGIC) + 2 * _ITEM_SIZE
+
+
+def _to_little_endian(values: "array[int]") -> "array[int]":
+    if sys.byteorder != "little":
+        values = array("Q", values)
+        values.byteswap()
+    return values
+
+
+class _StringColumnWriter:
+    def __init__(self) -> None:
+        self.offsets = array("Q", [0])
+        self.blob = bytearray()
+
+    def append(self, value: str) -> None:
+        self.blob += value.encode()
+        self.offsets.append(len(self.blob))
+
+    def write(self, corpus_file: Any) -> None:
+        corpus_file.write(_to_little_endian(self.offsets).tobytes())
+        corpus_file.write(self.blob)
+        corpus_file.write(bytes(-len(self.blob) % _ITEM_SIZE))
+
+
+def write_email_corpus(path: Path, emails: Iterable[Email]) -> int:
+    # Returns the number of emails written. The columns are built in memory before the file is written.
+    email_from = _StringColumnWriter()
+    email_subject = _StringColumnWriter()
+    email_to = _StringColumnWriter()
+    first_recipient_indices = array("Q", [0])
+    for email in emails:
+        email_from.append(email.email_from)
+        email_subject.append(email.email_subject)
+        for recipient in email.email_to:
+            email_to.append(recipient)
+        first_recipient_indices.append(len(email_to.offsets) - 1)
+
+    email_count = len(first_recipient_indices) - 1
+    with path.open("wb") as corpus_file:
+        corpus_file.write(CORPUS_MAGIC)
+        corpus_file.write(_to_little_endian(array("Q", [email_count, len(email_to.offsets) - 1])).tobytes())
+        email_from.write(corpus_file)
+        email_subject.write(corpus_file)
+        corpus_file.write(_to_little_endian(first_recipient_indices).tobytes())
+        email_to.write(corpus_file)
+    return email_count
+
+
+def _read_integer(corpus_data: mmap.mmap, position: int) -> int:
+    end = position + _ITEM_SIZE
+    return int.from_bytes(corpus_data[position:end], "little")
+
+
+def _get_column_end(corpus_data: mmap.mmap, position: int, count: int) -> int:
+    # End of the string column starting at position, past the end of the data when the file is truncated
+    offsets_end = position + (count + 1) * _ITEM_SIZE
+    if offsets_end > len(corpus_data):
+        return offsets_end
+    blob_size = _read_integer(corpus_data, offsets_end - _ITEM_SIZE)
+    return offsets_end + blob_size + (-blob_size % _ITEM_SIZE)
+
+
+def _is_email_corpus(corpus_data: mmap.mmap) -> bool:
+    # Checks that every column fits in the data before any of them is read
+    if len(corpus_data) < _HEADER_SIZE or corpus_data[: len(CORPUS_MAGIC)] != CORPUS_MAGIC:
+        return False
+    email_count = _read_integer(corpus_data, len(CORPUS_MAGIC))
+    recipient_count = _read_integer(corpus_data, len(CORPUS_MAGIC) + _ITEM_SIZE)
+    email_from_end = _get_column_end(corpus_data, _HEADER_SIZE, email_count)
+    if email_from_end > len(corpus_data):
+        return False
+    email_subject_end = _get_column_end(corpus_data, email_from_end, email_count)
+    first_recipients_end = email_subject_end + (email_count + 1) * _ITEM_SIZE
+    if first_recipients_end > len(corpus_data):
+        return False
+    return _get_column_end(corpus_data, first_recipients_end, recipient_count) <= len(corpus_data)
+
+
+class _StringColumnReader:
+    def __init__(self, data: memoryview, position: int, count: int) -> None:
+        offsets_end = position + (count + 1) * _ITEM_SIZE
+        self.offsets = _read_integers(data, position, offsets_end)
+        blob_end = offsets_end + self.offsets[-1]
+        self.blob = data[offsets_end:blob_end]
+        self.end = blob_end + (-self.offsets[-1] % _ITEM_SIZE)
+
+    def __getitem__(self, index: int) -> str:
+        start = self.offsets[index]
+        end = self.offsets[index + 1]
+        return str(self.blob[start:end], "utf-8")
+
+
+def _read_integers(data: memoryview, start: int, end: int) -> Sequence[int]:
+    if sys.byteorder == "little":
+        # Reads the integers straight from the mapped file
+        return data[start:end].cast("Q")
+    values = array("Q", data[start:end])
+    values.byteswap()
+    return values
+
+
+class CorpusEmails(Sequence[Email]):
+    # The emails of a corpus, each email is only created when it is accessed
+    def __init__(self, corpus: "EmailCorpus", start: int = 0, stop: int | None = None) -> None:
+        self.corpus = corpus
+        self.start = start
+        self.stop = len(corpus) if stop is None else stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    @overload
+    def __getitem__(self, index: int) -> Email: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "CorpusEmails": ...
+
+    def __getitem__(self, index: int | slice) -> "Email | CorpusEmails":
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            assert step == 1, "Only contiguous slices are supported"
+            return CorpusEmails(self.corpus, self.start + start, self.start + max(start, stop))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.corpus.get_email(self.start + index)
+
+
+class CorpusEmailBatch(EmailBatch):
+    # The columns are read from the corpus, so no emails are created unless a custom filter asks for them
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    emails: CorpusEmails
+
+    @cached_property
+    def email_from(self) -> EmailColumn[EmailFrom]:
+        return EmailColumn.from_values(self.emails.corpus.iterate_email_from(self.emails.start, self.emails.stop))
+
+    @cached_property
+    def email_to(self) -> EmailColumn[EmailTo]:
+        return EmailColumn(list(self.emails.corpus.iterate_email_to(self.emails.start, self.emails.stop)))
+
+    @cached_property
+    def email_subject(self) -> EmailColumn[EmailSubject]:
+        return EmailColumn.from_values(self.emails.corpus.iterate_email_subject(self.emails.start, self.emails.stop))
+
+
+# Read only view of a file written by write_email_corpus. Opening only maps the file, the strings are decoded when they
+# are accessed.
+class EmailCorpus:
+    def __init__(self, path: Path) -> None:
+        with path.open("rb") as corpus_file:
+            # Empty files cannot be mapped
+            if os.fstat(corpus_file.fileno()).st_size < _HEADER_SIZE:
+                raise ValueError(f"Not an email corpus: {path}")
+            self._mmap = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if not _is_email_corpus(self._mmap):
+            self._mmap.close()
+            raise ValueError(f"Not an email corpus: {path}")
+
+        data = memoryview(self._mmap)
+        email_count, recipient_count = _read_integers(data, len(CORPUS_MAGIC), _HEADER_SIZE)
+        self._email_count = email_count
+        self._email_from = _StringColumnReader(data, _HEADER_SIZE, email_count)
+        self._email_subject = _StringColumnReader(data, self._email_from.end, email_count)
+        first_recipients_end = self._email_subject.end + (email_count + 1) * _ITEM_SIZE
+        self._first_recipient_indices = _read_integers(data, self._email_subject.end, first_recipients_end)
+        self._email_to = _StringColumnReader(data, first_recipients_end, recipient_count)
+        self._data = data
+
+    def __len__(self) -> int:
+        return self._email_count
+
+    def get_email_from(self, index: int) -> EmailFrom:
+        return EmailFrom(EmailAddress(self._email_from[index]))
+
+    def get_email_to(self, index: int) -> list[EmailTo]:
+        first_recipient_index = self._first_recipient_indices[index]
+        last_recipient_index = self._first_recipient_indices[index + 1]
+        return [
+            EmailTo(EmailAddress(self._email_to[recipient_index]))
+            for recipient_index in range(first_recipient_index, last_recipient_index)
+        ]
+
+    def get_email_subject(self, index: int) -> EmailSubject:
+        return EmailSubject(self._email_subject[index])
+
+    def iterate_email_from(self, start: int = 0, stop: int | None = None) -> Iterator[EmailFrom]:
+        return (self.get_email_from(index) for index in range(start, len(self) if stop is None else stop))
+
+    def iterate_email_to(self, start: int = 0, stop: int | None = None) -> Iterator[list[EmailTo]]:
+        return (self.get_email_to(index) for index in range(start, len(self) if stop is None else stop))
+
+    def iterate_email_subject(self, start: int = 0, stop: int | None = None) -> Iterator[EmailSubject]:
+        return (self.get_email_subject(index) for index in range(start, len(self) if stop is None else stop))
+
+    def get_email(self, index: int) -> Email:
+        # The fields were validated when the corpus was written
+        return Email.model_construct(
+            email_from=self.get_email_from(index),
+            email_to=self.get_email_to(index),
+            email_subject=self.get_email_subject(index),
+        )
+
+    @property
+    def emails(self) -> CorpusEmails:
+        return CorpusEmails(self)
+
+    def get_email_batch(self, start: int = 0, stop: int | None = None) -> CorpusEmailBatch:
+        return CorpusEmailBatch.model_construct(emails=CorpusEmails(self, start, stop))
+
+    def close(self) -> None:
+        # Every view of the mapped file is released first, the emails already created stay valid
+        for reader in (self._email_from, self._email_subject, self._email_to):
+            for view in (reader.offsets, reader.blob):
+                if isinstance(view, memoryview):
+                    view.release()
+        if isinstance(self._first_recipient_indices, memoryview):
+            self._first_recipient_indices.release()
+        self._data.release()
+        self._mmap.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        type_: type[BaseException] | None,
+        value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
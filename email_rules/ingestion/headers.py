@@ -0,0 +1,89 @@
+import mmap
+import re
+from email.errors import HeaderParseError
+from email.header import decode_header, make_header
+from email.utils import getaddresses
+from functools import lru_cache
+
+from email_rules.core import Email, EmailAddress, EmailFrom, EmailSubject, EmailTo
+
+# Number of distinct header values to remember the parsed form of, senders and newsletter subjects repeat heavily
+HEADER_CACHE_SIZE = 4096
+
+# Anything re can search without copying it e.g. a slice of a memory mapped file
+HeaderData = bytes | bytearray | memoryview | mmap.mmap
+
+_HEADER_BLOCK_END_PATTERN = re.compile(rb"\n\r?\n")
+# Only these headers are extracted, including the lines folded onto them, everything else is skipped by the search
+_HEADER_PATTERN = re.compile(rb"^(from|to|subject)[ \t]*:(.*(?:\r?\n[ \t].*)*)", re.IGNORECASE | re.MULTILINE)
+_FOLDING_PATTERN = re.compile(rb"\r?\n(?=[ \t])")
+_NEWLINE_BYTES = (ord("\n"), ord("\r"))
+# Characters for which an address list needs the full parser e.g. "Last, First" <address> or comments
+_COMPLEX_ADDRESS_LIST_CHARACTERS = frozenset(b'"<>()\\;:')
+
+
+def find_header_block_end(data: HeaderData, start: int = 0, end: int | None = None) -> int:
+    # Index of the blank line ending the headers starting at start, or end if the message has no body
+    end = len(data) if end is None else end
+    if start < end and data[start] in _NEWLINE_BYTES:
+        return start
+    match = _HEADER_BLOCK_END_PATTERN.search(data, start, end)
+    return end if match is None else match.start() + 1
+
+
+def _decode_header_bytes(value: bytes) -> str:
+    # Raw non ASCII headers are taken to be UTF-8
+    return _FOLDING_PATTERN.sub(b"", value).decode("utf-8", errors="replace").strip()
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def decode_header_value(value: bytes) -> str:
+    # Unfolds the value and decodes RFC 2047 encoded words e.g. =?utf-8?q?caf=C3=A9?=
+    decoded_value = _decode_header_bytes(value)
+    if "=?" not in decoded_value:
+        return decoded_value
+    try:
+        return str(make_header(decode_header(decoded_value)))
+    except (LookupError, UnicodeError, HeaderParseError):
+        # Unknown charsets and broken encoded words are common in real archives, the value is kept as it is
+        return decoded_value
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def parse_address_list(value: bytes) -> tuple[EmailAddress, ...]:
+    # Bare addresses without display names, most lists are plain comma separated addresses and skip the full parser
+    if _COMPLEX_ADDRESS_LIST_CHARACTERS.isdisjoint(value):
+        addresses = _decode_header_bytes(value).split(",")
+        return tuple(EmailAddress(address.strip()) for address in addresses if address.strip())
+    return tuple(EmailAddress(address) for _, address in getaddresses([_decode_header_bytes(value)]) if address)
+
+
+def extract_email(data: HeaderData, start: int = 0, end: int | None = None) -> Email:
+    # Creates the email from the headers of the message starting at start, the body is never looked at. Only the values
+    # of the extracted headers are copied out of the data.
+    headers_end = find_header_block_end(data, start, end)
+    email_from: EmailAddress | None = None
+    email_to: list[EmailTo] = []
+    email_subject: str | None = None
+    for match in _HEADER_PATTERN.finditer(data, start, headers_end):
+        name = bytes(match.group(1)).lower()
+        value = bytes(match.group(2))
+        if name == b"to":
+            email_to.extend(EmailTo(address) for address in parse_address_list(value))
+        elif name == b"from":
+            if email_from is None:
+                from_addresses = parse_address_list(value)
+                email_from = from_addresses[0] if from_addresses else None
+        elif email_subject is None:
+            email_subject = decode_header_value(value)
+
+    # The fields were parsed from the headers, so they do not need to be validated again
+    return Email.model_construct(
+        email_from=EmailFrom(email_from if email_from is not None else EmailAddress("")),
+        email_to=email_to,
+        email_subject=EmailSubject(email_subject if email_subject is not None else ""),
+    )
+
+
+def parse_email_headers(header_block: HeaderData) -> Email:
+    return extract_email(header_block)
@@ -0,0 +1,103 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from email_rules.core import Email
+from email_rules.ingestion.headers import find_header_block_end, parse_email_headers
+
+# Messages are only read until the end of the headers, which usually fit in the first read
+DEFAULT_READ_SIZE = 8192
+DEFAULT_MAX_WORKERS = 16
+# Messages in tmp are still being delivered, so they are not read
+MAILDIR_SUBDIRECTORIES = ("cur", "new")
+
+
+def iterate_maildir_paths(maildir: Path) -> Iterator[Path]:
+    # scandir gives the file type without a stat call for each file
+    for subdirectory in MAILDIR_SUBDIRECTORIES:
+        try:
+            entries = os.scandir(maildir / subdirectory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if not entry.name.startswith(".") and entry.is_file():
+                    yield Path(entry.path)
+
+
+def read_header_block(path: Path, read_size: int = DEFAULT_READ_SIZE) -> bytes:
+    data = b""
+    with path.open("rb") as message_file:
+        while True:
+            chunk = message_file.read(read_size)
+            data += chunk
+            headers_end = find_header_block_end(data)
+            if headers_end < len(data) or not chunk:
+                return data[:headers_end]
+
+
+def read_maildir_email(path: Path, read_size: int = DEFAULT_READ_SIZE) -> Email:
+    return parse_email_headers(read_header_block(path, read_size))
+
+
+def _find_moved_maildir_path(path: Path) -> Path | None:
+    # Mail clients move new messages to cur once they are seen, adding the flags to the unique name after a colon
+    if path.parent.name != "new":
+        return None
+    unique_name = path.name.split(":", 1)[0]
+    try:
+        entries = os.scandir(path.parent.parent / "cur")
+    except FileNotFoundError:
+        return None
+    with entries:
+        for entry in entries:
+            if entry.name == unique_name or entry.name.startswith(f"{unique_name}:"):
+                return Path(entry.path)
+    return None
+
+
+def _read_maildir_email_if_present(path: Path, read_size: int) -> Email | None:
+    # The messages of a maildir in use can be moved or deleted after it was listed. Moved messages are read from cur,
+    # deleted ones are skipped.
+    try:
+        return read_maildir_email(path, read_size)
+    except FileNotFoundError:
+        moved_path = _find_moved_maildir_path(path)
+    if moved_path is None:
+        return None
+    try:
+        return read_maildir_email(moved_path, read_size)
+    except FileNotFoundError:
+        return None
+
+
+def iterate_maildir_emails(
+    maildir: Path | Iterable[Path],
+    max_workers: int = DEFAULT_MAX_WORKERS,
+    max_pending: int | None = None,
+    read_size: int = DEFAULT_READ_SIZE,
+) -> Iterator[Email]:
+    # Reads the messages in a thread pool, since most of the time goes to waiting on the file system. The emails are
+    # yielded in the order of the paths, at most max_pending messages are read ahead of the caller. Paths can be given
+    # instead of a maildir e.g. to combine several maildirs.
+    paths = iterate_maildir_paths(maildir) if isinstance(maildir, Path) else iter(maildir)
+    max_pending = max_pending if max_pending is not None else 4 * max_workers
+    assert max_pending > 0, "Should allow at least one pending message"
+
+    futures: deque[Future[Email | None]] = deque()
+    executor = ThreadPoolExecutor(max_workers)
+    try:
+        for path in paths:
+            if len(futures) >= max_pending:
+                email = futures.popleft().result()
+                if email is not None:
+                    yield email
+            futures.append(executor.submit(_read_maildir_email_if_present, path, read_size))
+        while futures:
+            email = futures.popleft().result()
+            if email is not None:
+                yield email
+    finally:
+        executor.shutdown(cancel_futures=True)
@@ -0,0 +1,47 @@
+import mmap
+from pathlib import Path
+from typing import Iterator
+
+from email_rules.core import Email
+from email_rules.ingestion.headers import extract_email, find_header_block_end
+
+# Each message starts with a "From " line at the start of the file or after a newline. Lines in the body starting with
+# "From " are escaped by the mbox writer, so the body does not need to be parsed to find the next message.
+_MESSAGE_SEPARATOR = b"\nFrom "
+
+
+def iterate_mbox_message_spans(data: bytes | mmap.mmap) -> Iterator[tuple[int, int]]:
+    # Start of the headers and end of each message, the bodies are skipped over
+    if data[:5] == b"From ":
+        message_start = 0
+    else:
+        message_start = data.find(_MESSAGE_SEPARATOR)
+        if message_start == -1:
+            return
+        message_start += 1
+
+    data_length = len(data)
+    while message_start < data_length:
+        next_separator = data.find(_MESSAGE_SEPARATOR, message_start)
+        message_end = data_length if next_separator == -1 else next_separator + 1
+        headers_start = data.find(b"\n", message_start, message_end) + 1
+        if headers_start:
+            yield headers_start, message_end
+        message_start = message_end
+
+
+def iterate_mbox_header_blocks(data: bytes | mmap.mmap) -> Iterator[bytes]:
+    for headers_start, message_end in iterate_mbox_message_spans(data):
+        headers_end = find_header_block_end(data, headers_start, message_end)
+        yield data[headers_start:headers_end]
+
+
+def iterate_mbox_emails(path: Path) -> Iterator[Email]:
+    # Emails are created lazily, the file is memory mapped so it is never read into memory as a whole
+    with path.open("rb") as mbox_file:
+        if path.stat().st_size == 0:
+            return
+        with mmap.mmap(mbox_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            # The headers are extracted from the mapped file directly rather than copying the header block out first
+            for headers_start, message_end in iterate_mbox_message_spans(data):
+                yield extract_email(data, headers_start, message_end)
@@ -0,0 +1,102 @@
+import csv
+from itertools import islice
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from pydantic import TypeAdapter
+from pydantic_core import from_json
+
+from email_rules.core import Email
+
+# Keys of the exported records and the email fields they hold
+RECORD_FIELD_NAMES = {"from": "email_from", "to": "email_to", "subject": "email_subject"}
+# Records are validated a chunk at a time, a single call to the validator per chunk rather than one per record
+DEFAULT_VALIDATION_CHUNK_SIZE = 1024
+# CSV exports hold all of the recipients of an email in one column
+DEFAULT_CSV_RECIPIENT_SEPARATOR = ","
+
+EmailRecord = dict[str, Any]
+
+_EMAIL_LIST_ADAPTER = TypeAdapter(list[Email])
+
+
+def iterate_jsonl_records(lines: Iterable[str | bytes]) -> Iterator[EmailRecord]:
+    # The Rust JSON parser of pydantic takes a third of the time of json.loads, and shares repeated strings
+    for line in lines:
+        if line.strip():
+            yield from_json(line)
+
+
+def iterate_csv_records(
+    lines: Iterable[str], recipient_separator: str = DEFAULT_CSV_RECIPIENT_SEPARATOR
+) -> Iterator[EmailRecord]:
+    # The first line holds the keys of the records
+    for record in csv.DictReader(lines):
+        recipients = record.get("to")
+        if recipients is not None:
+            record["to"] = [
+                recipient.strip() for recipient in recipients.split(recipient_separator) if recipient.strip()
+            ]
+        yield record
+
+
+def _get_record_recipients(recipients: Any) -> Any:
+    # Some exports hold a single recipient as a string rather than a list of one, which would otherwise be split into
+    # characters. Anything else than a string, list or tuple is left for validation to reject.
+    if isinstance(recipients, str):
+        return [recipients]
+    if isinstance(recipients, (list, tuple)):
+        return list(recipients)
+    return recipients
+
+
+def create_trusted_email(record: EmailRecord) -> Email:
+    # The record is taken to be valid, a missing key raises a KeyError but the values are used as they are
+    recipients = _get_record_recipients(record["to"])
+    if not isinstance(recipients, list):
+        raise TypeError(f"Recipients should be a string, list or tuple, not {type(recipients).__name__}")
+    return Email.model_construct(email_from=record["from"], email_to=recipients, email_subject=record["subject"])
+
+
+def validate_email_records(records: Iterable[EmailRecord]) -> list[Email]:
+    # Raises a ValidationError listing every invalid record, by its index in records
+    return _EMAIL_LIST_ADAPTER.validate_python(
+        [
+            {
+                RECORD_FIELD_NAMES.get(key, key): _get_record_recipients(value) if key == "to" else value
+                for key, value in record.items()
+            }
+            for record in records
+        ]
+    )
+
+
+def iterate_emails_from_records(
+    records: Iterable[EmailRecord], validate: bool = True, chunk_size: int = DEFAULT_VALIDATION_CHUNK_SIZE
+) -> Iterator[Email]:
+    # Without validation each email is created as soon as its record is read, so only trusted exports should skip it
+    if not validate:
+        yield from map(create_trusted_email, records)
+        return
+
+    assert chunk_size > 0, "Chunk size should be positive"
+    record_iterator = iter(records)
+    while chunk := list(islice(record_iterator, chunk_size)):
+        yield from validate_email_records(chunk)
+
+
+def iterate_jsonl_emails(
+    path: Path, validate: bool = True, chunk_size: int = DEFAULT_VALIDATION_CHUNK_SIZE
+) -> Iterator[Email]:
+    with path.open("rb") as jsonl_file:
+        yield from iterate_emails_from_records(iterate_jsonl_records(jsonl_file), validate, chunk_size)
+
+
+def iterate_csv_emails(
+    path: Path,
+    validate: bool = True,
+    chunk_size: int = DEFAULT_VALIDATION_CHUNK_SIZE,
+    recipient_separator: str = DEFAULT_CSV_RECIPIENT_SEPARATOR,
+) -> Iterator[Email]:
+    with path.open(newline="", encoding="utf-8") as csv_file:
+        yield from iterate_emails_from_records(iterate_csv_records(csv_file, recipient_separator), validate, chunk_size)
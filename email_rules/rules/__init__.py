@@ -11,15 +11,37 @@ from email_rules.rules.basic_filters import (
     RuleSubjectEq,
     RuleToEq,
 )
+from email_rules.rules.compilation import (
+    CompiledRuleSet,
+    ExactMatchField,
+    ExactMatchKey,
+    ExactMatchRuleIndex,
+    RuleFilterCompiler,
+    TextContainsIndex,
+    memoize_per_email,
+)
+from email_rules.rules.profiling import (
+    RuleFilterLeafStats,
+    RuleFilterProfile,
+    get_leaf_stats_key,
+    get_optimized_filter_expr,
+    iterate_leaf_rule_filters,
+    reorder_rule_filter,
+)
 from email_rules.rules.type_defs import (
     AggregatedRuleFilter,
+    CompiledRuleFilter,
+    ConstantRuleFilter,
     NegatedRuleFilter,
     Rule,
     RuleAction,
     RuleActionApplicationException,
     RuleActionStopProcessingAllFilesException,
     RuleActionStopProcessingCurrentFileException,
+    RuleApplicationInterruptState,
     RuleFilter,
+    RuleFilterOperator,
+    get_structural_key,
 )
 
 __all__ = (
@@ -34,13 +56,33 @@ __all__ = (
     "RuleSubjectContains",
     "RuleSubjectEq",
     "RuleToEq",
+    # compilation.py
+    "CompiledRuleSet",
+    "ExactMatchField",
+    "ExactMatchKey",
+    "ExactMatchRuleIndex",
+    "RuleFilterCompiler",
+    "TextContainsIndex",
+    "memoize_per_email",
+    # profiling.py
+    "RuleFilterLeafStats",
+    "RuleFilterProfile",
+    "get_leaf_stats_key",
+    "get_optimized_filter_expr",
+    "iterate_leaf_rule_filters",
+    "reorder_rule_filter",
     # type_defs.py
     "AggregatedRuleFilter",
+    "CompiledRuleFilter",
+    "ConstantRuleFilter",
     "NegatedRuleFilter",
     "Rule",
     "RuleAction",
     "RuleActionApplicationException",
     "RuleActionStopProcessingAllFilesException",
     "RuleActionStopProcessingCurrentFileException",
+    "RuleApplicationInterruptState",
     "RuleFilter",
+    "RuleFilterOperator",
+    "get_structural_key",
 )
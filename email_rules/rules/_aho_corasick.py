@@ -0,0 +1,55 @@
+from collections import deque
+from typing import Iterable
+
+
+class AhoCorasickAutomaton:
+    def __init__(self, patterns: Iterable[str]) -> None:
+        self._transitions: list[dict[str, int]] = [{}]
+        self._fallbacks: list[int] = [0]
+        self._outputs: list[frozenset[str]] = [frozenset()]
+
+        for pattern in patterns:
+            self._add_pattern(pattern)
+        self._link_fallbacks()
+
+    def _add_pattern(self, pattern: str) -> None:
+        node = 0
+        for char in pattern:
+            next_node = self._transitions[node].get(char)
+            if next_node is None:
+                next_node = len(self._transitions)
+                self._transitions[node][char] = next_node
+                self._transitions.append({})
+                self._fallbacks.append(0)
+                self._outputs.append(frozenset())
+            node = next_node
+        self._outputs[node] = self._outputs[node] | {pattern}
+
+    def _link_fallbacks(self) -> None:
+        # Breadth first, so the fallback of a node is always complete before its children are linked
+        queue = deque(self._transitions[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._transitions[node].items():
+                fallback = self._fallbacks[node]
+                while char not in self._transitions[fallback] and fallback != 0:
+                    fallback = self._fallbacks[fallback]
+                child_fallback = self._transitions[fallback].get(char, 0)
+                self._fallbacks[child] = child_fallback if child_fallback != child else 0
+                self._outputs[child] = self._outputs[child] | self._outputs[self._fallbacks[child]]
+                queue.append(child)
+
+    def find_all(self, text: str) -> frozenset[str]:
+        transitions = self._transitions
+        fallbacks = self._fallbacks
+        outputs = self._outputs
+
+        matches: set[str] = set(outputs[0])
+        node = 0
+        for char in text:
+            while char not in transitions[node] and node != 0:
+                node = fallbacks[node]
+            node = transitions[node].get(char, 0)
+            if outputs[node]:
+                matches.update(outputs[node])
+        return frozenset(matches)
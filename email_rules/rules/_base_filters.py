@@ -1,8 +1,14 @@
 from abc import ABC, abstractmethod
+from functools import cached_property
 from typing import Generic, Self, TypeVar, cast
 
-from email_rules.core import Email
-from email_rules.rules.type_defs import RuleFilter
+from email_rules.core import Email, EmailBatch, EmailColumn, NormalizedEmail
+from email_rules.rules.compilation import (
+    ExactMatchField,
+    ExactMatchKey,
+    RuleFilterCompiler,
+)
+from email_rules.rules.type_defs import CompiledRuleFilter, RuleFilter
 
 T_str = TypeVar("T_str", bound=str)
 
@@ -18,16 +24,57 @@ class GenericRuleTextEq(RuleFilter, Generic[T_str], ABC):
             case_sensitive=case_sensitive,
         )
 
+    @cached_property
+    def normalized_text(self) -> str:
+        return self.text if self.case_sensitive else self.text.lower()
+
     def evaluate(self, email: Email) -> bool:
         if not self.case_sensitive:
-            return self.text.lower() == self.get_text_from_email(email).lower()
+            return self.normalized_text == self.get_normalized_text_from_email(email.normalized)
         return self.text == self.get_text_from_email(email)
 
+    def compile(self, compiler: RuleFilterCompiler | None = None) -> CompiledRuleFilter:
+        text = self.normalized_text
+        if not self.case_sensitive:
+            get_normalized_text_from_email = self.get_normalized_text_from_email
+            return lambda email: get_normalized_text_from_email(email.normalized) == text
+        get_text_from_email = self.get_text_from_email
+        return lambda email: get_text_from_email(email) == text
+
+    def evaluate_batch(self, batch: EmailBatch) -> int:
+        if not self.case_sensitive:
+            return self.get_normalized_text_column_from_batch(batch).get_eq_mask(cast(T_str, self.normalized_text))
+        return self.get_text_column_from_batch(batch).get_eq_mask(self.text)
+
+    def get_exact_match_keys(self) -> list[ExactMatchKey] | None:
+        field = ExactMatchField(
+            get_text_from_email=self.get_text_from_email,
+            get_normalized_text_from_email=self.get_normalized_text_from_email,
+            case_sensitive=self.case_sensitive,
+            is_list=False,
+        )
+        return [ExactMatchKey(field=field, text=self.normalized_text)]
+
     @staticmethod
     @abstractmethod
     def get_text_from_email(email: Email) -> T_str:
         pass
 
+    @staticmethod
+    @abstractmethod
+    def get_normalized_text_from_email(email: NormalizedEmail) -> T_str:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def get_text_column_from_batch(batch: EmailBatch) -> EmailColumn[T_str]:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def get_normalized_text_column_from_batch(batch: EmailBatch) -> EmailColumn[T_str]:
+        pass
+
 
 class GenericRuleTextContains(RuleFilter, Generic[T_str], ABC):
     text: T_str
@@ -40,16 +87,53 @@ class GenericRuleTextContains(RuleFilter, Generic[T_str], ABC):
             case_sensitive=case_sensitive,
         )
 
+    @cached_property
+    def normalized_text(self) -> str:
+        return self.text if self.case_sensitive else self.text.lower()
+
     def evaluate(self, email: Email) -> bool:
         if not self.case_sensitive:
-            return self.text.lower() in self.get_text_from_email(email).lower()
+            return self.normalized_text in self.get_normalized_text_from_email(email.normalized)
         return self.text in self.get_text_from_email(email)
 
+    def compile(self, compiler: RuleFilterCompiler | None = None) -> CompiledRuleFilter:
+        text = self.normalized_text
+        if compiler is not None:
+            return compiler.compile_text_contains(
+                text, self.case_sensitive, self.get_text_from_email, self.get_normalized_text_from_email
+            )
+        if not self.case_sensitive:
+            get_normalized_text_from_email = self.get_normalized_text_from_email
+            return lambda email: text in get_normalized_text_from_email(email.normalized)
+        get_text_from_email = self.get_text_from_email
+        return lambda email: text in get_text_from_email(email)
+
+    def evaluate_batch(self, batch: EmailBatch) -> int:
+        text = self.normalized_text
+        if not self.case_sensitive:
+            return self.get_normalized_text_column_from_batch(batch).get_mask_where(lambda value: text in value)
+        return self.get_text_column_from_batch(batch).get_mask_where(lambda value: text in value)
+
     @staticmethod
     @abstractmethod
     def get_text_from_email(email: Email) -> T_str:
         pass
 
+    @staticmethod
+    @abstractmethod
+    def get_normalized_text_from_email(email: NormalizedEmail) -> T_str:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def get_text_column_from_batch(batch: EmailBatch) -> EmailColumn[T_str]:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def get_normalized_text_column_from_batch(batch: EmailBatch) -> EmailColumn[T_str]:
+        pass
+
 
 class GenericRuleTextListContains(RuleFilter, Generic[T_str], ABC):
     text: T_str
@@ -62,13 +146,53 @@ class GenericRuleTextListContains(RuleFilter, Generic[T_str], ABC):
             case_sensitive=case_sensitive,
         )
 
+    @cached_property
+    def normalized_text(self) -> str:
+        return self.text if self.case_sensitive else self.text.lower()
+
     def evaluate(self, email: Email) -> bool:
-        text_list = self.get_text_list_from_email(email)
         if not self.case_sensitive:
-            return self.text.lower() in [text.lower() for text in text_list]
-        return self.text in text_list
+            return self.normalized_text in self.get_normalized_text_set_from_email(email.normalized)
+        return self.text in self.get_text_list_from_email(email)
+
+    def compile(self, compiler: RuleFilterCompiler | None = None) -> CompiledRuleFilter:
+        text = self.normalized_text
+        if not self.case_sensitive:
+            get_normalized_text_set_from_email = self.get_normalized_text_set_from_email
+            return lambda email: text in get_normalized_text_set_from_email(email.normalized)
+        get_text_list_from_email = self.get_text_list_from_email
+        return lambda email: text in get_text_list_from_email(email)
+
+    def evaluate_batch(self, batch: EmailBatch) -> int:
+        if not self.case_sensitive:
+            return self.get_normalized_text_set_column_from_batch(batch).get_eq_mask(cast(T_str, self.normalized_text))
+        return self.get_text_list_column_from_batch(batch).get_eq_mask(self.text)
+
+    def get_exact_match_keys(self) -> list[ExactMatchKey] | None:
+        field = ExactMatchField(
+            get_text_from_email=self.get_text_list_from_email,
+            get_normalized_text_from_email=self.get_normalized_text_set_from_email,
+            case_sensitive=self.case_sensitive,
+            is_list=True,
+        )
+        return [ExactMatchKey(field=field, text=self.normalized_text)]
 
     @staticmethod
     @abstractmethod
     def get_text_list_from_email(email: Email) -> list[T_str]:
         pass
+
+    @staticmethod
+    @abstractmethod
+    def get_normalized_text_set_from_email(email: NormalizedEmail) -> frozenset[T_str]:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def get_text_list_column_from_batch(batch: EmailBatch) -> EmailColumn[T_str]:
+        pass
+
+    @staticmethod
+    @abstractmethod
+    def get_normalized_text_set_column_from_batch(batch: EmailBatch) -> EmailColumn[T_str]:
+        pass
@@ -0,0 +1,46 @@
+from typing import Any, ClassVar
+
+from pydantic import (
+    BaseModel,
+    SerializerFunctionWrapHandler,
+    ValidatorFunctionWrapHandler,
+    model_serializer,
+    model_validator,
+)
+
+# Key under which model_dump stores the class of the model
+TYPE_KEY = "type"
+
+
+def get_type_name(cls: type[BaseModel]) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
+
+
+# Fields are declared as the base class e.g. filter_expr: RuleFilter, so model_validate needs to know which subclass to
+# create. Every subclass is registered by its import path, which is dumped along with the fields. The module defining a
+# subclass has to be imported before the dump is validated.
+class PolymorphicModel(BaseModel):
+    _classes_by_type_name: ClassVar[dict[str, type["PolymorphicModel"]]] = {}
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        PolymorphicModel._classes_by_type_name[get_type_name(cls)] = cls
+
+    @model_serializer(mode="wrap")
+    def _serialize_with_type_name(self, handler: SerializerFunctionWrapHandler) -> dict[str, Any]:
+        return {TYPE_KEY: get_type_name(type(self)), **handler(self)}
+
+    @model_validator(mode="wrap")
+    @classmethod
+    def _validate_as_type_name(cls, data: Any, handler: ValidatorFunctionWrapHandler) -> Any:
+        if isinstance(data, dict) and TYPE_KEY in data:
+            type_name = data[TYPE_KEY]
+            model_class = PolymorphicModel._classes_by_type_name.get(type_name)
+            if model_class is None:
+                raise ValueError(f"Unknown {cls.__name__} type {type_name}, its module might not have been imported")
+            if not issubclass(model_class, cls):
+                raise ValueError(f"{type_name} is not a {cls.__name__}")
+            if model_class is not cls:
+                return model_class.model_validate({key: value for key, value in data.items() if key != TYPE_KEY})
+        return handler(data)
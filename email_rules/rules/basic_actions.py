@@ -1,8 +1,9 @@
-from email_rules.core import EmailFolder, EmailState, EmailTag
+from email_rules.core import EmailFolder, EmailState, EmailTag, RuntimeEmailState
 from email_rules.rules.type_defs import (
     RuleAction,
     RuleActionStopProcessingAllFilesException,
     RuleActionStopProcessingCurrentFileException,
+    RuleApplicationInterruptState,
 )
 
 
@@ -10,8 +11,19 @@ class RuleActionAddTag(RuleAction):
     tag_to_apply: EmailTag
 
     def apply(self, email_state: EmailState) -> EmailState:
-        email_state.tags.add(self.tag_to_apply)
-        return email_state
+        if self.tag_to_apply in email_state.tags:
+            return email_state
+        return email_state.model_copy(update={"tags": email_state.tags | {self.tag_to_apply}})
+
+    def apply_to_runtime_state(
+        self, email_state: RuntimeEmailState
+    ) -> tuple[RuntimeEmailState, RuleApplicationInterruptState]:
+        if self.tag_to_apply in email_state.tags:
+            return email_state, RuleApplicationInterruptState.CONTINUE
+        return (
+            RuntimeEmailState(email_state.tags | {self.tag_to_apply}, email_state.current_folder, email_state.is_read),
+            RuleApplicationInterruptState.CONTINUE,
+        )
 
     def __repr__(self) -> str:
         return f"ADD_TAG[{self.tag_to_apply}]"
@@ -21,8 +33,15 @@ class RuleActionMoveToFolder(RuleAction):
     folder: EmailFolder
 
     def apply(self, email_state: EmailState) -> EmailState:
-        email_state.current_folder = self.folder
-        return email_state
+        return email_state.model_copy(update={"current_folder": self.folder})
+
+    def apply_to_runtime_state(
+        self, email_state: RuntimeEmailState
+    ) -> tuple[RuntimeEmailState, RuleApplicationInterruptState]:
+        return (
+            RuntimeEmailState(email_state.tags, self.folder, email_state.is_read),
+            RuleApplicationInterruptState.CONTINUE,
+        )
 
     def __repr__(self) -> str:
         return f"MOVE_TO_FOLDER[{self.folder}]"
@@ -32,6 +51,14 @@ class RuleActionStopProcessingCurrentFile(RuleAction):
     def apply(self, email_state: EmailState) -> EmailState:
         raise RuleActionStopProcessingCurrentFileException()
 
+    def apply_with_interrupt_state(self, email_state: EmailState) -> tuple[EmailState, RuleApplicationInterruptState]:
+        return email_state, RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE
+
+    def apply_to_runtime_state(
+        self, email_state: RuntimeEmailState
+    ) -> tuple[RuntimeEmailState, RuleApplicationInterruptState]:
+        return email_state, RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE
+
     def __repr__(self) -> str:
         return "STOP_CURRENT_FILE"
 
@@ -40,14 +67,29 @@ class RuleActionStopProcessingAllFiles(RuleAction):
     def apply(self, email_state: EmailState) -> EmailState:
         raise RuleActionStopProcessingAllFilesException()
 
+    def apply_with_interrupt_state(self, email_state: EmailState) -> tuple[EmailState, RuleApplicationInterruptState]:
+        return email_state, RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES
+
+    def apply_to_runtime_state(
+        self, email_state: RuntimeEmailState
+    ) -> tuple[RuntimeEmailState, RuleApplicationInterruptState]:
+        return email_state, RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES
+
     def __repr__(self) -> str:
         return "STOP_ALL_FILES"
 
 
 class RuleActionMarkAsRead(RuleAction):
     def apply(self, email_state: EmailState) -> EmailState:
-        email_state.is_read = True
-        return email_state
+        return email_state.model_copy(update={"is_read": True})
+
+    def apply_to_runtime_state(
+        self, email_state: RuntimeEmailState
+    ) -> tuple[RuntimeEmailState, RuleApplicationInterruptState]:
+        return (
+            RuntimeEmailState(email_state.tags, email_state.current_folder, True),
+            RuleApplicationInterruptState.CONTINUE,
+        )
 
     def __repr__(self) -> str:
         return "MARK_AS_READ"
@@ -1,4 +1,12 @@
-from email_rules.core import Email, EmailFrom, EmailSubject, EmailTo
+from email_rules.core import (
+    Email,
+    EmailBatch,
+    EmailColumn,
+    EmailFrom,
+    EmailSubject,
+    EmailTo,
+    NormalizedEmail,
+)
 from email_rules.rules._base_filters import (
     GenericRuleTextContains,
     GenericRuleTextEq,
@@ -11,20 +19,68 @@ class RuleFromEq(GenericRuleTextEq[EmailFrom]):
     def get_text_from_email(email: Email) -> EmailFrom:
         return email.email_from
 
+    @staticmethod
+    def get_normalized_text_from_email(email: NormalizedEmail) -> EmailFrom:
+        return email.email_from
+
+    @staticmethod
+    def get_text_column_from_batch(batch: EmailBatch) -> EmailColumn[EmailFrom]:
+        return batch.email_from
+
+    @staticmethod
+    def get_normalized_text_column_from_batch(batch: EmailBatch) -> EmailColumn[EmailFrom]:
+        return batch.normalized_email_from
+
 
 class RuleSubjectContains(GenericRuleTextContains[EmailSubject]):
     @staticmethod
     def get_text_from_email(email: Email) -> EmailSubject:
         return email.email_subject
 
+    @staticmethod
+    def get_normalized_text_from_email(email: NormalizedEmail) -> EmailSubject:
+        return email.email_subject
+
+    @staticmethod
+    def get_text_column_from_batch(batch: EmailBatch) -> EmailColumn[EmailSubject]:
+        return batch.email_subject
+
+    @staticmethod
+    def get_normalized_text_column_from_batch(batch: EmailBatch) -> EmailColumn[EmailSubject]:
+        return batch.normalized_email_subject
+
 
 class RuleSubjectEq(GenericRuleTextEq[EmailSubject]):
     @staticmethod
     def get_text_from_email(email: Email) -> EmailSubject:
         return email.email_subject
 
+    @staticmethod
+    def get_normalized_text_from_email(email: NormalizedEmail) -> EmailSubject:
+        return email.email_subject
+
+    @staticmethod
+    def get_text_column_from_batch(batch: EmailBatch) -> EmailColumn[EmailSubject]:
+        return batch.email_subject
+
+    @staticmethod
+    def get_normalized_text_column_from_batch(batch: EmailBatch) -> EmailColumn[EmailSubject]:
+        return batch.normalized_email_subject
+
 
 class RuleToEq(GenericRuleTextListContains[EmailTo]):
     @staticmethod
     def get_text_list_from_email(email: Email) -> list[EmailTo]:
         return email.email_to
+
+    @staticmethod
+    def get_normalized_text_set_from_email(email: NormalizedEmail) -> frozenset[EmailTo]:
+        return email.email_to
+
+    @staticmethod
+    def get_text_list_column_from_batch(batch: EmailBatch) -> EmailColumn[EmailTo]:
+        return batch.email_to
+
+    @staticmethod
+    def get_normalized_text_set_column_from_batch(batch: EmailBatch) -> EmailColumn[EmailTo]:
+        return batch.normalized_email_to
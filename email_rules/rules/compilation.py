@@ -0,0 +1,241 @@
+from collections import Counter
+from typing import (
+    Any,
+    Callable,
+    Collection,
+    Hashable,
+    Iterable,
+    NamedTuple,
+    Sequence,
+    cast,
+)
+
+from email_rules.core import Email, NormalizedEmail
+from email_rules.core._cached_properties import TrackedList, get_content_version
+from email_rules.rules._aho_corasick import AhoCorasickAutomaton
+from email_rules.rules.profiling import RuleFilterProfile, get_optimized_filter_expr
+from email_rules.rules.type_defs import (
+    CompiledRuleFilter,
+    Rule,
+    RuleFilter,
+    get_structural_key,
+)
+
+GetTextFromEmail = Callable[[Email], str | Collection[str]]
+GetTextFromNormalizedEmail = Callable[[NormalizedEmail], str | Collection[str]]
+
+
+class ExactMatchField(NamedTuple):
+    get_text_from_email: GetTextFromEmail
+    get_normalized_text_from_email: GetTextFromNormalizedEmail
+    case_sensitive: bool
+    is_list: bool
+
+
+class ExactMatchKey(NamedTuple):
+    field: ExactMatchField
+    # Already normalized when the field is case insensitive
+    text: str
+
+
+class TextContainsIndex:
+    def __init__(
+        self,
+        get_text_from_email: Callable[[Email], str],
+        get_normalized_text_from_email: Callable[[NormalizedEmail], str],
+        case_sensitive: bool,
+    ) -> None:
+        self._get_text_from_email = get_text_from_email
+        self._get_normalized_text_from_email = get_normalized_text_from_email
+        self._case_sensitive = case_sensitive
+        self._patterns: set[str] = set()
+        self._automaton: AhoCorasickAutomaton | None = None
+        self._last_text_and_matches: tuple[str | None, frozenset[str]] = (None, frozenset())
+
+    def add_pattern(self, pattern: str) -> None:
+        # Patterns for case insensitive indexes should already be normalized
+        if pattern not in self._patterns:
+            self._patterns.add(pattern)
+            self._automaton = None
+            self._last_text_and_matches = (None, frozenset())
+
+    def find_all(self, email: Email) -> frozenset[str]:
+        if self._case_sensitive:
+            text = self._get_text_from_email(email)
+        else:
+            text = self._get_normalized_text_from_email(email.normalized)
+
+        # Every filter using this index asks about the same email in turn, so only the last result is kept
+        last_text, last_matches = self._last_text_and_matches
+        if text == last_text:
+            return last_matches
+
+        if self._automaton is None:
+            self._automaton = AhoCorasickAutomaton(self._patterns)
+        matches = self._automaton.find_all(text)
+        self._last_text_and_matches = (text, matches)
+        return matches
+
+    def __getstate__(self) -> dict[str, Any]:
+        # The automaton is pickled along with the patterns so that it is not built again after unpickling
+        if self._automaton is None:
+            self._automaton = AhoCorasickAutomaton(self._patterns)
+        return {**self.__dict__, "_last_text_and_matches": (None, frozenset())}
+
+
+def memoize_per_email(compiled_filter: CompiledRuleFilter) -> CompiledRuleFilter:
+    # The normalized email is recreated whenever an email field is reassigned or the recipients are modified in place,
+    # so it identifies the email contents. Both values are kept in one tuple so that a thread never sees the result for
+    # another email.
+    last_email_and_result: tuple[NormalizedEmail | None, bool] = (None, False)
+
+    def memoized_filter(email: Email) -> bool:
+        nonlocal last_email_and_result
+        normalized_email = email.normalized
+        last_email, last_result = last_email_and_result
+        if normalized_email is last_email:
+            return last_result
+
+        result = compiled_filter(email)
+        last_email_and_result = (normalized_email, result)
+        return result
+
+    return memoized_filter
+
+
+# Filters compiled with the same compiler share indexes and identical subexpressions, so it should be used for filters
+# evaluated together e.g. all of the rules in an account. Subexpressions occurring more than once in the given filters
+# are evaluated at most once per email.
+class RuleFilterCompiler:
+    def __init__(self, rule_filters: Iterable[RuleFilter] = ()) -> None:
+        self._text_contains_indexes: dict[tuple[Callable[[Email], str], bool], TextContainsIndex] = {}
+        self._compiled_filters: dict[Hashable, CompiledRuleFilter] = {}
+        self._occurrences: Counter[Hashable] = Counter()
+        for rule_filter in rule_filters:
+            subexpression_keys: list[Hashable] = []
+            get_structural_key(rule_filter, subexpression_keys)
+            self._occurrences.update(subexpression_keys)
+
+    def compile(self, rule_filter: RuleFilter) -> CompiledRuleFilter:
+        structural_key = get_structural_key(rule_filter)
+        if structural_key in self._compiled_filters:
+            return self._compiled_filters[structural_key]
+
+        compiled_filter = rule_filter.compile(self)
+        if self._occurrences[structural_key] > 1:
+            compiled_filter = memoize_per_email(compiled_filter)
+        self._compiled_filters[structural_key] = compiled_filter
+        return compiled_filter
+
+    def compile_text_contains(
+        self,
+        text: str,
+        case_sensitive: bool,
+        get_text_from_email: Callable[[Email], str],
+        get_normalized_text_from_email: Callable[[NormalizedEmail], str],
+    ) -> CompiledRuleFilter:
+        index_key = (get_text_from_email, case_sensitive)
+        if index_key not in self._text_contains_indexes:
+            self._text_contains_indexes[index_key] = TextContainsIndex(
+                get_text_from_email, get_normalized_text_from_email, case_sensitive
+            )
+        index = self._text_contains_indexes[index_key]
+
+        index.add_pattern(text)
+        return lambda email: text in index.find_all(email)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Compiled filters are closures, which cannot be pickled. The occurrences and indexes are kept, so filters
+        # compiled after unpickling are shared and indexed the same way.
+        return {**self.__dict__, "_compiled_filters": {}}
+
+
+class ExactMatchRuleIndex:
+    def __init__(self, rule_filters: Sequence[RuleFilter]) -> None:
+        self._unindexed_rule_indices: list[int] = []
+        self._rule_indices_by_field: dict[ExactMatchField, dict[str, list[int]]] = {}
+
+        for rule_index, rule_filter in enumerate(rule_filters):
+            keys = rule_filter.get_exact_match_keys()
+            if keys is None:
+                self._unindexed_rule_indices.append(rule_index)
+                continue
+            for key in keys:
+                rule_indices_by_text = self._rule_indices_by_field.setdefault(key.field, {})
+                rule_indices_by_text.setdefault(key.text, []).append(rule_index)
+
+    def get_candidate_rule_indices(self, email: Email) -> list[int]:
+        # Rules that are not candidates cannot match, the candidates still need their filter evaluated
+        candidate_rule_indices = set(self._unindexed_rule_indices)
+        for field, rule_indices_by_text in self._rule_indices_by_field.items():
+            if field.case_sensitive:
+                email_text = field.get_text_from_email(email)
+            else:
+                email_text = field.get_normalized_text_from_email(email.normalized)
+            email_texts = email_text if field.is_list else [cast(str, email_text)]
+            for text in email_texts:
+                rule_indices = rule_indices_by_text.get(text)
+                if rule_indices:
+                    candidate_rule_indices.update(rule_indices)
+        return sorted(candidate_rule_indices)
+
+
+class CompiledRuleSet:
+    def __init__(
+        self,
+        rules: Sequence[Rule],
+        compiler: RuleFilterCompiler | None = None,
+        rule_filter_profile: RuleFilterProfile | None = None,
+    ) -> None:
+        filter_exprs = [get_optimized_filter_expr(rule, rule_filter_profile) for rule in rules]
+        compiler = compiler if compiler is not None else RuleFilterCompiler(filter_exprs)
+        # The rules as they were when compiled, so that rules modified afterwards are not matched with stale filters
+        self.rules = tuple(rules)
+        self._compiled_rule_list = rules if isinstance(rules, TrackedList) else None
+        self._record_content_versions()
+        self.filter_exprs = filter_exprs
+        self.compiler = compiler
+        self.compiled_filter_exprs = [compiler.compile(filter_expr) for filter_expr in filter_exprs]
+        self.exact_match_index = ExactMatchRuleIndex(filter_exprs)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Pickled along with the optimized filters, the compiler and the index, so that unpickling skips simplifying,
+        # optimizing and indexing the rules. The compiled filters cannot be pickled.
+        return {key: value for key, value in self.__dict__.items() if key != "compiled_filter_exprs"}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        # Versions are only meaningful within one process, the rules are unpickled without modifying them
+        self._record_content_versions()
+        # Each filter is only compiled once it is first evaluated, as most rules are never candidates for an email
+        self.compiled_filter_exprs = [self._compile_on_first_call(rule_index) for rule_index in range(len(self.rules))]
+
+    def _compile_on_first_call(self, rule_index: int) -> CompiledRuleFilter:
+        def compile_and_evaluate(email: Email) -> bool:
+            compiled_filter = self.compiler.compile(self.filter_exprs[rule_index])
+            self.compiled_filter_exprs[rule_index] = compiled_filter
+            return compiled_filter(email)
+
+        return compile_and_evaluate
+
+    def _record_content_versions(self) -> None:
+        self.content_version = get_content_version(self._compiled_rule_list)
+        self.rule_content_versions = tuple(get_content_version(rule) for rule in self.rules)
+
+    def is_compiled_from(self, rules: Sequence[Rule]) -> bool:
+        # The version of a tracked list changes whenever it or any rule in it is modified in place, so checking the
+        # rules of a rule file is O(1). Any other sequence is compared with the compiled rules and their versions.
+        if rules is self._compiled_rule_list:
+            return get_content_version(rules) == self.content_version
+        return len(rules) == len(self.rules) and all(
+            rule is compiled_rule and get_content_version(rule) == content_version
+            for rule, compiled_rule, content_version in zip(rules, self.rules, self.rule_content_versions)
+        )
+
+    def get_candidate_rule_indices(self, email: Email) -> list[int]:
+        return self.exact_match_index.get_candidate_rule_indices(email)
+
+    def iterate_matching_rule_indices(self, email: Email) -> Iterable[int]:
+        for rule_index in self.get_candidate_rule_indices(email):
+            if self.compiled_filter_exprs[rule_index](email):
+                yield rule_index
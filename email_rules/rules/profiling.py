@@ -0,0 +1,133 @@
+from time import perf_counter_ns
+from typing import Iterable
+
+from pydantic import BaseModel
+
+from email_rules.core import Email
+from email_rules.rules.type_defs import (
+    AggregatedRuleFilter,
+    ConstantRuleFilter,
+    NegatedRuleFilter,
+    Rule,
+    RuleFilter,
+    get_structural_key,
+)
+
+# Used for leaves that were not seen while profiling
+UNKNOWN_HIT_RATE = 0.5
+
+
+class RuleFilterLeafStats(BaseModel):
+    evaluations: int = 0
+    hits: int = 0
+    total_time_ns: int = 0
+
+    def get_cost(self) -> float:
+        return self.total_time_ns / self.evaluations if self.evaluations else 0.0
+
+    def get_hit_rate(self) -> float:
+        return self.hits / self.evaluations if self.evaluations else UNKNOWN_HIT_RATE
+
+
+def get_leaf_stats_key(leaf: RuleFilter) -> str:
+    # The structural key holds classes, so its repr is used to keep the profile serializable along with the settings
+    return repr(get_structural_key(leaf))
+
+
+class RuleFilterProfile(BaseModel):
+    # Keyed by get_leaf_stats_key of each leaf filter i.e. anything other than and/or/not
+    leaf_stats: dict[str, RuleFilterLeafStats] = {}
+
+    def record(self, rule_filters: Iterable[RuleFilter], emails: Iterable[Email]) -> None:
+        leaves: dict[str, RuleFilter] = {}
+        for rule_filter in rule_filters:
+            for leaf in iterate_leaf_rule_filters(rule_filter):
+                leaves.setdefault(get_leaf_stats_key(leaf), leaf)
+        compiled_leaves = [
+            (self.leaf_stats.setdefault(key, RuleFilterLeafStats()), leaf.compile()) for key, leaf in leaves.items()
+        ]
+
+        for email in emails:
+            # Normalized once up front, so that the first leaf is not charged for it
+            email.normalized
+            # Every leaf is evaluated, since short-circuiting would skew the hit rates
+            for leaf_stats, compiled_leaf in compiled_leaves:
+                start_ns = perf_counter_ns()
+                result = compiled_leaf(email)
+                leaf_stats.total_time_ns += perf_counter_ns() - start_ns
+                leaf_stats.evaluations += 1
+                leaf_stats.hits += result
+
+    @staticmethod
+    def create(rule_filters: Iterable[RuleFilter], emails: Iterable[Email]) -> "RuleFilterProfile":
+        profile = RuleFilterProfile()
+        profile.record(rule_filters, emails)
+        return profile
+
+    def get_default_cost(self) -> float:
+        costs = [leaf_stats.get_cost() for leaf_stats in self.leaf_stats.values() if leaf_stats.evaluations]
+        return sum(costs) / len(costs) if costs else 1.0
+
+    def estimate_cost_and_hit_rate(self, rule_filter: RuleFilter) -> tuple[float, float]:
+        # Expected cost of evaluating the filter with short-circuiting, assuming its arguments are independent
+        if isinstance(rule_filter, ConstantRuleFilter):
+            return 0.0, float(rule_filter.value)
+        if isinstance(rule_filter, NegatedRuleFilter):
+            cost, hit_rate = self.estimate_cost_and_hit_rate(rule_filter.arg_1)
+            return cost, 1.0 - hit_rate
+        if isinstance(rule_filter, AggregatedRuleFilter):
+            is_operator_and = rule_filter.is_operator_and()
+            total_cost = 0.0
+            # Chance that evaluation carries on to the next argument
+            continue_rate = 1.0
+            for arg in rule_filter.args:
+                cost, hit_rate = self.estimate_cost_and_hit_rate(arg)
+                total_cost += continue_rate * cost
+                continue_rate *= hit_rate if is_operator_and else 1.0 - hit_rate
+            return total_cost, continue_rate if is_operator_and else 1.0 - continue_rate
+
+        leaf_stats = self.leaf_stats.get(get_leaf_stats_key(rule_filter))
+        if leaf_stats is None or not leaf_stats.evaluations:
+            return self.get_default_cost(), UNKNOWN_HIT_RATE
+        return leaf_stats.get_cost(), leaf_stats.get_hit_rate()
+
+
+def iterate_leaf_rule_filters(rule_filter: RuleFilter) -> Iterable[RuleFilter]:
+    if isinstance(rule_filter, AggregatedRuleFilter):
+        for arg in rule_filter.args:
+            yield from iterate_leaf_rule_filters(arg)
+    elif isinstance(rule_filter, NegatedRuleFilter):
+        yield from iterate_leaf_rule_filters(rule_filter.arg_1)
+    else:
+        yield rule_filter
+
+
+def reorder_rule_filter(rule_filter: RuleFilter, profile: RuleFilterProfile) -> RuleFilter:
+    # Returns the filter itself when the order does not change, the filter is never modified
+    if isinstance(rule_filter, NegatedRuleFilter):
+        arg_1 = reorder_rule_filter(rule_filter.arg_1, profile)
+        return rule_filter if arg_1 is rule_filter.arg_1 else NegatedRuleFilter.create_not(arg_1)
+    if not isinstance(rule_filter, AggregatedRuleFilter):
+        return rule_filter
+
+    is_operator_and = rule_filter.is_operator_and()
+    args_with_sort_keys: list[tuple[float, RuleFilter]] = []
+    for arg in rule_filter.args:
+        arg = reorder_rule_filter(arg, profile)
+        cost, hit_rate = profile.estimate_cost_and_hit_rate(arg)
+        # The chance of short-circuiting per unit of cost is maximised by sorting on cost / short-circuit rate
+        short_circuit_rate = 1.0 - hit_rate if is_operator_and else hit_rate
+        sort_key = cost / short_circuit_rate if short_circuit_rate > 0 else float("inf")
+        args_with_sort_keys.append((sort_key, arg))
+
+    # Stable, so arguments with equal estimates keep their order
+    args = [arg for _, arg in sorted(args_with_sort_keys, key=lambda sort_key_and_arg: sort_key_and_arg[0])]
+    if all(arg is self_arg for arg, self_arg in zip(args, rule_filter.args)):
+        return rule_filter
+    return AggregatedRuleFilter.create_and(args) if is_operator_and else AggregatedRuleFilter.create_or(args)
+
+
+def get_optimized_filter_expr(rule: Rule, profile: RuleFilterProfile | None = None) -> RuleFilter:
+    if profile is None:
+        return rule.simplified_filter_expr
+    return reorder_rule_filter(rule.simplified_filter_expr, profile)
@@ -1,38 +1,118 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Self
+from enum import Enum, auto
+from typing import TYPE_CHECKING, Any, Callable, Hashable, Iterable, Self
 
-from pydantic import BaseModel, model_validator
+from pydantic import SerializeAsAny, field_validator, model_validator
 
-from email_rules.core import Email, EmailState
+from email_rules.core import (
+    Email,
+    EmailBatch,
+    EmailState,
+    RuntimeEmailState,
+    create_mask,
+)
+from email_rules.core._cached_properties import (
+    CachedPropertiesModel,
+    TrackedModel,
+    tracked_cached_property,
+)
+from email_rules.rules._polymorphic import PolymorphicModel
 
+if TYPE_CHECKING:
+    from email_rules.rules.compilation import ExactMatchKey, RuleFilterCompiler
 
-class RuleFilter(BaseModel, ABC):
+CompiledRuleFilter = Callable[[Email], bool]
+
+
+class RuleFilter(CachedPropertiesModel, TrackedModel, PolymorphicModel, ABC):
     @abstractmethod
     def evaluate(self, email: Email) -> bool:
         pass
 
+    def compile(self, compiler: "RuleFilterCompiler | None" = None) -> CompiledRuleFilter:
+        # Custom filters only need to implement evaluate, the built-in ones return specialised closures
+        return self.evaluate
+
+    def evaluate_batch(self, batch: EmailBatch) -> int:
+        # Custom filters are evaluated one email at a time, the built-in ones work on the columns of the batch
+        return create_mask(
+            (index for index, email in enumerate(batch.emails) if self.evaluate(email)), len(batch.emails)
+        )
+
+    def get_exact_match_keys(self) -> "list[ExactMatchKey] | None":
+        # At least one of the keys has to match for the filter to match, None when there is no such set of keys
+        return None
+
+    def simplify(self) -> "RuleFilter":
+        # Returns an equivalent filter that is cheaper to evaluate and render, the filter itself is never modified
+        return self
+
+    # Both return a new filter, since rules cache the compiled form of a filter that is already part of a rule
     def __and__(self, other: "RuleFilter") -> "AggregatedRuleFilter":
         if isinstance(self, AggregatedRuleFilter) and self.is_operator_and():
-            self.append_arg(other)
-            return self
+            return AggregatedRuleFilter.create_and([*self.args, other])
         return AggregatedRuleFilter.create_and([self, other])
 
     def __or__(self, other: "RuleFilter") -> "AggregatedRuleFilter":
         if isinstance(self, AggregatedRuleFilter) and not self.is_operator_and():
-            self.append_arg(other)
-            return self
+            return AggregatedRuleFilter.create_or([*self.args, other])
         return AggregatedRuleFilter.create_or([self, other])
 
     def __invert__(self) -> "NegatedRuleFilter":
         return NegatedRuleFilter.create_not(self)
 
 
+class ConstantRuleFilter(RuleFilter):
+    value: bool
+
+    def evaluate(self, email: Email) -> bool:
+        return self.value
+
+    def compile(self, compiler: "RuleFilterCompiler | None" = None) -> CompiledRuleFilter:
+        value = self.value
+        return lambda email: value
+
+    def evaluate_batch(self, batch: EmailBatch) -> int:
+        return batch.get_full_mask() if self.value else 0
+
+    def get_exact_match_keys(self) -> "list[ExactMatchKey] | None":
+        # No key can match when the filter never matches
+        return None if self.value else []
+
+    @staticmethod
+    def create(value: bool) -> "ConstantRuleFilter":
+        return ConstantRuleFilter(value=value)
+
+    def __repr__(self) -> str:
+        return repr(self.value)
+
+
 class NegatedRuleFilter(RuleFilter):
-    arg_1: RuleFilter
+    arg_1: SerializeAsAny[RuleFilter]
 
     def evaluate(self, email: Email) -> bool:
         return not self.arg_1.evaluate(email=email)
 
+    def compile(self, compiler: "RuleFilterCompiler | None" = None) -> CompiledRuleFilter:
+        compiled_arg_1 = compiler.compile(self.arg_1) if compiler else self.arg_1.compile()
+        return lambda email: not compiled_arg_1(email)
+
+    def evaluate_batch(self, batch: EmailBatch) -> int:
+        return batch.get_full_mask() ^ self.arg_1.evaluate_batch(batch)
+
+    def get_exact_match_keys(self) -> "list[ExactMatchKey] | None":
+        return None
+
+    def simplify(self) -> RuleFilter:
+        arg_1 = self.arg_1.simplify()
+        if isinstance(arg_1, NegatedRuleFilter):
+            return arg_1.arg_1
+        if isinstance(arg_1, ConstantRuleFilter):
+            return ConstantRuleFilter.create(not arg_1.value)
+        if arg_1 is self.arg_1:
+            return self
+        return NegatedRuleFilter.create_not(arg_1)
+
     @staticmethod
     def create_not(arg_1: RuleFilter) -> "NegatedRuleFilter":
         return NegatedRuleFilter(arg_1=arg_1)
@@ -41,9 +121,26 @@ class NegatedRuleFilter(RuleFilter):
         return f"~{repr(self.arg_1)}"
 
 
+class RuleFilterOperator(Enum):
+    AND = "and"
+    OR = "or"
+
+    def apply(self, x: bool, y: bool) -> bool:
+        return x and y if self is RuleFilterOperator.AND else x or y
+
+
 class AggregatedRuleFilter(RuleFilter):
-    args: list[RuleFilter]
-    operator: Callable[[bool, bool], bool]
+    args: list[SerializeAsAny[RuleFilter]]
+    # Stored as an enum rather than a function so that the filter can be pickled and dumped
+    operator: RuleFilterOperator
+
+    @field_validator("operator", mode="before")
+    @classmethod
+    def convert_operator_function(cls, operator: Any) -> Any:
+        # Filters used to be created with the operator as a function e.g. lambda x, y: x and y
+        if callable(operator) and not isinstance(operator, RuleFilterOperator):
+            return RuleFilterOperator.OR if operator(True, False) else RuleFilterOperator.AND
+        return operator
 
     @model_validator(mode="after")
     def has_at_least_two_args(self) -> Self:
@@ -52,26 +149,129 @@ class AggregatedRuleFilter(RuleFilter):
         return self
 
     def is_operator_and(self) -> bool:
-        return not self.operator(True, False)
+        return self.operator is RuleFilterOperator.AND
 
     def evaluate(self, email: Email) -> bool:
-        result = self.operator(self.args[0].evaluate(email), self.args[1].evaluate(email))
+        result = self.operator.apply(self.args[0].evaluate(email), self.args[1].evaluate(email))
         for arg in self.args[2:]:
-            result = self.operator(result, arg.evaluate(email))
+            result = self.operator.apply(result, arg.evaluate(email))
         return result
 
+    def compile(self, compiler: "RuleFilterCompiler | None" = None) -> CompiledRuleFilter:
+        compiled_args = tuple(compiler.compile(arg) if compiler else arg.compile() for arg in self.args)
+        if self.is_operator_and():
+            return lambda email: all(compiled_arg(email) for compiled_arg in compiled_args)
+        return lambda email: any(compiled_arg(email) for compiled_arg in compiled_args)
+
+    def evaluate_batch(self, batch: EmailBatch) -> int:
+        full_mask = batch.get_full_mask()
+        if self.is_operator_and():
+            mask = full_mask
+            for arg in self.args:
+                mask &= arg.evaluate_batch(batch)
+                if not mask:
+                    break
+            return mask
+
+        mask = 0
+        for arg in self.args:
+            mask |= arg.evaluate_batch(batch)
+            if mask == full_mask:
+                break
+        return mask
+
+    def get_exact_match_keys(self) -> "list[ExactMatchKey] | None":
+        args_keys = [arg.get_exact_match_keys() for arg in self.args]
+        if self.is_operator_and():
+            # Any argument with keys is a necessary condition, so pick the most selective one
+            known_args_keys = [arg_keys for arg_keys in args_keys if arg_keys is not None]
+            return min(known_args_keys, key=len) if known_args_keys else None
+
+        keys: list[ExactMatchKey] = []
+        for arg_keys in args_keys:
+            if arg_keys is None:
+                return None
+            keys.extend(arg_keys)
+        return keys
+
+    def simplify(self) -> RuleFilter:
+        is_operator_and = self.is_operator_and()
+        args_by_key: dict[Hashable, RuleFilter] = {}
+        for arg in self._iterate_flattened_args(is_operator_and):
+            if isinstance(arg, ConstantRuleFilter):
+                if arg.value != is_operator_and:
+                    # False for and, True for or
+                    return arg
+                continue
+            args_by_key.setdefault(get_structural_key(arg), arg)
+
+        args = self._absorb_args(args_by_key, is_operator_and)
+        if not args:
+            return ConstantRuleFilter.create(is_operator_and)
+        if len(args) == 1:
+            return args[0]
+        if len(args) == len(self.args) and all(arg is self_arg for arg, self_arg in zip(args, self.args)):
+            return self
+        return AggregatedRuleFilter.create_and(args) if is_operator_and else AggregatedRuleFilter.create_or(args)
+
+    def _iterate_flattened_args(self, is_operator_and: bool) -> Iterable[RuleFilter]:
+        for arg in self.args:
+            arg = arg.simplify()
+            if isinstance(arg, AggregatedRuleFilter) and arg.is_operator_and() == is_operator_and:
+                yield from arg.args
+            else:
+                yield arg
+
+    @staticmethod
+    def _absorb_args(args_by_key: dict[Hashable, RuleFilter], is_operator_and: bool) -> list[RuleFilter]:
+        # x & (x | y) == x and x | (x & y) == x, so an argument of the other operator is dropped when another argument
+        # covers a subset of its arguments. The first of two arguments covering the same arguments is kept. The given
+        # arguments are simplified, so any other argument covers a single filter and is found by its key, while the
+        # arguments of the other operator are only compared with those sharing one of their arguments.
+        args = list(args_by_key.values())
+        groups_member_keys: dict[int, frozenset[Hashable]] = {
+            # The structural key of an aggregated filter ends with the keys of its arguments
+            arg_index: frozenset(arg_key[2])  # type: ignore[index]
+            for arg_index, (arg_key, arg) in enumerate(args_by_key.items())
+            if isinstance(arg, AggregatedRuleFilter) and arg.is_operator_and() != is_operator_and
+        }
+        if not groups_member_keys:
+            return args
+        # A group covering a subset of the arguments of another contains its first argument in particular
+        group_indices_by_first_member_key: dict[Hashable, list[int]] = {}
+        for arg_index, member_keys in groups_member_keys.items():
+            group_indices_by_first_member_key.setdefault(next(iter(member_keys)), []).append(arg_index)
+
+        def is_absorbed(arg_index: int, member_keys: frozenset[Hashable]) -> bool:
+            if not member_keys.isdisjoint(args_by_key):
+                return True
+            for member_key in member_keys:
+                for other_index in group_indices_by_first_member_key.get(member_key, ()):
+                    other_member_keys = groups_member_keys[other_index]
+                    if other_member_keys < member_keys or (
+                        other_member_keys == member_keys and other_index < arg_index
+                    ):
+                        return True
+            return False
+
+        return [
+            arg
+            for arg_index, arg in enumerate(args)
+            if arg_index not in groups_member_keys or not is_absorbed(arg_index, groups_member_keys[arg_index])
+        ]
+
     @staticmethod
     def create_and(args: list[RuleFilter]) -> "AggregatedRuleFilter":
         return AggregatedRuleFilter(
             args=args,
-            operator=lambda x, y: x and y,
+            operator=RuleFilterOperator.AND,
         )
 
     @staticmethod
     def create_or(args: list[RuleFilter]) -> "AggregatedRuleFilter":
         return AggregatedRuleFilter(
             args=args,
-            operator=lambda x, y: x or y,
+            operator=RuleFilterOperator.OR,
         )
 
     def append_arg(self, arg: RuleFilter) -> None:
@@ -82,6 +282,28 @@ class AggregatedRuleFilter(RuleFilter):
         return "(" + operator.join([repr(arg) for arg in self.args]) + ")"
 
 
+def get_structural_key(rule_filter: RuleFilter, subexpression_keys: list[Hashable] | None = None) -> Hashable:
+    # Equal keys mean equal filters, the keys of every subexpression are appended to subexpression_keys if given
+    key: Hashable
+    if isinstance(rule_filter, AggregatedRuleFilter):
+        arg_keys = tuple(get_structural_key(arg, subexpression_keys) for arg in rule_filter.args)
+        key = (AggregatedRuleFilter, rule_filter.is_operator_and(), arg_keys)
+    elif isinstance(rule_filter, NegatedRuleFilter):
+        key = (NegatedRuleFilter, get_structural_key(rule_filter.arg_1, subexpression_keys))
+    else:
+        fields = tuple((name, getattr(rule_filter, name)) for name in type(rule_filter).__pydantic_fields__)
+        key = (type(rule_filter), fields)
+        try:
+            hash(key)
+        except TypeError:
+            # Filters with unhashable fields are only ever equal to themselves
+            key = (type(rule_filter), id(rule_filter))
+
+    if subexpression_keys is not None:
+        subexpression_keys.append(key)
+    return key
+
+
 class RuleActionApplicationException(Exception):
     pass
 
@@ -94,17 +316,53 @@ class RuleActionStopProcessingAllFilesException(Exception):
     pass
 
 
-class RuleAction(BaseModel, ABC):
+class RuleApplicationInterruptState(Enum):
+    CONTINUE = auto()
+    STOP_PROCESSING_CURRENT_FILE = auto()
+    STOP_PROCESSING_ALL_FILES = auto()
+
+
+class RuleAction(TrackedModel, PolymorphicModel, ABC):
     @abstractmethod
     def apply(self, email_state: EmailState) -> EmailState:
         pass
 
+    def apply_with_interrupt_state(self, email_state: EmailState) -> tuple[EmailState, RuleApplicationInterruptState]:
+        # Actions that stop processing can override this to avoid raising, custom actions can keep raising in apply
+        try:
+            return self.apply(email_state), RuleApplicationInterruptState.CONTINUE
+        except RuleActionStopProcessingCurrentFileException:
+            return email_state, RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE
+        except RuleActionStopProcessingAllFilesException:
+            return email_state, RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES
+
+    def apply_to_runtime_state(
+        self, email_state: RuntimeEmailState
+    ) -> tuple[RuntimeEmailState, RuleApplicationInterruptState]:
+        # Custom actions only need to implement apply, the built-in ones work on the runtime state directly
+        new_email_state, rule_application_interrupt_state = self.apply_with_interrupt_state(
+            email_state.to_email_state()
+        )
+        return RuntimeEmailState.from_email_state(new_email_state), rule_application_interrupt_state
+
 
-class Rule(BaseModel):
-    filter_expr: RuleFilter
-    actions: list[RuleAction]
+class Rule(CachedPropertiesModel, TrackedModel):
+    filter_expr: SerializeAsAny[RuleFilter]
+    actions: list[SerializeAsAny[RuleAction]]
     comment: str | None = None
 
+    # Both are computed again once the filter expression, or any other rule, is modified in place
+    @tracked_cached_property
+    def simplified_filter_expr(self) -> RuleFilter:
+        return self.filter_expr.simplify()
+
+    @tracked_cached_property
+    def compiled_filter_expr(self) -> CompiledRuleFilter:
+        return self.simplified_filter_expr.compile()
+
+    def evaluate_batch(self, batch: EmailBatch) -> int:
+        return self.simplified_filter_expr.evaluate_batch(batch)
+
     def __repr__(self) -> str:
         actions_repr = "[" + ", ".join([repr(action) for action in self.actions]) + "]"
         comment_repr = f"{self.comment} " if self.comment else ""
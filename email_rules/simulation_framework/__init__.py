@@ -1,36 +1,109 @@
+from email_rules.rules import RuleApplicationInterruptState
+from email_rules.simulation_framework.application_trace import (
+    RuleApplicationTrace,
+    RuleApplicationTraceStep,
+    TraceVerbosity,
+)
+from email_rules.simulation_framework.async_simulation import (
+    DEFAULT_EXECUTOR_BATCH_SIZE,
+    DEFAULT_MAX_QUEUE_SIZE,
+    apply_rule_files_to_email_iteratively_async,
+    get_final_email_states_async,
+    merge_email_sources,
+)
+from email_rules.simulation_framework.batch_simulation import (
+    DEFAULT_CHUNK_SIZE,
+    get_final_email_states,
+    get_final_email_states_from_batch,
+    iterate_email_chunks,
+)
+from email_rules.simulation_framework.email_state_cache import (
+    EmailStateCache,
+    EmailStateCacheKey,
+    get_email_state_cache_key,
+)
 from email_rules.simulation_framework.rule_application import (
+    apply_rule_files_to_email_final_state,
     apply_rule_files_to_email_iteratively,
+    apply_rule_files_to_email_with_trace,
     apply_rule_to_email,
     apply_rules_to_email,
+    apply_rules_to_email_final_state,
     apply_rules_to_email_iteratively,
     display_rule_file_application_states,
+    get_compiled_rule_files,
+)
+from email_rules.simulation_framework.rule_program import (
+    RuleFileIndex,
+    RuleInstruction,
+    RuleOpcode,
+    RuleProgram,
 )
 from email_rules.simulation_framework.rule_simulation import (
     EmailAccountSettings,
     EmailRuleSimulation,
     IterableClass,
 )
+from email_rules.simulation_framework.settings_cache import (
+    EmailAccountSettingsCache,
+    get_files_content_hash,
+    get_settings_schema_fingerprint,
+)
 from email_rules.simulation_framework.type_defs import (
-    RuleApplicationInterruptState,
     RuleApplicationState,
     RuleFile,
     RuleFileApplicationState,
+    display_rule_application_step,
 )
 
 __all__ = (
+    # application_trace.py
+    "RuleApplicationTrace",
+    "RuleApplicationTraceStep",
+    "TraceVerbosity",
+    # async_simulation.py
+    "DEFAULT_EXECUTOR_BATCH_SIZE",
+    "DEFAULT_MAX_QUEUE_SIZE",
+    "apply_rule_files_to_email_iteratively_async",
+    "get_final_email_states_async",
+    "merge_email_sources",
+    # batch_simulation.py
+    "DEFAULT_CHUNK_SIZE",
+    "get_final_email_states",
+    "get_final_email_states_from_batch",
+    "iterate_email_chunks",
+    # email_state_cache.py
+    "EmailStateCache",
+    "EmailStateCacheKey",
+    "get_email_state_cache_key",
     # rule_application.py
     "apply_rule_to_email",
     "apply_rules_to_email_iteratively",
     "apply_rules_to_email",
     "apply_rule_files_to_email_iteratively",
+    "apply_rules_to_email_final_state",
+    "apply_rule_files_to_email_final_state",
+    "apply_rule_files_to_email_with_trace",
     "display_rule_file_application_states",
+    "get_compiled_rule_files",
+    # rule_program.py
+    "RuleFileIndex",
+    "RuleInstruction",
+    "RuleOpcode",
+    "RuleProgram",
     # rule_simulation.py
     "IterableClass",
     "EmailAccountSettings",
     "EmailRuleSimulation",
+    # settings_cache.py
+    "EmailAccountSettingsCache",
+    "get_files_content_hash",
+    "get_settings_schema_fingerprint",
     # type_defs.py
-    "RuleApplicationInterruptState",
     "RuleApplicationState",
     "RuleFile",
     "RuleFileApplicationState",
+    "display_rule_application_step",
+    # Defined in email_rules.rules, re-exported for existing imports
+    "RuleApplicationInterruptState",
 )
@@ -0,0 +1,136 @@
+from array import array
+from enum import Enum, auto
+from typing import Iterable, NamedTuple, Sequence
+
+from email_rules.rules import Rule, RuleApplicationInterruptState
+from email_rules.simulation_framework.type_defs import (
+    RuleApplicationState,
+    RuleFile,
+    display_rule_application_step,
+)
+
+# Stored in the index columns in place of None
+_NO_INDEX = -1
+
+
+class TraceVerbosity(Enum):
+    NONE = auto()
+    # One step for each rule that matched, once its actions have been applied
+    RULES_MATCHED = auto()
+    # The same steps as the state history, without the email states
+    FULL = auto()
+
+
+class RuleApplicationTraceStep(NamedTuple):
+    rule_file_index: int | None
+    rule_index: int | None
+    current_rule_applied: bool
+    action_index: int | None
+    rule_application_interrupt_state: RuleApplicationInterruptState
+
+    def display(self, rules: Sequence[Rule]) -> str:
+        return display_rule_application_step(
+            rules, self.rule_index, self.current_rule_applied, self.action_index, self.rule_application_interrupt_state
+        )
+
+
+# Records the steps of applying rule files in parallel arrays of indices, which take a few bytes per step rather than a
+# RuleApplicationState each. When max_steps is given only the last max_steps steps are kept.
+class RuleApplicationTrace:
+    def __init__(self, verbosity: TraceVerbosity = TraceVerbosity.FULL, max_steps: int | None = None) -> None:
+        assert max_steps is None or max_steps > 0, "Should keep at least one step"
+        self.verbosity = verbosity
+        self.max_steps = max_steps
+        # Includes the steps that were dropped from the ring buffer
+        self.recorded_step_count = 0
+        self._rule_file_indices = array("i")
+        self._rule_indices = array("i")
+        self._action_indices = array("i")
+        self._interrupt_state_codes = array("b")
+        self._current_rules_applied = array("b")
+
+    def record(
+        self,
+        rule_file_index: int | None,
+        rule_index: int | None,
+        current_rule_applied: bool,
+        action_index: int | None,
+        rule_application_interrupt_state: RuleApplicationInterruptState,
+    ) -> None:
+        values = (
+            _NO_INDEX if rule_file_index is None else rule_file_index,
+            _NO_INDEX if rule_index is None else rule_index,
+            _NO_INDEX if action_index is None else action_index,
+            rule_application_interrupt_state.value,
+            current_rule_applied,
+        )
+        columns = self._get_columns()
+        if self.max_steps is not None and self.recorded_step_count >= self.max_steps:
+            # The ring buffer is full, so the oldest step is overwritten
+            position = self.recorded_step_count % self.max_steps
+            for column, value in zip(columns, values):
+                column[position] = value
+        else:
+            for column, value in zip(columns, values):
+                column.append(value)
+        self.recorded_step_count += 1
+
+    def record_state(self, rule_application_state: RuleApplicationState) -> None:
+        self.record(
+            rule_application_state.rule_file_index,
+            rule_application_state.rule_index,
+            rule_application_state.current_rule_applied,
+            rule_application_state.action_index,
+            rule_application_state.rule_application_interrupt_state,
+        )
+
+    def _get_columns(self) -> tuple["array[int]", ...]:
+        return (
+            self._rule_file_indices,
+            self._rule_indices,
+            self._action_indices,
+            self._interrupt_state_codes,
+            self._current_rules_applied,
+        )
+
+    def clear(self) -> None:
+        for column in self._get_columns():
+            del column[:]
+        self.recorded_step_count = 0
+
+    def __len__(self) -> int:
+        return len(self._rule_indices)
+
+    def iterate_steps(self) -> Iterable[RuleApplicationTraceStep]:
+        # Oldest first, the oldest step is the one that would be overwritten next once the ring buffer is full
+        step_count = len(self)
+        first_position = self.recorded_step_count % step_count if self.recorded_step_count > step_count else 0
+        for offset in range(step_count):
+            position = (first_position + offset) % step_count
+            rule_file_index = self._rule_file_indices[position]
+            rule_index = self._rule_indices[position]
+            action_index = self._action_indices[position]
+            yield RuleApplicationTraceStep(
+                rule_file_index=None if rule_file_index == _NO_INDEX else rule_file_index,
+                rule_index=None if rule_index == _NO_INDEX else rule_index,
+                current_rule_applied=bool(self._current_rules_applied[position]),
+                action_index=None if action_index == _NO_INDEX else action_index,
+                rule_application_interrupt_state=RuleApplicationInterruptState(self._interrupt_state_codes[position]),
+            )
+
+    def display(self, rule_files: Sequence[RuleFile]) -> str:
+        # Same layout as display_rule_file_application_states, the rule files should be the ones that were applied
+        lines = []
+        if self.recorded_step_count > len(self):
+            lines.append(f"{self.recorded_step_count - len(self)} earlier steps dropped")
+
+        last_rule_file_index: int | None = _NO_INDEX
+        for step in self.iterate_steps():
+            if step.rule_file_index != last_rule_file_index:
+                last_rule_file_index = step.rule_file_index
+                lines.append(
+                    str(rule_files[step.rule_file_index].file_name if step.rule_file_index is not None else None)
+                )
+            rules = rule_files[step.rule_file_index].rules if step.rule_file_index is not None else []
+            lines.append("\t" + step.display(rules))
+        return "\n".join(lines)
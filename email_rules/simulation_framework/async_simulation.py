@@ -0,0 +1,114 @@
+import asyncio
+from concurrent.futures import Executor
+from contextlib import suppress
+from typing import AsyncGenerator, AsyncIterable, Sequence
+
+from email_rules.core import Email, EmailState
+from email_rules.rules import CompiledRuleSet
+from email_rules.simulation_framework.batch_simulation import DEFAULT_CHUNK_SIZE
+from email_rules.simulation_framework.rule_application import (
+    apply_rule_files_to_email_iteratively,
+)
+from email_rules.simulation_framework.rule_simulation import EmailAccountSettings
+from email_rules.simulation_framework.type_defs import (
+    RuleFile,
+    RuleFileApplicationState,
+)
+
+DEFAULT_MAX_QUEUE_SIZE = 1024
+# Smaller batches are matched on the event loop, since handing them to the executor costs more than matching them
+DEFAULT_EXECUTOR_BATCH_SIZE = 64
+
+# Each source puts its emails on the queue followed by None, or the exception that stopped it
+_EmailQueue = asyncio.Queue[Email | Exception | None]
+
+
+async def apply_rule_files_to_email_iteratively_async(
+    email: Email, rule_files: Sequence[RuleFile], compiled_rule_files: Sequence[CompiledRuleSet] | None = None
+) -> AsyncGenerator[RuleFileApplicationState, None]:
+    # Gives other tasks a turn after each rule file
+    for file_state in apply_rule_files_to_email_iteratively(email, rule_files, compiled_rule_files):
+        yield file_state
+        await asyncio.sleep(0)
+
+
+async def _enqueue_emails(emails: AsyncIterable[Email], queue: _EmailQueue) -> None:
+    try:
+        async for email in emails:
+            # Waits while the queue is full, which is what slows down a source that is ahead of the rule matching
+            await queue.put(email)
+    except Exception as error:
+        await queue.put(error)
+        return
+    await queue.put(None)
+
+
+async def merge_email_sources(
+    *sources: AsyncIterable[Email], max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE
+) -> AsyncGenerator[Email, None]:
+    # Yields the emails of every source as they arrive, so a slow source does not hold up the others
+    queue: _EmailQueue = asyncio.Queue(max_queue_size)
+    tasks = [asyncio.create_task(_enqueue_emails(source, queue)) for source in sources]
+    try:
+        remaining_source_count = len(tasks)
+        while remaining_source_count:
+            item = await queue.get()
+            if item is None:
+                remaining_source_count -= 1
+            elif isinstance(item, Exception):
+                raise item
+            else:
+                yield item
+    finally:
+        for task in tasks:
+            task.cancel()
+        with suppress(asyncio.CancelledError):
+            await asyncio.gather(*tasks)
+
+
+def _get_final_email_states_for_batch(inbox: EmailAccountSettings, emails: list[Email]) -> list[EmailState]:
+    return [inbox.get_final_email_state_after_filtering(email) for email in emails]
+
+
+async def get_final_email_states_async(
+    inbox: EmailAccountSettings,
+    emails: AsyncIterable[Email],
+    max_batch_size: int = DEFAULT_CHUNK_SIZE,
+    max_queue_size: int = DEFAULT_MAX_QUEUE_SIZE,
+    executor_batch_size: int = DEFAULT_EXECUTOR_BATCH_SIZE,
+    executor: Executor | None = None,
+) -> AsyncGenerator[EmailState, None]:
+    # Yields the final state of each email in the order they arrive. At most max_queue_size emails are read ahead of
+    # the matching, and nothing is matched while the caller is not asking for states. Emails that are already queued
+    # are matched together, in the executor (the default one if None) once there are at least executor_batch_size.
+    assert max_batch_size > 0, "Batch size should be positive"
+    queue: _EmailQueue = asyncio.Queue(max_queue_size)
+    task = asyncio.create_task(_enqueue_emails(emails, queue))
+    try:
+        is_done = False
+        while not is_done:
+            batch: list[Email] = []
+            item = await queue.get()
+            while True:
+                if item is None:
+                    is_done = True
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                batch.append(item)
+                if len(batch) >= max_batch_size or queue.empty():
+                    break
+                item = queue.get_nowait()
+
+            if len(batch) >= executor_batch_size:
+                email_states = await asyncio.get_running_loop().run_in_executor(
+                    executor, _get_final_email_states_for_batch, inbox, batch
+                )
+            else:
+                email_states = _get_final_email_states_for_batch(inbox, batch)
+            for email_state in email_states:
+                yield email_state
+    finally:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
@@ -0,0 +1,114 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from typing import Generator, Iterable
+
+from email_rules.core import (
+    Email,
+    EmailBatch,
+    EmailState,
+    RuntimeEmailState,
+    create_mask,
+    iterate_mask_indices,
+)
+from email_rules.rules import RuleApplicationInterruptState
+from email_rules.simulation_framework.rule_simulation import EmailAccountSettings
+
+DEFAULT_CHUNK_SIZE = 256
+
+# Set once in each worker process by _initialize_worker, so the settings are only sent and compiled once per worker
+_worker_inbox: EmailAccountSettings | None = None
+
+
+def _initialize_worker(inbox: EmailAccountSettings) -> None:
+    global _worker_inbox
+    _worker_inbox = inbox
+    # Compiled up front rather than while timing the first chunk
+    inbox.rule_program
+
+
+def _get_final_email_states_in_worker(emails: list[Email]) -> list[EmailState]:
+    assert _worker_inbox is not None, "Worker should have been initialized with the settings"
+    return [_worker_inbox.get_final_email_state_after_filtering(email) for email in emails]
+
+
+def get_final_email_states_from_batch(inbox: EmailAccountSettings, batch: EmailBatch) -> list[EmailState]:
+    # Same states as get_final_email_state_after_filtering for each email, but each rule is evaluated once for the whole
+    # batch as a bitmask. Filters only depend on the email, so applying one rule at a time to every email it matches
+    # gives the same states as applying every rule to one email at a time.
+    initial_email_state = RuntimeEmailState.from_email_state(EmailState.create_initial_state())
+    email_states = [initial_email_state] * len(batch.emails)
+    # Emails that have not stopped processing all files
+    active_mask = batch.get_full_mask()
+    for rule_file in inbox.rule_files:
+        # Emails that have not stopped processing the current file either
+        file_active_mask = active_mask
+        for rule in rule_file.rules:
+            if not file_active_mask:
+                break
+            matching_mask = rule.evaluate_batch(batch) & file_active_mask
+            # Removed from the masks once per rule, since every change to a mask copies the whole mask
+            stopped_current_file_indices: list[int] = []
+            stopped_all_files_indices: list[int] = []
+            for index in iterate_mask_indices(matching_mask):
+                email_state = email_states[index]
+                for action in rule.actions:
+                    email_state, rule_application_interrupt_state = action.apply_to_runtime_state(email_state)
+                    if rule_application_interrupt_state == RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE:
+                        stopped_current_file_indices.append(index)
+                        break
+                    if rule_application_interrupt_state == RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES:
+                        stopped_all_files_indices.append(index)
+                        break
+                email_states[index] = email_state
+
+            if stopped_all_files_indices:
+                active_mask &= ~create_mask(stopped_all_files_indices, len(batch.emails))
+            if stopped_current_file_indices or stopped_all_files_indices:
+                file_active_mask &= ~create_mask(
+                    stopped_current_file_indices + stopped_all_files_indices, len(batch.emails)
+                )
+
+    # Emails often end up in the same state, each distinct state is only converted once
+    converted_email_states = {email_state: email_state.to_email_state() for email_state in set(email_states)}
+    return [converted_email_states[email_state] for email_state in email_states]
+
+
+def iterate_email_chunks(emails: Iterable[Email], chunk_size: int) -> Iterable[list[Email]]:
+    email_iterator = iter(emails)
+    while chunk := list(islice(email_iterator, chunk_size)):
+        yield chunk
+
+
+def get_final_email_states(
+    inbox: EmailAccountSettings,
+    emails: Iterable[Email],
+    max_workers: int | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    max_chunks_in_flight: int | None = None,
+) -> Generator[EmailState, None, None]:
+    # Yields the final state of each email in the order of the emails. The emails are read lazily and at most
+    # max_chunks_in_flight chunks are queued or being processed at once, so memory does not grow with the number of
+    # emails. The settings are pickled once for each worker, so they need to be picklable.
+    assert chunk_size > 0, "Chunk size should be positive"
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if max_chunks_in_flight is None:
+        # Enough for every worker to start on the next chunk while the results of the previous one are consumed
+        max_chunks_in_flight = 2 * max_workers
+    assert max_chunks_in_flight > 0, "Should allow at least one chunk in flight"
+
+    executor = ProcessPoolExecutor(max_workers, initializer=_initialize_worker, initargs=(inbox,))
+
+    futures: deque[Future[list[EmailState]]] = deque()
+    try:
+        for chunk in iterate_email_chunks(emails, chunk_size):
+            if len(futures) >= max_chunks_in_flight:
+                yield from futures.popleft().result()
+            futures.append(executor.submit(_get_final_email_states_in_worker, chunk))
+        while futures:
+            yield from futures.popleft().result()
+    finally:
+        # Chunks that have not started are dropped when the caller stops early
+        executor.shutdown(cancel_futures=True)
@@ -0,0 +1,54 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Generic, TypeVar
+
+from email_rules.core import Email, EmailFrom, EmailSubject, EmailTo
+
+T = TypeVar("T")
+
+# The fields are not normalized, since case sensitive filters can tell apart emails that only differ in case
+EmailStateCacheKey = tuple[EmailFrom, tuple[EmailTo, ...], EmailSubject]
+
+
+def get_email_state_cache_key(email: Email) -> EmailStateCacheKey:
+    return email.email_from, tuple(email.email_to), email.email_subject
+
+
+# Least recently used cache of results by the fields filters can look at, so repeated emails e.g. newsletters are only
+# filtered once. Locked so that it can be shared with executor threads.
+class EmailStateCache(Generic[T]):
+    def __init__(self, max_size: int) -> None:
+        assert max_size > 0, "Cache size should be positive"
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._values: OrderedDict[EmailStateCacheKey, T] = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, email: Email) -> T | None:
+        key = get_email_state_cache_key(email)
+        with self._lock:
+            value = self._values.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._values.move_to_end(key)
+            return value
+
+    def put(self, email: Email, value: T) -> None:
+        key = get_email_state_cache_key(email)
+        with self._lock:
+            self._values[key] = value
+            self._values.move_to_end(key)
+            if len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._values)
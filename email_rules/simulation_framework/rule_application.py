@@ -1,69 +1,114 @@
 from typing import Iterable, Sequence
 
-from email_rules.core import Email, EmailState
+from email_rules.core import Email, EmailState, RuntimeEmailState
 from email_rules.rules import (
+    CompiledRuleFilter,
+    CompiledRuleSet,
     Rule,
-    RuleActionStopProcessingAllFilesException,
-    RuleActionStopProcessingCurrentFileException,
+    RuleApplicationInterruptState,
+)
+from email_rules.simulation_framework.application_trace import (
+    RuleApplicationTrace,
+    TraceVerbosity,
 )
 from email_rules.simulation_framework.type_defs import (
-    RuleApplicationInterruptState,
     RuleApplicationState,
     RuleFile,
     RuleFileApplicationState,
 )
 
 
-def apply_rule_to_email(rule: Rule, email: Email, email_state: EmailState) -> Iterable[RuleApplicationState]:
+def _never_matches(email: Email) -> bool:
+    return False
+
+
+def get_compiled_rule_files(
+    rule_files: Sequence[RuleFile], compiled_rule_files: Sequence[CompiledRuleSet] | None
+) -> list[CompiledRuleSet]:
+    # Rules modified since they were compiled are compiled again rather than matched with the stale compiled filters
+    if compiled_rule_files is None:
+        return [rule_file.compiled_rules for rule_file in rule_files]
+    assert len(compiled_rule_files) == len(rule_files), "Should have compiled rules for each rule file"
+    return [
+        compiled_rules if compiled_rules.is_compiled_from(rule_file.rules) else rule_file.compiled_rules
+        for rule_file, compiled_rules in zip(rule_files, compiled_rule_files)
+    ]
+
+
+def apply_rule_to_email(
+    rule: Rule,
+    email: Email,
+    email_state: EmailState,
+    compiled_filter_expr: CompiledRuleFilter | None = None,
+    rule_index: int = 0,
+    rule_file_index: int | None = None,
+) -> Iterable[RuleApplicationState]:
+    # rule_index and rule_file_index locate the rule for display, a single rule is treated as a list of one rule
     rule_application_interrupt_state = RuleApplicationInterruptState.CONTINUE
-    if not rule.filter_expr.evaluate(email):
+    compiled_filter_expr = compiled_filter_expr or rule.compiled_filter_expr
+    if not compiled_filter_expr(email):
         yield RuleApplicationState(
             email_state=email_state,
             rule_application_interrupt_state=rule_application_interrupt_state,
-            current_rule=repr(rule),
+            rule_file_index=rule_file_index,
+            rule_index=rule_index,
             current_rule_applied=False,
-            current_action=None,
+            action_index=None,
         )
         return
 
-    for action in rule.actions:
+    for action_index, action in enumerate(rule.actions):
         if rule_application_interrupt_state != RuleApplicationInterruptState.CONTINUE:
             break
-        try:
-            email_state = action.apply(email_state)
-        except RuleActionStopProcessingCurrentFileException:
-            rule_application_interrupt_state = RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE
-        except RuleActionStopProcessingAllFilesException:
-            rule_application_interrupt_state = RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES
+        email_state, rule_application_interrupt_state = action.apply_with_interrupt_state(email_state)
 
         yield RuleApplicationState(
             email_state=email_state,
             rule_application_interrupt_state=rule_application_interrupt_state,
-            current_rule=repr(rule),
+            rule_file_index=rule_file_index,
+            rule_index=rule_index,
             current_rule_applied=True,
-            current_action=repr(action),
+            action_index=action_index,
         )
 
     yield RuleApplicationState(
         email_state=email_state,
         rule_application_interrupt_state=rule_application_interrupt_state,
-        current_rule=repr(rule),
+        rule_file_index=rule_file_index,
+        rule_index=rule_index,
         current_rule_applied=True,
-        current_action=None,
+        action_index=None,
     )
 
 
 def apply_rules_to_email_iteratively(
-    email: Email, rules: Sequence["Rule"], current_state: RuleApplicationState | None = None
+    email: Email,
+    rules: Sequence["Rule"],
+    current_state: RuleApplicationState | None = None,
+    compiled_rules: CompiledRuleSet | None = None,
+    rule_file_index: int | None = None,
 ) -> Iterable[RuleApplicationState]:
     current_state = RuleApplicationState.create_initial_state() if not current_state else current_state
     yield current_state
 
-    for rule in rules:
+    if compiled_rules is not None and compiled_rules.is_compiled_from(rules):
+        compiled_filter_exprs = compiled_rules.compiled_filter_exprs
+        candidate_rule_indices = set(compiled_rules.get_candidate_rule_indices(email))
+    else:
+        compiled_filter_exprs = [rule.compiled_filter_expr for rule in rules]
+        candidate_rule_indices = set(range(len(rules)))
+
+    for rule_index, rule in enumerate(rules):
         if current_state.rule_application_interrupt_state != RuleApplicationInterruptState.CONTINUE:
             break
 
-        for state_after_action in apply_rule_to_email(rule, email, current_state.email_state):
+        compiled_filter_expr = (
+            compiled_filter_exprs[rule_index] if rule_index in candidate_rule_indices else _never_matches
+        )
+
+        for state_after_action in apply_rule_to_email(
+            rule, email, current_state.email_state, compiled_filter_expr, rule_index, rule_file_index
+        ):
             yield state_after_action
             current_state = state_after_action
 
@@ -72,22 +117,64 @@ def apply_rules_to_email(email: Email, rules: Sequence["Rule"]) -> RuleApplicati
     if len(rules) == 0:
         return RuleApplicationState.create_initial_state()
 
-    states = list(apply_rules_to_email_iteratively(email, rules))
-    assert len(states) > 0, "We should always have the initial state at least"
-    return states[-1]
+    # Only the last state is needed, so the history is not kept
+    last_state: RuleApplicationState | None = None
+    for last_state in apply_rules_to_email_iteratively(email, rules):
+        pass
+    assert last_state is not None, "We should always have the initial state at least"
+    return last_state
+
+
+def _apply_rules_to_runtime_state(
+    email: Email,
+    rules: Sequence[Rule],
+    email_state: RuntimeEmailState,
+    compiled_rules: CompiledRuleSet | None = None,
+) -> tuple[RuntimeEmailState, RuleApplicationInterruptState]:
+    if compiled_rules is not None and compiled_rules.is_compiled_from(rules):
+        matching_rule_indices = compiled_rules.iterate_matching_rule_indices(email)
+    else:
+        matching_rule_indices = (
+            rule_index for rule_index, rule in enumerate(rules) if rule.compiled_filter_expr(email)
+        )
+
+    for rule_index in matching_rule_indices:
+        for action in rules[rule_index].actions:
+            email_state, rule_application_interrupt_state = action.apply_to_runtime_state(email_state)
+            if rule_application_interrupt_state != RuleApplicationInterruptState.CONTINUE:
+                return email_state, rule_application_interrupt_state
+    return email_state, RuleApplicationInterruptState.CONTINUE
+
+
+def apply_rules_to_email_final_state(
+    email: Email,
+    rules: Sequence[Rule],
+    email_state: EmailState | None = None,
+    compiled_rules: CompiledRuleSet | None = None,
+) -> tuple[EmailState, RuleApplicationInterruptState]:
+    # Same result as the last state of apply_rules_to_email_iteratively, without creating the intermediate states
+    email_state = email_state if email_state is not None else EmailState.create_initial_state()
+    runtime_email_state, rule_application_interrupt_state = _apply_rules_to_runtime_state(
+        email, rules, RuntimeEmailState.from_email_state(email_state), compiled_rules
+    )
+    return runtime_email_state.to_email_state(), rule_application_interrupt_state
 
 
 def apply_rule_files_to_email_iteratively(
-    email: Email, rule_files: Sequence[RuleFile]
+    email: Email, rule_files: Sequence[RuleFile], compiled_rule_files: Sequence[CompiledRuleSet] | None = None
 ) -> Iterable[RuleFileApplicationState]:
+    compiled_rule_files = get_compiled_rule_files(rule_files, compiled_rule_files)
+
     current_file_state = RuleFileApplicationState.create_initial_state()
     yield current_file_state
     last_application_state = current_file_state.last_rule_application_state
 
-    for rule_file in rule_files:
+    for rule_file_index, (rule_file, compiled_rules) in enumerate(zip(rule_files, compiled_rule_files)):
         # We yield the initial state above, so there is no need to provide it again
         rule_application_state_history = list(
-            apply_rules_to_email_iteratively(email, rule_file.rules, last_application_state)
+            apply_rules_to_email_iteratively(
+                email, rule_file.rules, last_application_state, compiled_rules, rule_file_index
+            )
         )[1:]
 
         current_file_state = RuleFileApplicationState(
@@ -105,28 +192,104 @@ def apply_rule_files_to_email_iteratively(
         last_application_state = RuleApplicationState(
             email_state=last_application_state.email_state,
             rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-            current_rule=None,
+            rule_index=None,
             current_rule_applied=False,
-            current_action=None,
+            action_index=None,
         )
 
 
-def display_rule_file_application_states(file_states: list[RuleFileApplicationState]) -> str:
+def apply_rule_files_to_email_final_state(
+    email: Email, rule_files: Sequence[RuleFile], compiled_rule_files: Sequence[CompiledRuleSet] | None = None
+) -> tuple[EmailState, RuleApplicationInterruptState]:
+    compiled_rule_files = get_compiled_rule_files(rule_files, compiled_rule_files)
+
+    # The email state is only converted to and from the runtime state once for all of the files
+    email_state = RuntimeEmailState.from_email_state(EmailState.create_initial_state())
+    rule_application_interrupt_state = RuleApplicationInterruptState.CONTINUE
+    for rule_file, compiled_rules in zip(rule_files, compiled_rule_files):
+        email_state, rule_application_interrupt_state = _apply_rules_to_runtime_state(
+            email, rule_file.rules, email_state, compiled_rules
+        )
+        if rule_application_interrupt_state == RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES:
+            break
+    return email_state.to_email_state(), rule_application_interrupt_state
+
+
+def apply_rule_files_to_email_with_trace(
+    email: Email,
+    rule_files: Sequence[RuleFile],
+    trace: RuleApplicationTrace,
+    compiled_rule_files: Sequence[CompiledRuleSet] | None = None,
+) -> tuple[EmailState, RuleApplicationInterruptState]:
+    # Same result as apply_rule_files_to_email_final_state, recording the steps at the verbosity of the trace
+    if trace.verbosity == TraceVerbosity.NONE:
+        return apply_rule_files_to_email_final_state(email, rule_files, compiled_rule_files)
+    compiled_rule_files = get_compiled_rule_files(rule_files, compiled_rule_files)
+
+    record_every_step = trace.verbosity == TraceVerbosity.FULL
+    email_state = RuntimeEmailState.from_email_state(EmailState.create_initial_state())
+    rule_application_interrupt_state = RuleApplicationInterruptState.CONTINUE
+    if record_every_step:
+        trace.record(None, None, False, None, rule_application_interrupt_state)
+
+    for rule_file_index, (rule_file, compiled_rules) in enumerate(zip(rule_files, compiled_rule_files)):
+        rule_application_interrupt_state = RuleApplicationInterruptState.CONTINUE
+        rule_indices: Iterable[int]
+        if record_every_step:
+            # Every rule is recorded, including the ones that did not match
+            candidate_rule_indices = set(compiled_rules.get_candidate_rule_indices(email))
+            rule_indices = range(len(rule_file.rules))
+        else:
+            rule_indices = compiled_rules.iterate_matching_rule_indices(email)
+
+        for rule_index in rule_indices:
+            if record_every_step and (
+                rule_index not in candidate_rule_indices or not compiled_rules.compiled_filter_exprs[rule_index](email)
+            ):
+                trace.record(rule_file_index, rule_index, False, None, rule_application_interrupt_state)
+                continue
+
+            for action_index, action in enumerate(rule_file.rules[rule_index].actions):
+                email_state, rule_application_interrupt_state = action.apply_to_runtime_state(email_state)
+                if record_every_step:
+                    trace.record(rule_file_index, rule_index, True, action_index, rule_application_interrupt_state)
+                if rule_application_interrupt_state != RuleApplicationInterruptState.CONTINUE:
+                    break
+            trace.record(rule_file_index, rule_index, True, None, rule_application_interrupt_state)
+            if rule_application_interrupt_state != RuleApplicationInterruptState.CONTINUE:
+                break
+
+        if rule_application_interrupt_state == RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES:
+            break
+    return email_state.to_email_state(), rule_application_interrupt_state
+
+
+def display_rule_file_application_states(
+    file_states: list[RuleFileApplicationState] | RuleApplicationTrace,
+    rule_files: Sequence[RuleFile],
+    rules: Sequence[Rule] | None = None,
+) -> str:
+    # The rule files should be the ones the states or trace were created from. States that are not from a rule file
+    # e.g. those of apply_rules_to_email_iteratively are displayed with the given rules.
+    if isinstance(file_states, RuleApplicationTrace):
+        return file_states.display(rule_files)
     lines = []
 
     for file_state in file_states:
         lines.append(str(file_state.current_file_name))
         for rule_application_state in file_state.rule_application_state_history:
-            lines.append(
-                "".join(
-                    [
-                        "\t",
-                        "current_rule=" + str(rule_application_state.current_rule),
-                        " current_rule_applied=" + str(rule_application_state.current_rule_applied),
-                        " current_action=" + str(rule_application_state.current_action),
-                        " interrupt_state=" + str(rule_application_state.rule_application_interrupt_state),
-                    ]
+            rule_file_index = rule_application_state.rule_file_index
+            if rule_file_index is not None:
+                state_rules: Sequence[Rule] = rule_files[rule_file_index].rules
+            elif rules is not None:
+                state_rules = rules
+            elif rule_application_state.rule_index is None:
+                # The initial state, which has no rule to display
+                state_rules = ()
+            else:
+                raise ValueError(
+                    f"Rule {rule_application_state.rule_index} is not from a rule file, the rules should be given"
                 )
-            )
+            lines.append("\t" + rule_application_state.display(state_rules))
 
     return "\n".join(lines)
@@ -0,0 +1,138 @@
+from enum import IntEnum, auto
+from typing import Iterator, NamedTuple, Sequence, cast
+
+from email_rules.core import Email, EmailState, RuntimeEmailState
+from email_rules.rules import (
+    CompiledRuleFilter,
+    CompiledRuleSet,
+    RuleAction,
+    RuleActionStopProcessingAllFiles,
+    RuleActionStopProcessingCurrentFile,
+    RuleApplicationInterruptState,
+)
+from email_rules.simulation_framework.rule_application import get_compiled_rule_files
+from email_rules.simulation_framework.type_defs import RuleFile
+
+
+class RuleOpcode(IntEnum):
+    # Starts a rule file, looking up which of its rules can match and going to the test of the first one
+    INDEX = auto()
+    # Go to the next instruction if the filter of the rule matches, otherwise to the test of the next candidate rule
+    TEST = auto()
+    # Apply the action, stopping the same way as the action asks
+    APPLY = auto()
+    # Skip the rest of the current file
+    JUMP_TO_END_OF_FILE = auto()
+    HALT = auto()
+
+
+class RuleFileIndex(NamedTuple):
+    compiled_rules: CompiledRuleSet
+    # Position of the test of each rule in the file
+    test_positions: tuple[int, ...]
+
+
+class RuleInstruction(NamedTuple):
+    opcode: RuleOpcode
+    # The index of the file, the index of the rule in its file to test or the action to apply. Filters are looked up in
+    # the compiled rules of the file when tested, as filters of unpickled rules are only compiled once first tested.
+    operand: RuleFileIndex | int | RuleAction | None = None
+    target: int = 0
+
+
+# All of the rule files flattened into one list of instructions, applying it gives the same final state as
+# apply_rule_files_to_email_iteratively without creating any intermediate states. Only the rules that are candidates
+# for the email in the exact match index of their file are tested, the others are jumped over.
+class RuleProgram:
+    def __init__(self, instructions: Sequence[RuleInstruction]) -> None:
+        self.instructions = instructions
+
+    @staticmethod
+    def compile(
+        rule_files: Sequence[RuleFile], compiled_rule_files: Sequence[CompiledRuleSet] | None = None
+    ) -> "RuleProgram":
+        compiled_rule_files = get_compiled_rule_files(rule_files, compiled_rule_files)
+
+        instructions: list[RuleInstruction] = []
+        for rule_file, compiled_rules in zip(rule_files, compiled_rule_files):
+            index_position = len(instructions)
+            instructions.append(RuleInstruction(RuleOpcode.INDEX))
+            test_positions: list[int] = []
+            # Targets pointing at the end of the file are filled in once the file has been compiled
+            end_of_file_positions = [index_position]
+            for rule_index, rule in enumerate(compiled_rules.rules):
+                test_positions.append(len(instructions))
+                instructions.append(RuleInstruction(RuleOpcode.TEST, rule_index))
+                for action in rule.actions:
+                    if isinstance(action, RuleActionStopProcessingCurrentFile):
+                        end_of_file_positions.append(len(instructions))
+                        instructions.append(RuleInstruction(RuleOpcode.JUMP_TO_END_OF_FILE))
+                    elif isinstance(action, RuleActionStopProcessingAllFiles):
+                        instructions.append(RuleInstruction(RuleOpcode.HALT))
+                    else:
+                        end_of_file_positions.append(len(instructions))
+                        instructions.append(RuleInstruction(RuleOpcode.APPLY, action))
+
+            instructions[index_position] = RuleInstruction(
+                RuleOpcode.INDEX, RuleFileIndex(compiled_rules, tuple(test_positions))
+            )
+            for position in end_of_file_positions:
+                instructions[position] = instructions[position]._replace(target=len(instructions))
+
+        instructions.append(RuleInstruction(RuleOpcode.HALT))
+        return RuleProgram(instructions)
+
+    def run(
+        self, email: Email, email_state: EmailState | None = None
+    ) -> tuple[EmailState, RuleApplicationInterruptState]:
+        email_state = email_state if email_state is not None else EmailState.create_initial_state()
+        runtime_email_state = RuntimeEmailState.from_email_state(email_state)
+        instructions = self.instructions
+        rule_application_interrupt_state = RuleApplicationInterruptState.CONTINUE
+        position = 0
+        # Tests of the candidate rules of the current file that have not been reached yet
+        candidate_test_positions: Iterator[int] = iter(())
+        compiled_filter_exprs: list[CompiledRuleFilter] = []
+        next_candidate_test_position = 0
+        end_of_file_position = 0
+
+        while True:
+            opcode, operand, target = instructions[position]
+            if opcode is RuleOpcode.TEST:
+                if position != next_candidate_test_position:
+                    # The rule before this one was applied, but this rule cannot match
+                    position = next_candidate_test_position
+                    continue
+                next_candidate_test_position = next(candidate_test_positions, end_of_file_position)
+                matches = compiled_filter_exprs[cast(int, operand)](email)
+                position = position + 1 if matches else next_candidate_test_position
+            elif opcode is RuleOpcode.APPLY:
+                action = cast(RuleAction, operand)
+                runtime_email_state, rule_application_interrupt_state = action.apply_to_runtime_state(
+                    runtime_email_state
+                )
+                if rule_application_interrupt_state is RuleApplicationInterruptState.CONTINUE:
+                    position += 1
+                elif rule_application_interrupt_state is RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE:
+                    position = target
+                else:
+                    return runtime_email_state.to_email_state(), rule_application_interrupt_state
+            elif opcode is RuleOpcode.INDEX:
+                # Stopping the previous file does not carry over to this one
+                rule_application_interrupt_state = RuleApplicationInterruptState.CONTINUE
+                compiled_rules, test_positions = cast(RuleFileIndex, operand)
+                compiled_filter_exprs = compiled_rules.compiled_filter_exprs
+                candidate_test_positions = map(
+                    test_positions.__getitem__, compiled_rules.get_candidate_rule_indices(email)
+                )
+                end_of_file_position = target
+                next_candidate_test_position = next(candidate_test_positions, end_of_file_position)
+                position = next_candidate_test_position
+            elif opcode is RuleOpcode.JUMP_TO_END_OF_FILE:
+                rule_application_interrupt_state = RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE
+                position = target
+            else:
+                # A halt at the end of the program keeps the state of the last file
+                if position != len(instructions) - 1:
+                    rule_application_interrupt_state = RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES
+                return runtime_email_state.to_email_state(), rule_application_interrupt_state
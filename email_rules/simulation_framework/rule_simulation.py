@@ -1,11 +1,18 @@
+import hashlib
 from pathlib import PurePosixPath
 from types import TracebackType
 from typing import Generic, Iterable, Self, TypeVar, cast
 
-from pydantic import BaseModel, model_validator
+from pydantic import model_validator
 
 from email_rules.core import Email, EmailFolder, EmailState, EmailTag
+from email_rules.core._cached_properties import (
+    CachedPropertiesModel,
+    TrackedModel,
+    tracked_cached_property,
+)
 from email_rules.rules import (
+    CompiledRuleSet,
     Rule,
     RuleAction,
     RuleActionAddTag,
@@ -13,11 +20,22 @@ from email_rules.rules import (
     RuleActionMoveToFolder,
     RuleActionStopProcessingAllFiles,
     RuleActionStopProcessingCurrentFile,
+    RuleFilterCompiler,
+    RuleFilterProfile,
+    get_optimized_filter_expr,
+    get_structural_key,
+)
+from email_rules.simulation_framework.application_trace import (
+    RuleApplicationTrace,
+    TraceVerbosity,
 )
+from email_rules.simulation_framework.email_state_cache import EmailStateCache
 from email_rules.simulation_framework.rule_application import (
     apply_rule_files_to_email_iteratively,
+    apply_rule_files_to_email_with_trace,
     display_rule_file_application_states,
 )
+from email_rules.simulation_framework.rule_program import RuleProgram
 from email_rules.simulation_framework.type_defs import (
     RuleFile,
     RuleFileApplicationState,
@@ -35,10 +53,15 @@ class IterableClass(Generic[T]):
             yield cast(T, value)
 
 
-class EmailAccountSettings(BaseModel):
+class EmailAccountSettings(CachedPropertiesModel, TrackedModel):
     folders: list[EmailFolder]
     tags: list[EmailTag]
     rule_files: list[RuleFile]
+    # Reorders the and/or arguments of the filters to short-circuit sooner, see RuleFilterProfile.create
+    rule_filter_profile: RuleFilterProfile | None = None
+    # Number of distinct emails to remember the results for, see EmailStateCache. Off by default, since custom filters
+    # might look at more than the sender, recipients and subject e.g. fields of an Email subclass.
+    email_state_cache_size: int = 0
 
     @model_validator(mode="after")
     def check_parent_folders_exist(self) -> Self:
@@ -101,25 +124,106 @@ class EmailAccountSettings(BaseModel):
             return f"Cannot validate action (unhandled) {rule_action}"
         return None
 
+    # Compiled again once any rule is modified in place
+    @tracked_cached_property
+    def compiled_rule_files(self) -> list[CompiledRuleSet]:
+        # One compiler for the whole account so that filters repeated across rules and files are shared
+        compiler = RuleFilterCompiler(
+            get_optimized_filter_expr(rule, self.rule_filter_profile)
+            for rule_file in self.rule_files
+            for rule in rule_file.rules
+        )
+        return [CompiledRuleSet(rule_file.rules, compiler, self.rule_filter_profile) for rule_file in self.rule_files]
+
+    # Emptied whenever a field is reassigned or any rule is modified in place, so the caches never outlive the rules
+    @tracked_cached_property
+    def email_state_history_cache(self) -> EmailStateCache[list[RuleFileApplicationState]] | None:
+        return EmailStateCache(self.email_state_cache_size) if self.email_state_cache_size else None
+
+    @tracked_cached_property
+    def final_email_state_cache(self) -> EmailStateCache[EmailState] | None:
+        return EmailStateCache(self.email_state_cache_size) if self.email_state_cache_size else None
+
     def get_email_state_after_filtering(self, email: Email) -> tuple[EmailState, list[RuleFileApplicationState]]:
-        step_history = list(apply_rule_files_to_email_iteratively(email, self.rule_files))
-        if len(step_history) == 0:
-            raise ValueError("No email state - this is an issue with the rule application logic")
-        return step_history[-1].last_rule_application_state.email_state, step_history
+        cache = self.email_state_history_cache
+        step_history = cache.get(email) if cache is not None else None
+        if step_history is None:
+            step_history = list(apply_rule_files_to_email_iteratively(email, self.rule_files, self.compiled_rule_files))
+            if len(step_history) == 0:
+                raise ValueError("No email state - this is an issue with the rule application logic")
+            if cache is not None:
+                cache.put(email, step_history)
+        # The states are shared between cached results, only the list is copied
+        return step_history[-1].last_rule_application_state.email_state, list(step_history)
+
+    def get_email_state_after_filtering_with_trace(self, email: Email, trace: RuleApplicationTrace) -> EmailState:
+        # Records the steps into the trace rather than creating a state for each step, so results are not cached
+        email_state, _ = apply_rule_files_to_email_with_trace(email, self.rule_files, trace, self.compiled_rule_files)
+        return email_state
+
+    @tracked_cached_property
+    def content_hash(self) -> str:
+        # Changes whenever anything the rule application depends on changes, filters with fields that cannot be hashed
+        # are keyed by their id so only give a stable hash within one process
+        content_key = (
+            self.folders,
+            self.tags,
+            [
+                (
+                    rule_file.file_name,
+                    [
+                        (
+                            get_structural_key(rule.filter_expr),
+                            [(type(action), tuple(action.model_dump().items())) for action in rule.actions],
+                        )
+                        for rule in rule_file.rules
+                    ],
+                )
+                for rule_file in self.rule_files
+            ],
+            self.rule_filter_profile.leaf_stats if self.rule_filter_profile is not None else None,
+        )
+        return hashlib.sha256(repr(content_key).encode()).hexdigest()
+
+    @tracked_cached_property
+    def rule_program(self) -> RuleProgram:
+        return RuleProgram.compile(self.rule_files, self.compiled_rule_files)
+
+    def get_final_email_state_after_filtering(self, email: Email) -> EmailState:
+        # For when only the outcome is needed, the state history is not recorded
+        cache = self.final_email_state_cache
+        email_state = cache.get(email) if cache is not None else None
+        if email_state is None:
+            email_state, _ = self.rule_program.run(email)
+            if cache is not None:
+                cache.put(email, email_state)
+        return email_state
 
 
 class EmailRuleSimulation(object):
-    def __init__(self, inbox: EmailAccountSettings, email: Email, display_state_history: bool = True):
-        final_email_state, email_state_history = inbox.get_email_state_after_filtering(email)
-        self.final_email_state = final_email_state
-        self.email_state_history = email_state_history
+    def __init__(
+        self,
+        inbox: EmailAccountSettings,
+        email: Email,
+        display_state_history: bool = True,
+        trace_verbosity: TraceVerbosity | None = None,
+        max_trace_steps: int | None = None,
+    ):
+        # The full state history is kept unless a trace verbosity is given, in which case a compact trace is recorded
+        self.email_state_history: list[RuleFileApplicationState] | RuleApplicationTrace
+        if trace_verbosity is None:
+            self.final_email_state, self.email_state_history = inbox.get_email_state_after_filtering(email)
+        else:
+            self.email_state_history = RuleApplicationTrace(trace_verbosity, max_trace_steps)
+            self.final_email_state = inbox.get_email_state_after_filtering_with_trace(email, self.email_state_history)
+        self.inbox = inbox
         self._failures: list[str] = []
         self.display_state_history = display_state_history
 
     def print_email_state_history(self) -> None:
         print("File\tRule and action")
         print()
-        print(display_rule_file_application_states(self.email_state_history))
+        print(display_rule_file_application_states(self.email_state_history, self.inbox.rule_files))
 
     def __enter__(self) -> Self:
         return self
@@ -149,12 +253,12 @@ class EmailRuleSimulation(object):
     def assert_has_tag(self, tag: EmailTag) -> None:
         self.assert_email_state(
             tag in self.final_email_state.tags,
-            f"Email does not have tag {tag}, tags: {self.final_email_state.tags}",
+            f"Email does not have tag {tag}, tags: {set(self.final_email_state.tags)}",
         )
 
     def assert_does_not_have_tag(self, tag: EmailTag) -> None:
         self.assert_email_state(
-            tag not in self.final_email_state.tags, f"Email has tag {tag}, tags: {self.final_email_state.tags}"
+            tag not in self.final_email_state.tags, f"Email has tag {tag}, tags: {set(self.final_email_state.tags)}"
         )
 
     def assert_is_read(self) -> None:
@@ -0,0 +1,131 @@
+import gc
+import hashlib
+import os
+import pickle
+from importlib.metadata import version
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, get_args
+
+from pydantic import BaseModel
+
+from email_rules.rules import CompiledRuleSet
+from email_rules.rules._polymorphic import PolymorphicModel, get_type_name
+from email_rules.simulation_framework.rule_program import RuleProgram
+from email_rules.simulation_framework.rule_simulation import EmailAccountSettings
+
+# Bypasses the __setattr__ of the model, which would mark the rules as modified and drop the compiled rules
+_set_attribute = object.__setattr__
+
+
+def get_files_content_hash(paths: Iterable[Path]) -> str:
+    # For keying the cache on the files the settings are created from, so a cached copy can be found without creating
+    # the settings first
+    content_hash = hashlib.sha256()
+    for path in paths:
+        file_content = path.read_bytes()
+        content_hash.update(str(path).encode())
+        content_hash.update(len(file_content).to_bytes(8, "little"))
+        content_hash.update(file_content)
+    return content_hash.hexdigest()
+
+
+def _iterate_model_classes(annotation: Any) -> Iterator[type[BaseModel]]:
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        yield annotation
+    for arg in get_args(annotation):
+        yield from _iterate_model_classes(arg)
+
+
+def get_settings_schema_fingerprint() -> str:
+    # Changes with the package version and the fields of every model that can be pickled as part of the settings, so
+    # cache files written for other classes are never loaded. Fields declared as a polymorphic base class can hold any
+    # of its subclasses, including custom filters and actions defined outside of the package.
+    classes_by_type_name: dict[str, type[BaseModel]] = {}
+    pending_classes: list[type[BaseModel]] = [EmailAccountSettings]
+    while pending_classes:
+        cls = pending_classes.pop()
+        type_name = get_type_name(cls)
+        if type_name in classes_by_type_name:
+            continue
+        classes_by_type_name[type_name] = cls
+        if issubclass(cls, PolymorphicModel):
+            pending_classes.extend(
+                subclass for subclass in PolymorphicModel._classes_by_type_name.values() if issubclass(subclass, cls)
+            )
+        for field_info in cls.model_fields.values():
+            pending_classes.extend(_iterate_model_classes(field_info.annotation))
+
+    schema = [
+        (type_name, [(name, repr(field_info.annotation)) for name, field_info in cls.model_fields.items()])
+        for type_name, cls in sorted(classes_by_type_name.items())
+    ]
+    return hashlib.sha256(repr((version("email_rules"), schema)).encode()).hexdigest()
+
+
+# Stores validated EmailAccountSettings on disk along with their compiled rules and rule program, so that loading them
+# skips validating, simplifying, optimizing and indexing every rule. Compiled filters are closures, which cannot be
+# pickled, so each one is compiled when it is first evaluated after loading. Cache files are unpickled, so the cache
+# directory should only be writable by whoever trusts the rules.
+class EmailAccountSettingsCache:
+    def __init__(self, cache_directory: Path) -> None:
+        self.cache_directory = cache_directory
+
+    def get_path(self, key: str) -> Path:
+        return self.cache_directory / f"email_account_settings_{get_settings_schema_fingerprint()[:16]}_{key}.pickle"
+
+    def load(self, key: str) -> EmailAccountSettings | None:
+        # The garbage collector would otherwise run many times over the objects being unpickled, which takes longer
+        # than the unpickling itself
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with self.get_path(key).open("rb") as cache_file:
+                cached = pickle.load(cache_file)
+        except FileNotFoundError:
+            return None
+        except (pickle.UnpicklingError, AttributeError, EOFError, ImportError, TypeError, ValueError):
+            # Not written by save, the caller creates the settings instead
+            return None
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+        if not isinstance(cached, tuple) or len(cached) != 3:
+            return None
+        inbox, compiled_rule_files, rule_program = cached
+        if not (
+            isinstance(inbox, EmailAccountSettings)
+            and isinstance(compiled_rule_files, list)
+            and all(isinstance(compiled_rules, CompiledRuleSet) for compiled_rules in compiled_rule_files)
+            and isinstance(rule_program, RuleProgram)
+        ):
+            return None
+        _set_attribute(inbox, "compiled_rule_files", compiled_rule_files)
+        _set_attribute(inbox, "rule_program", rule_program)
+        return inbox
+
+    def save(self, inbox: EmailAccountSettings, key: str | None = None) -> bool:
+        # Returns whether the settings were saved, settings containing objects that cannot be pickled are skipped. The
+        # rules are compiled first if they have not been yet.
+        key = key if key is not None else inbox.content_hash
+        try:
+            pickled_inbox = pickle.dumps(
+                (inbox, inbox.compiled_rule_files, inbox.rule_program), protocol=pickle.HIGHEST_PROTOCOL
+            )
+        except (pickle.PicklingError, AttributeError, TypeError):
+            return False
+
+        self.cache_directory.mkdir(parents=True, exist_ok=True)
+        path = self.get_path(key)
+        # Written next to the cache file and renamed, so that other processes never load a partially written file
+        temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        temporary_path.write_bytes(pickled_inbox)
+        os.replace(temporary_path, path)
+        return True
+
+    def load_or_create(self, key: str, create_inbox: Callable[[], EmailAccountSettings]) -> EmailAccountSettings:
+        inbox = self.load(key)
+        if inbox is None:
+            inbox = create_inbox()
+            self.save(inbox, key)
+        return inbox
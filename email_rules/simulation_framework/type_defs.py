@@ -1,40 +1,89 @@
-from enum import Enum, auto
-from typing import Self
+from typing import Self, Sequence
 
 from pydantic import BaseModel
 
 from email_rules.core import EmailState
-from email_rules.rules import Rule
-
-
-class RuleApplicationInterruptState(Enum):
-    CONTINUE = auto()
-    STOP_PROCESSING_CURRENT_FILE = auto()
-    STOP_PROCESSING_ALL_FILES = auto()
+from email_rules.core._cached_properties import (
+    CachedPropertiesModel,
+    TrackedModel,
+    tracked_cached_property,
+)
+from email_rules.rules import (
+    CompiledRuleSet,
+    Rule,
+    RuleAction,
+    RuleApplicationInterruptState,
+)
 
 
+# The rule and action are referred to by index and only formatted when displayed, since formatting a rule formats its
+# whole filter expression
 class RuleApplicationState(BaseModel):
     email_state: EmailState
     rule_application_interrupt_state: RuleApplicationInterruptState
-    current_rule: str | None
+    rule_file_index: int | None = None
+    rule_index: int | None
     current_rule_applied: bool
-    current_action: str | None
+    action_index: int | None
 
     @classmethod
     def create_initial_state(cls) -> Self:
         return cls(
             email_state=EmailState.create_initial_state(),
             rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-            current_rule=None,
+            rule_index=None,
             current_rule_applied=False,
-            current_action=None,
+            action_index=None,
         )
 
+    def get_current_rule(self, rules: Sequence[Rule]) -> Rule | None:
+        # The rules should be the ones that were applied e.g. the rules of the rule file at rule_file_index
+        return rules[self.rule_index] if self.rule_index is not None else None
+
+    def get_current_action(self, rules: Sequence[Rule]) -> RuleAction | None:
+        current_rule = self.get_current_rule(rules)
+        if current_rule is None or self.action_index is None:
+            return None
+        return current_rule.actions[self.action_index]
+
+    def display(self, rules: Sequence[Rule]) -> str:
+        return display_rule_application_step(
+            rules, self.rule_index, self.current_rule_applied, self.action_index, self.rule_application_interrupt_state
+        )
 
-class RuleFile(BaseModel):
+
+def display_rule_application_step(
+    rules: Sequence[Rule],
+    rule_index: int | None,
+    current_rule_applied: bool,
+    action_index: int | None,
+    rule_application_interrupt_state: RuleApplicationInterruptState,
+) -> str:
+    # Shared by the states and the compact trace, so both display the same way
+    current_rule = rules[rule_index] if rule_index is not None else None
+    current_action = (
+        current_rule.actions[action_index] if current_rule is not None and action_index is not None else None
+    )
+    return "".join(
+        [
+            "current_rule=" + (repr(current_rule) if current_rule is not None else "None"),
+            " current_rule_applied=" + str(current_rule_applied),
+            " current_action=" + (repr(current_action) if current_action is not None else "None"),
+            " interrupt_state=" + str(rule_application_interrupt_state),
+        ]
+    )
+
+
+class RuleFile(CachedPropertiesModel, TrackedModel):
     file_name: str
     rules: list[Rule]
 
+    @tracked_cached_property
+    def compiled_rules(self) -> CompiledRuleSet:
+        # Compiling the rules together lets every subject check in the file be answered by a single scan of the
+        # subject, and exact match checks by a lookup of each email field
+        return CompiledRuleSet(self.rules)
+
 
 class RuleFileApplicationState(BaseModel):
     current_file_name: str | None
@@ -0,0 +1,61 @@
+import pytest
+
+from email_rules.core import (
+    Email,
+    EmailBatch,
+    EmailColumn,
+    EmailSubject,
+    create_mask,
+    iterate_mask_indices,
+)
+
+
+class TestMasks:
+    @pytest.mark.parametrize(
+        "indices, size, expected_mask",
+        [
+            pytest.param([], 0, 0, id="empty"),
+            pytest.param([0, 2], 3, 0b101, id="small"),
+            pytest.param([8, 9, 20], 21, (1 << 8) | (1 << 9) | (1 << 20), id="multiple_bytes"),
+        ],
+    )
+    def test_create_mask(self, indices: list[int], size: int, expected_mask: int) -> None:
+        assert create_mask(indices, size) == expected_mask
+        assert list(iterate_mask_indices(expected_mask)) == indices
+
+
+class TestEmailColumn:
+    def test_masks(self) -> None:
+        column = EmailColumn([("a",), ("b", "a", "b"), (), ("c",)])
+        assert column.get_eq_mask("a") == 0b0011
+        assert column.get_eq_mask("b") == 0b0010
+        assert column.get_eq_mask("d") == 0
+        assert column.get_mask_where(lambda value: value != "a") == 0b1010
+
+    def test_distinct_values_are_checked_once(self) -> None:
+        checked_values: list[str] = []
+
+        def is_b(value: str) -> bool:
+            checked_values.append(value)
+            return value == "b"
+
+        column = EmailColumn.from_values(["a", "b", "a", "b"])
+        assert column.get_mask_where(is_b) == 0b1010
+        assert checked_values == ["a", "b"]
+
+
+class TestEmailBatch:
+    def test_columns(self, generic_email: Email) -> None:
+        other_email = generic_email.model_copy(update={"email_subject": EmailSubject("SUBJECT 1")})
+        batch = EmailBatch(emails=[generic_email, other_email])
+        assert batch.email_subject.entries == [("Subject 1",), ("SUBJECT 1",)]
+        assert batch.normalized_email_subject.get_eq_mask(EmailSubject("subject 1")) == 0b11
+        assert batch.email_to.get_eq_mask(generic_email.email_to[1]) == 0b11
+        assert batch.get_emails_in_mask(0b10) == [other_email]
+
+    def test_columns_follow_changes(self, generic_email: Email) -> None:
+        batch = EmailBatch(emails=[generic_email])
+        assert batch.email_subject.get_eq_mask(EmailSubject("Subject 1")) == 1
+        batch.emails = [generic_email, generic_email]
+        assert batch.email_subject.get_eq_mask(EmailSubject("Subject 1")) == 0b11
+        assert batch.get_full_mask() == 0b11
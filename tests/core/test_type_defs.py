@@ -0,0 +1,56 @@
+from pathlib import PurePosixPath
+
+from email_rules.core import (
+    Email,
+    EmailAddress,
+    EmailFolder,
+    EmailFrom,
+    EmailState,
+    EmailSubject,
+    EmailTag,
+    EmailTo,
+    NormalizedEmail,
+    RuntimeEmailState,
+)
+
+
+class TestNormalizedEmail:
+    def test_fields_are_lower_case(self, generic_email: Email) -> None:
+        generic_email.email_to.append(EmailTo(EmailAddress("TO_1@example.com")))
+        assert generic_email.normalized == NormalizedEmail(
+            email_from=EmailFrom(EmailAddress("from@example.com")),
+            email_to=frozenset([EmailTo(EmailAddress("to_1@example.com")), EmailTo(EmailAddress("to_2@example.com"))]),
+            email_subject=EmailSubject("subject 1"),
+        )
+
+    def test_is_computed_once(self, generic_email: Email) -> None:
+        assert generic_email.normalized is generic_email.normalized
+
+    def test_is_recomputed_after_changes(self, generic_email: Email) -> None:
+        assert generic_email.normalized.email_subject == "subject 1"
+
+        copied_email = generic_email.model_copy(update={"email_subject": EmailSubject("Subject 2")})
+        assert copied_email.normalized.email_subject == "subject 2"
+        assert generic_email.normalized.email_subject == "subject 1"
+
+        generic_email.email_subject = EmailSubject("Subject 3")
+        assert generic_email.normalized.email_subject == "subject 3"
+
+    def test_is_recomputed_after_recipients_are_modified_in_place(self, generic_email: Email) -> None:
+        normalized_email = generic_email.normalized
+        generic_email.email_to.append(EmailTo(EmailAddress("B@example.com")))
+        assert generic_email.normalized is not normalized_email
+        assert EmailTo(EmailAddress("b@example.com")) in generic_email.normalized.email_to
+
+        generic_email.email_to.clear()
+        assert generic_email.normalized.email_to == frozenset()
+
+
+class TestRuntimeEmailState:
+    def test_round_trip(self) -> None:
+        email_state = EmailState(
+            tags=frozenset({EmailTag("tag")}), current_folder=EmailFolder(PurePosixPath("folder")), is_read=True
+        )
+        runtime_email_state = RuntimeEmailState.from_email_state(email_state)
+        assert runtime_email_state == (email_state.tags, email_state.current_folder, email_state.is_read)
+        assert runtime_email_state.to_email_state() == email_state
@@ -3,6 +3,7 @@ from pathlib import Path, PurePosixPath
 import pytest
 
 from email_rules.core import (
+    Email,
     EmailAddress,
     EmailFolder,
     EmailFrom,
@@ -10,8 +11,9 @@ from email_rules.core import (
     EmailTag,
     EmailTo,
 )
-from email_rules.exporting import SieveExtension, SieveRenderer
+from email_rules.exporting import RenderedRuleFilter, SieveExtension, SieveRenderer
 from email_rules.rules import (
+    ConstantRuleFilter,
     Rule,
     RuleAction,
     RuleActionAddTag,
@@ -20,12 +22,14 @@ from email_rules.rules import (
     RuleActionStopProcessingAllFiles,
     RuleActionStopProcessingCurrentFile,
     RuleFilter,
+    RuleFilterProfile,
     RuleFromEq,
     RuleSubjectContains,
     RuleSubjectEq,
     RuleToEq,
 )
 from tests.exporting.common import TEST_DATA_TEMPLATES_DIR
+from tests.rules.common import RuleAlwaysTrue
 
 
 @pytest.mark.parametrize(
@@ -104,6 +108,52 @@ def test_render_rule_filter(rule: RuleFilter, expected_output: Path) -> None:
     assert SieveRenderer().render_rule_filter(rule) == expected_output.read_text()
 
 
+@pytest.mark.parametrize(
+    "rule, expected_output",
+    [
+        pytest.param(ConstantRuleFilter.create(True), "true", id="true"),
+        pytest.param(~ConstantRuleFilter.create(True), "false", id="not_true"),
+        pytest.param(
+            ~~RuleSubjectEq(text=EmailSubject("IMPORTANT"), case_sensitive=False),
+            'header :is "subject" "important"',
+            id="double_negation",
+        ),
+        pytest.param(
+            RuleSubjectEq(text=EmailSubject("IMPORTANT"), case_sensitive=False)
+            & (
+                RuleSubjectEq(text=EmailSubject("IMPORTANT"), case_sensitive=False)
+                | RuleToEq(text=EmailTo(EmailAddress("abc@example.com")), case_sensitive=True)
+            ),
+            'header :is "subject" "important"',
+            id="absorption",
+        ),
+    ],
+)
+def test_render_simplified_rule_filter(rule: RuleFilter, expected_output: str) -> None:
+    assert SieveRenderer().render_rule_filter(rule) == expected_output
+
+
+@pytest.mark.parametrize(
+    "rule_filter, expected",
+    [
+        pytest.param(ConstantRuleFilter.create(False), [], id="constant"),
+        pytest.param(
+            RuleToEq(text=EmailTo(EmailAddress("abc@example.com")), case_sensitive=True),
+            [SieveExtension.COMPARATOR_ASCII_NUMERIC],
+            id="case_sensitive",
+        ),
+        pytest.param(
+            RuleToEq(text=EmailTo(EmailAddress("abc@example.com")), case_sensitive=True)
+            & ConstantRuleFilter.create(False),
+            [],
+            id="folded_away",
+        ),
+    ],
+)
+def test_get_rule_filter_extensions(rule_filter: RuleFilter, expected: list[SieveExtension]) -> None:
+    assert SieveRenderer().get_rule_filter_extensions(rule_filter) == expected
+
+
 @pytest.mark.parametrize(
     "rule, expected_output",
     [
@@ -189,3 +239,57 @@ def test_render_extensions(dependencies: list[SieveExtension], expected: str | N
 )
 def test_get_rule_action_extensions(rule_action: RuleAction, expected: list[SieveExtension]) -> None:
     assert SieveRenderer().get_rule_action_extensions(rule_action) == expected
+
+
+def test_render_rule_filter_override_applies_to_nested_filters() -> None:
+    class CustomSieveRenderer(SieveRenderer):
+        def render_rule_filter(self, rule_filter: RuleFilter) -> RenderedRuleFilter:
+            if type(rule_filter) is RuleAlwaysTrue:
+                return RenderedRuleFilter("custom")
+            return super().render_rule_filter(rule_filter)
+
+    rule_filter = ~~RuleAlwaysTrue() & ~ConstantRuleFilter.create(False)
+    assert CustomSieveRenderer().render_rule_filter(rule_filter) == "custom"
+    assert CustomSieveRenderer().render_rule_filter(~rule_filter) == "(not custom)"
+
+
+def test_render_rule_filter_with_profile(generic_email: Email) -> None:
+    from_eq = RuleFromEq(text=EmailFrom(EmailAddress("from@example.com")), case_sensitive=False)
+    subject_contains = RuleSubjectContains(text=EmailSubject("never"), case_sensitive=False)
+    profile = RuleFilterProfile.create([from_eq, subject_contains], [generic_email])
+
+    # The subject never matches, so it should be checked first in an allof and last in an anyof
+    assert SieveRenderer(profile).render_rule_filter(from_eq & subject_contains) == (
+        'allof (header :contains "subject" "never", address :is "from" "from@example.com")'
+    )
+    assert SieveRenderer(profile).render_rule_filter(subject_contains | from_eq) == (
+        'anyof (address :is "from" "from@example.com", header :contains "subject" "never")'
+    )
+    assert SieveRenderer().render_rule_filter(subject_contains | from_eq) == (
+        'anyof (header :contains "subject" "never", address :is "from" "from@example.com")'
+    )
+
+
+def test_rule_filter_is_optimized_once() -> None:
+    class CountingSieveRenderer(SieveRenderer):
+        optimized_rule_filters: list[RuleFilter] = []
+
+        def optimize_rule_filter(self, rule_filter: RuleFilter) -> RuleFilter:
+            self.optimized_rule_filters.append(rule_filter)
+            return super().optimize_rule_filter(rule_filter)
+
+    rule_filter: RuleFilter = RuleFromEq(text=EmailFrom(EmailAddress("from@example.com")), case_sensitive=True)
+    for index in range(10):
+        leaf = RuleSubjectContains(text=EmailSubject(f"subject {index}"), case_sensitive=True)
+        rule_filter = ~(rule_filter & leaf) if index % 2 else ~~(rule_filter | leaf)
+
+    renderer = CountingSieveRenderer()
+    assert renderer.render_rule_filter(rule_filter).count(":contains") == 10
+    assert renderer.get_rule_filter_extensions(rule_filter) == [SieveExtension.COMPARATOR_ASCII_NUMERIC] * 11
+    assert renderer.optimized_rule_filters == [rule_filter, rule_filter]
+
+    # The filters of rules are optimized along with their compiled filters
+    rule = Rule(filter_expr=rule_filter, actions=[RuleActionMarkAsRead()])
+    assert renderer.render_rule(rule).count(":contains") == 10
+    renderer.get_rule_extension_requirements(rule)
+    assert renderer.optimized_rule_filters == [rule_filter, rule_filter]
@@ -0,0 +1,98 @@
+from pathlib import Path
+
+import pytest
+
+from email_rules.core import (
+    Email,
+    EmailAddress,
+    EmailBatch,
+    EmailFrom,
+    EmailSubject,
+    EmailTo,
+)
+from email_rules.ingestion import EmailCorpus, write_email_corpus
+from email_rules.rules import RuleFromEq, RuleSubjectContains, RuleToEq
+from email_rules.simulation_framework import get_final_email_states_from_batch
+from tests.simulation_framework.test_batch_simulation import INBOX
+
+EMAILS = [
+    Email(
+        email_from=EmailFrom(EmailAddress(f"from_{index % 3}@example.com")),
+        email_to=[EmailTo(EmailAddress(f"to_{recipient}@example.com")) for recipient in range(index % 4)],
+        email_subject=EmailSubject(f"Subject {index} café"),
+    )
+    for index in range(10)
+]
+
+
+@pytest.fixture
+def corpus_path(tmp_path: Path) -> Path:
+    path = tmp_path / "emails.corpus"
+    assert write_email_corpus(path, EMAILS) == len(EMAILS)
+    return path
+
+
+class TestEmailCorpus:
+    def test_round_trip(self, corpus_path: Path) -> None:
+        with EmailCorpus(corpus_path) as corpus:
+            assert len(corpus) == len(EMAILS)
+            assert list(corpus.emails) == EMAILS
+            assert corpus.emails[-1] == EMAILS[-1]
+            assert list(corpus.emails[2:5]) == EMAILS[2:5]
+
+    def test_empty_corpus(self, tmp_path: Path) -> None:
+        path = tmp_path / "empty.corpus"
+        assert write_email_corpus(path, []) == 0
+        with EmailCorpus(path) as corpus:
+            assert len(corpus) == 0
+            assert list(corpus.emails) == []
+
+    def test_not_a_corpus(self, tmp_path: Path) -> None:
+        path = tmp_path / "other"
+        path.write_bytes(b"something else entirely")
+        with pytest.raises(ValueError):
+            EmailCorpus(path)
+
+    @pytest.mark.parametrize(
+        "size",
+        [
+            pytest.param(0, id="empty_file"),
+            pytest.param(12, id="truncated_header"),
+            pytest.param(40, id="truncated_offsets"),
+            pytest.param(-8, id="truncated_recipients"),
+            pytest.param(-1, id="truncated_padding"),
+        ],
+    )
+    def test_truncated_corpus(self, corpus_path: Path, size: int) -> None:
+        corpus_path.write_bytes(corpus_path.read_bytes()[:size])
+        with pytest.raises(ValueError, match="Not an email corpus"):
+            EmailCorpus(corpus_path)
+
+    def test_index_out_of_range(self, corpus_path: Path) -> None:
+        with EmailCorpus(corpus_path) as corpus:
+            with pytest.raises(IndexError):
+                corpus.emails[len(EMAILS)]
+
+    @pytest.mark.parametrize(
+        "start, stop",
+        [
+            pytest.param(0, None, id="whole_corpus"),
+            pytest.param(3, 8, id="part_of_corpus"),
+        ],
+    )
+    def test_batch_filters_match_emails(self, corpus_path: Path, start: int, stop: int | None) -> None:
+        filters = [
+            RuleFromEq.create("from_1@example.com"),
+            RuleToEq.create("to_2@example.com"),
+            RuleSubjectContains.create("1"),
+        ]
+        email_batch = EmailBatch(emails=EMAILS[start:stop])
+        with EmailCorpus(corpus_path) as corpus:
+            corpus_batch = corpus.get_email_batch(start, stop)
+            for rule_filter in filters:
+                assert rule_filter.evaluate_batch(corpus_batch) == rule_filter.evaluate_batch(email_batch)
+
+    def test_batch_simulation(self, corpus_path: Path) -> None:
+        expected_email_states = [INBOX.get_final_email_state_after_filtering(email) for email in EMAILS]
+        with EmailCorpus(corpus_path) as corpus:
+            assert get_final_email_states_from_batch(INBOX, corpus.get_email_batch()) == expected_email_states
@@ -0,0 +1,140 @@
+import pytest
+
+from email_rules.core import Email, EmailAddress, EmailFrom, EmailSubject, EmailTo
+from email_rules.ingestion import (
+    HeaderData,
+    decode_header_value,
+    extract_email,
+    find_header_block_end,
+    parse_address_list,
+    parse_email_headers,
+)
+
+
+def create_email(email_from: str, email_to: list[str], email_subject: str) -> Email:
+    return Email(
+        email_from=EmailFrom(EmailAddress(email_from)),
+        email_to=[EmailTo(EmailAddress(address)) for address in email_to],
+        email_subject=EmailSubject(email_subject),
+    )
+
+
+class TestFindHeaderBlockEnd:
+    @pytest.mark.parametrize(
+        "data, expected_end",
+        [
+            pytest.param(b"A: 1\nB: 2\n\nbody", 10, id="lf"),
+            pytest.param(b"A: 1\r\nB: 2\r\n\r\nbody", 12, id="crlf"),
+            pytest.param(b"A: 1\nB: 2\n", 10, id="no_body"),
+            pytest.param(b"\nbody", 0, id="no_headers"),
+            pytest.param(memoryview(b"A: 1\n\nbody"), 5, id="memoryview"),
+        ],
+    )
+    def test_end(self, data: HeaderData, expected_end: int) -> None:
+        assert find_header_block_end(data) == expected_end
+
+
+class TestParseEmailHeaders:
+    @pytest.mark.parametrize(
+        "header_block, expected_email",
+        [
+            pytest.param(
+                b"From: from@example.com\nTo: to@example.com\nSubject: Subject\n",
+                create_email("from@example.com", ["to@example.com"], "Subject"),
+                id="bare_addresses",
+            ),
+            pytest.param(
+                b'From: "Last, First" <from@example.com>\nTo: A <a@example.com>, b@example.com\nSubject: S\n',
+                create_email("from@example.com", ["a@example.com", "b@example.com"], "S"),
+                id="named_addresses",
+            ),
+            pytest.param(
+                b"FROM: from@example.com\nto: to@example.com\nSUBJECT: Subject\n",
+                create_email("from@example.com", ["to@example.com"], "Subject"),
+                id="case_insensitive_names",
+            ),
+            pytest.param(
+                b"From: from@example.com\nTo: a@example.com,\n b@example.com\nSubject: Long\n\tsubject\n",
+                create_email("from@example.com", ["a@example.com", "b@example.com"], "Long\tsubject"),
+                id="folded_lines",
+            ),
+            pytest.param(
+                b"From: from@example.com\nTo: a@example.com\nTo: b@example.com\nSubject: S\n",
+                create_email("from@example.com", ["a@example.com", "b@example.com"], "S"),
+                id="repeated_to",
+            ),
+            pytest.param(
+                b"From: from@example.com\nSubject: =?utf-8?q?caf=C3=A9?= =?utf-8?b?w6k=?=\n",
+                create_email("from@example.com", [], "caféé"),
+                id="encoded_words",
+            ),
+            pytest.param(
+                b"Received: from somewhere\nX-To: other@example.com\n",
+                create_email("", [], ""),
+                id="missing_headers",
+            ),
+        ],
+    )
+    def test_parse(self, header_block: bytes, expected_email: Email) -> None:
+        assert parse_email_headers(header_block) == expected_email
+
+
+class TestParseAddressList:
+    @pytest.mark.parametrize(
+        "value, expected_addresses",
+        [
+            pytest.param(b" a@example.com, b@example.com ", ("a@example.com", "b@example.com"), id="bare"),
+            pytest.param(b'"Last, First" <a@example.com>', ("a@example.com",), id="quoted_name"),
+            pytest.param(b"=?utf-8?q?caf=C3=A9?= <a@example.com>", ("a@example.com",), id="encoded_name"),
+            pytest.param(b"a@example.com (comment), B <b@example.com>", ("a@example.com", "b@example.com"), id="mixed"),
+            pytest.param(b"", (), id="empty"),
+        ],
+    )
+    def test_addresses(self, value: bytes, expected_addresses: tuple[str, ...]) -> None:
+        assert parse_address_list(value) == expected_addresses
+
+
+class TestDecodeHeaderValue:
+    def test_decoded_values_are_cached(self) -> None:
+        decode_header_value.cache_clear()
+        for _ in range(3):
+            assert decode_header_value(b" =?utf-8?q?caf=C3=A9?=") == "café"
+        assert decode_header_value.cache_info().hits == 2
+
+    def test_unfolds(self) -> None:
+        assert decode_header_value(b" one\r\n two") == "one two"
+
+    @pytest.mark.parametrize(
+        "value",
+        [
+            pytest.param(b" =?x-unknown?q?abc?=", id="unknown_charset"),
+            pytest.param(b" =?utf-8?q?caf=FF?=", id="invalid_bytes"),
+        ],
+    )
+    def test_undecodable_value_is_kept(self, value: bytes) -> None:
+        assert decode_header_value(value) == value.decode().strip()
+
+
+class TestExtractEmail:
+    MESSAGE = b"From x\nFrom: from@example.com\nSubject: S\n\nTo: body@example.com\nFrom x\nFrom: next@example.com\n"
+
+    def test_stops_at_body(self) -> None:
+        email = extract_email(self.MESSAGE, 7)
+        assert email.email_to == []
+        assert (email.email_from, email.email_subject) == ("from@example.com", "S")
+
+    def test_end(self) -> None:
+        # The second message has no body, so its headers end at the given end
+        start = self.MESSAGE.rindex(b"From: ")
+        assert extract_email(self.MESSAGE, start, len(self.MESSAGE)).email_from == "next@example.com"
+
+    def test_memoryview(self) -> None:
+        assert extract_email(memoryview(self.MESSAGE), 7) == extract_email(self.MESSAGE, 7)
+
+    def test_unknown_charset(self) -> None:
+        email = extract_email(b"From: from@example.com\nSubject: =?x-unknown?q?abc?=\n")
+        assert email.email_subject == "=?x-unknown?q?abc?="
+
+    def test_first_from_and_subject_are_used(self) -> None:
+        email = extract_email(b"From: a@example.com\nFrom: b@example.com\nSubject: 1\nSubject: 2\n")
+        assert (email.email_from, email.email_subject) == ("a@example.com", "1")
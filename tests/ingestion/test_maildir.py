@@ -0,0 +1,82 @@
+from pathlib import Path
+
+import pytest
+
+from email_rules.core import Email
+from email_rules.ingestion import (
+    iterate_maildir_emails,
+    iterate_maildir_paths,
+    read_header_block,
+)
+
+
+def create_maildir(tmp_path: Path, message_count: int) -> Path:
+    maildir = tmp_path / "maildir"
+    for subdirectory in ("cur", "new", "tmp"):
+        (maildir / subdirectory).mkdir(parents=True)
+    for index in range(message_count):
+        subdirectory = "cur" if index % 2 else "new"
+        (maildir / subdirectory / f"{index}.host:2,S").write_bytes(
+            f"From: from_{index}@example.com\nTo: to@example.com\nSubject: Subject {index}\n\nBody\n".encode()
+        )
+    (maildir / "tmp" / "being_delivered").write_bytes(b"From: tmp@example.com\n\n")
+    (maildir / "cur" / ".hidden").write_bytes(b"From: hidden@example.com\n\n")
+    return maildir
+
+
+def get_email_index(email: Email) -> int:
+    return int(email.email_subject.split()[-1])
+
+
+class TestIterateMaildirPaths:
+    def test_paths(self, tmp_path: Path) -> None:
+        maildir = create_maildir(tmp_path, 4)
+        assert sorted(path.name for path in iterate_maildir_paths(maildir)) == [
+            f"{index}.host:2,S" for index in range(4)
+        ]
+
+    def test_missing_subdirectories(self, tmp_path: Path) -> None:
+        assert list(iterate_maildir_paths(tmp_path)) == []
+
+
+class TestReadHeaderBlock:
+    @pytest.mark.parametrize("read_size", [pytest.param(1, id="small_reads"), pytest.param(8192, id="one_read")])
+    def test_stops_at_body(self, tmp_path: Path, read_size: int) -> None:
+        path = tmp_path / "message"
+        path.write_bytes(b"From: from@example.com\nSubject: S\n\n" + b"body\n" * 1000)
+        assert read_header_block(path, read_size) == b"From: from@example.com\nSubject: S\n"
+
+    def test_no_body(self, tmp_path: Path) -> None:
+        path = tmp_path / "message"
+        path.write_bytes(b"From: from@example.com\n")
+        assert read_header_block(path, 4) == b"From: from@example.com\n"
+
+
+class TestIterateMaildirEmails:
+    def test_emails(self, tmp_path: Path) -> None:
+        maildir = create_maildir(tmp_path, 20)
+        emails = list(iterate_maildir_emails(maildir, max_workers=4, max_pending=3))
+        assert sorted(get_email_index(email) for email in emails) == list(range(20))
+        assert all(email.email_from == f"from_{get_email_index(email)}@example.com" for email in emails)
+
+    def test_order_of_paths_is_kept(self, tmp_path: Path) -> None:
+        maildir = create_maildir(tmp_path, 10)
+        paths = sorted(iterate_maildir_paths(maildir), key=lambda path: int(path.name.split(".")[0]))
+        emails = iterate_maildir_emails(paths, max_workers=4, max_pending=2)
+        assert [get_email_index(email) for email in emails] == list(range(10))
+
+    def test_messages_moved_to_cur_after_listing(self, tmp_path: Path) -> None:
+        maildir = create_maildir(tmp_path, 4)
+        paths = list(iterate_maildir_paths(maildir))
+        # Seen by a mail client, which moves the message and changes its flags
+        (maildir / "new" / "0.host:2,S").rename(maildir / "cur" / "0.host:2,RS")
+        emails = iterate_maildir_emails(paths, max_workers=2)
+        assert sorted(get_email_index(email) for email in emails) == list(range(4))
+
+    def test_messages_deleted_after_listing_are_skipped(self, tmp_path: Path) -> None:
+        maildir = create_maildir(tmp_path, 4)
+        paths = list(iterate_maildir_paths(maildir))
+        (maildir / "new" / "0.host:2,S").unlink()
+        (maildir / "cur" / "1.host:2,S").unlink()
+        emails = iterate_maildir_emails(paths, max_workers=2)
+        assert sorted(get_email_index(email) for email in emails) == [2, 3]
@@ -0,0 +1,49 @@
+from pathlib import Path
+
+from email_rules.core import EmailAddress, EmailSubject, EmailTo
+from email_rules.ingestion import iterate_mbox_emails, iterate_mbox_header_blocks
+
+MBOX_DATA = (
+    b"From sender@example.com Thu Jan  1 00:00:00 2026\n"
+    b"From: one@example.com\nTo: to@example.com\nSubject: First\n\n"
+    b"Body of the first message\n>From the escaped line\n\n"
+    b"From sender@example.com Thu Jan  1 00:00:01 2026\r\n"
+    b"From: two@example.com\r\nSubject: Second\r\n\r\nBody\r\n\r\n"
+    b"From sender@example.com Thu Jan  1 00:00:02 2026\n"
+    b"From: three@example.com\nSubject: No body\n"
+)
+
+
+class TestIterateMboxHeaderBlocks:
+    def test_header_blocks(self) -> None:
+        assert list(iterate_mbox_header_blocks(MBOX_DATA)) == [
+            b"From: one@example.com\nTo: to@example.com\nSubject: First\n",
+            b"From: two@example.com\r\nSubject: Second\r\n",
+            b"From: three@example.com\nSubject: No body\n",
+        ]
+
+    def test_leading_data_is_skipped(self) -> None:
+        assert len(list(iterate_mbox_header_blocks(b"garbage\n" + MBOX_DATA))) == 3
+
+    def test_no_messages(self) -> None:
+        assert list(iterate_mbox_header_blocks(b"")) == []
+        assert list(iterate_mbox_header_blocks(b"not an mbox")) == []
+
+
+class TestIterateMboxEmails:
+    def test_emails(self, tmp_path: Path) -> None:
+        path = tmp_path / "archive.mbox"
+        path.write_bytes(MBOX_DATA)
+        emails = list(iterate_mbox_emails(path))
+        assert [email.email_from for email in emails] == ["one@example.com", "two@example.com", "three@example.com"]
+        assert [email.email_subject for email in emails] == [
+            EmailSubject("First"),
+            EmailSubject("Second"),
+            EmailSubject("No body"),
+        ]
+        assert emails[0].email_to == [EmailTo(EmailAddress("to@example.com"))]
+
+    def test_empty_file(self, tmp_path: Path) -> None:
+        path = tmp_path / "empty.mbox"
+        path.write_bytes(b"")
+        assert list(iterate_mbox_emails(path)) == []
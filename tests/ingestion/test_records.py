@@ -0,0 +1,110 @@
+import csv
+import json
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from pydantic import ValidationError
+
+from email_rules.core import Email, EmailAddress, EmailFrom, EmailSubject, EmailTo
+from email_rules.ingestion import (
+    EmailRecord,
+    iterate_csv_emails,
+    iterate_csv_records,
+    iterate_emails_from_records,
+    iterate_jsonl_emails,
+    validate_email_records,
+)
+
+EMAILS = [
+    Email(
+        email_from=EmailFrom(EmailAddress(f"from_{index}@example.com")),
+        email_to=[EmailTo(EmailAddress(f"to_{recipient}@example.com")) for recipient in range(index % 3)],
+        email_subject=EmailSubject(f"Subject, {index}"),
+    )
+    for index in range(5)
+]
+RECORDS: list[EmailRecord] = [
+    {"from": email.email_from, "to": list(email.email_to), "subject": email.email_subject} for email in EMAILS
+]
+
+
+class TestIterateEmailsFromRecords:
+    @pytest.mark.parametrize(
+        "validate",
+        [
+            pytest.param(True, id="validated"),
+            pytest.param(False, id="trusted"),
+        ],
+    )
+    def test_emails(self, validate: bool) -> None:
+        assert list(iterate_emails_from_records(RECORDS, validate=validate, chunk_size=2)) == EMAILS
+
+    @pytest.mark.parametrize(
+        "validate",
+        [
+            pytest.param(True, id="validated"),
+            pytest.param(False, id="trusted"),
+        ],
+    )
+    def test_single_recipient_string(self, validate: bool) -> None:
+        records: list[EmailRecord] = [{"from": "from@example.com", "to": "to@example.com", "subject": "Subject"}]
+        (email,) = iterate_emails_from_records(records, validate=validate)
+        assert email.email_to == [EmailTo(EmailAddress("to@example.com"))]
+
+    def test_invalid_recipients(self) -> None:
+        records: list[EmailRecord] = [{"from": "from@example.com", "to": 1, "subject": "Subject"}]
+        with pytest.raises(ValidationError):
+            list(iterate_emails_from_records(records))
+        with pytest.raises(TypeError):
+            list(iterate_emails_from_records(records, validate=False))
+
+    def test_invalid_record(self) -> None:
+        records: list[EmailRecord] = [*RECORDS, {"from": "from@example.com", "to": None, "subject": "Subject"}]
+        emails = iterate_emails_from_records(records, chunk_size=2)
+        # The chunks before the invalid record are still yielded
+        assert [next(emails) for _ in range(4)] == EMAILS[:4]
+        with pytest.raises(ValidationError):
+            list(emails)
+
+    def test_missing_key(self) -> None:
+        with pytest.raises(ValidationError):
+            validate_email_records([{"from": "from@example.com", "to": []}])
+        with pytest.raises(KeyError):
+            list(iterate_emails_from_records([{"from": "from@example.com", "to": []}], validate=False))
+
+    def test_records_are_read_lazily(self) -> None:
+        records_read: list[int] = []
+
+        def iterate_records() -> Iterator[EmailRecord]:
+            for index, record in enumerate(RECORDS):
+                records_read.append(index)
+                yield record
+
+        next(iterate_emails_from_records(iterate_records(), chunk_size=2))
+        assert records_read == [0, 1]
+
+
+class TestIterateJsonlEmails:
+    @pytest.mark.parametrize("validate", [True, False])
+    def test_emails(self, tmp_path: Path, validate: bool) -> None:
+        path = tmp_path / "emails.jsonl"
+        path.write_text("\n".join(json.dumps(record) for record in RECORDS) + "\n\n")
+        assert list(iterate_jsonl_emails(path, validate=validate)) == EMAILS
+
+
+class TestIterateCsvEmails:
+    def test_records(self) -> None:
+        lines = ["from,to,subject", 'from@example.com,"a@example.com, b@example.com",Subject']
+        assert list(iterate_csv_records(lines)) == [
+            {"from": "from@example.com", "to": ["a@example.com", "b@example.com"], "subject": "Subject"}
+        ]
+
+    @pytest.mark.parametrize("validate", [True, False])
+    def test_emails(self, tmp_path: Path, validate: bool) -> None:
+        path = tmp_path / "emails.csv"
+        with path.open("w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["from", "to", "subject"])
+            writer.writerows([record["from"], "|".join(record["to"]), record["subject"]] for record in RECORDS)
+        assert list(iterate_csv_emails(path, validate=validate, recipient_separator="|")) == EMAILS
@@ -20,6 +20,23 @@ class RuleAlwaysFalse(RuleFilter):
         return "FALSE"
 
 
+class RuleAlwaysTrueAndTrackCalls(RuleFilter):
+    instance: int
+    calls: ClassVar[list[int]]
+
+    @staticmethod
+    def clear_calls() -> None:
+        RuleAlwaysTrueAndTrackCalls.calls = []
+        assert not RuleAlwaysTrueAndTrackCalls.calls, "Could not clear"
+
+    def evaluate(self, email: Email) -> bool:
+        self.calls.append(self.instance)
+        return True
+
+    def __repr__(self) -> str:
+        return f"TRUE_{self.instance}"
+
+
 class RuleActionDoNothingAndTrackCalls(RuleAction):
     instance: int
     calls: ClassVar[list[int]]
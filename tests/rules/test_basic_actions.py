@@ -1,10 +1,18 @@
 from pathlib import PurePosixPath
 
-from email_rules.core import EmailFolder, EmailState, EmailTag
+import pytest
+from pydantic import ValidationError
+
+from email_rules.core import EmailFolder, EmailState, EmailTag, RuntimeEmailState
 from email_rules.rules import (
+    RuleAction,
     RuleActionAddTag,
     RuleActionMarkAsRead,
     RuleActionMoveToFolder,
+    RuleActionStopProcessingAllFiles,
+    RuleActionStopProcessingAllFilesException,
+    RuleActionStopProcessingCurrentFile,
+    RuleApplicationInterruptState,
 )
 
 
@@ -29,3 +37,87 @@ def test_rule_action_move_to_folder() -> None:
 def test_rule_action_mark_as_read() -> None:
     rule_action = RuleActionMarkAsRead()
     assert rule_action.apply(EmailState.create_initial_state()).is_read is True
+
+
+def test_rule_action_add_existing_tag_keeps_state() -> None:
+    email_state = RuleActionAddTag(tag_to_apply=EmailTag("some_tag")).apply(EmailState.create_initial_state())
+    assert RuleActionAddTag(tag_to_apply=EmailTag("some_tag")).apply(email_state) is email_state
+
+
+@pytest.mark.parametrize(
+    "rule_action",
+    [
+        pytest.param(RuleActionAddTag(tag_to_apply=EmailTag("some_tag")), id="add_tag"),
+        pytest.param(RuleActionMoveToFolder(folder=EmailFolder(PurePosixPath("abc/def"))), id="move_to_folder"),
+        pytest.param(RuleActionMarkAsRead(), id="mark_as_read"),
+    ],
+)
+def test_rule_action_does_not_modify_state(rule_action: RuleAction) -> None:
+    email_state = EmailState.create_initial_state()
+    assert rule_action.apply(email_state) != email_state
+    assert email_state == EmailState.create_initial_state()
+
+
+def test_email_state_is_immutable() -> None:
+    with pytest.raises(ValidationError):
+        EmailState.create_initial_state().is_read = True
+
+
+@pytest.mark.parametrize(
+    "rule_action, expected_interrupt_state",
+    [
+        pytest.param(RuleActionMarkAsRead(), RuleApplicationInterruptState.CONTINUE, id="mark_as_read"),
+        pytest.param(
+            RuleActionStopProcessingCurrentFile(),
+            RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE,
+            id="stop_current_file",
+        ),
+        pytest.param(
+            RuleActionStopProcessingAllFiles(), RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES, id="stop_all"
+        ),
+    ],
+)
+def test_rule_action_interrupt_state(
+    rule_action: RuleAction, expected_interrupt_state: RuleApplicationInterruptState
+) -> None:
+    _, interrupt_state = rule_action.apply_with_interrupt_state(EmailState.create_initial_state())
+    assert interrupt_state == expected_interrupt_state
+
+
+def test_rule_action_interrupt_state_from_exception() -> None:
+    class RuleActionRaiseStopProcessingAllFiles(RuleAction):
+        def apply(self, email_state: EmailState) -> EmailState:
+            raise RuleActionStopProcessingAllFilesException()
+
+    email_state = EmailState.create_initial_state()
+    assert RuleActionRaiseStopProcessingAllFiles().apply_with_interrupt_state(email_state) == (
+        email_state,
+        RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES,
+    )
+
+
+class RuleActionMarkAsReadInApply(RuleAction):
+    def apply(self, email_state: EmailState) -> EmailState:
+        return email_state.model_copy(update={"is_read": True})
+
+
+@pytest.mark.parametrize(
+    "rule_action",
+    [
+        pytest.param(RuleActionAddTag(tag_to_apply=EmailTag("some_tag")), id="add_tag"),
+        pytest.param(RuleActionAddTag(tag_to_apply=EmailTag("existing_tag")), id="add_existing_tag"),
+        pytest.param(RuleActionMoveToFolder(folder=EmailFolder(PurePosixPath("abc/def"))), id="move_to_folder"),
+        pytest.param(RuleActionMarkAsRead(), id="mark_as_read"),
+        pytest.param(RuleActionStopProcessingCurrentFile(), id="stop_current_file"),
+        pytest.param(RuleActionStopProcessingAllFiles(), id="stop_all"),
+        pytest.param(RuleActionMarkAsReadInApply(), id="custom_action"),
+    ],
+)
+def test_rule_action_apply_to_runtime_state(rule_action: RuleAction) -> None:
+    email_state = EmailState.create_initial_state().model_copy(update={"tags": frozenset({EmailTag("existing_tag")})})
+    expected_email_state, expected_interrupt_state = rule_action.apply_with_interrupt_state(email_state)
+    runtime_email_state, interrupt_state = rule_action.apply_to_runtime_state(
+        RuntimeEmailState.from_email_state(email_state)
+    )
+    assert runtime_email_state.to_email_state() == expected_email_state
+    assert interrupt_state == expected_interrupt_state
@@ -1,7 +1,21 @@
 import pytest
 
-from email_rules.core import Email
-from email_rules.rules import RuleSubjectContains, RuleSubjectEq, RuleToEq
+from email_rules.core import (
+    Email,
+    EmailAddress,
+    EmailBatch,
+    EmailFrom,
+    EmailSubject,
+    EmailTo,
+)
+from email_rules.rules import (
+    RuleFilter,
+    RuleFilterCompiler,
+    RuleFromEq,
+    RuleSubjectContains,
+    RuleSubjectEq,
+    RuleToEq,
+)
 
 
 class TestRuleTextContains:
@@ -16,6 +30,11 @@ class TestRuleTextContains:
     )
     def test_subject_contains(self, text: str, case_sensitive: bool, expected: bool, generic_email: Email) -> None:
         assert RuleSubjectContains.create(text, case_sensitive).evaluate(generic_email) == expected
+        assert RuleSubjectContains.create(text, case_sensitive).compile()(generic_email) == expected
+        assert (
+            RuleSubjectContains.create(text, case_sensitive).evaluate_batch(EmailBatch(emails=[generic_email]))
+            == expected
+        )
 
 
 class TestRuleTextEq:
@@ -30,6 +49,8 @@ class TestRuleTextEq:
     )
     def test_subject_eq(self, text: str, case_sensitive: bool, expected: bool, generic_email: Email) -> None:
         assert RuleSubjectEq.create(text, case_sensitive).evaluate(generic_email) == expected
+        assert RuleSubjectEq.create(text, case_sensitive).compile()(generic_email) == expected
+        assert RuleSubjectEq.create(text, case_sensitive).evaluate_batch(EmailBatch(emails=[generic_email])) == expected
 
 
 class TestRuleTextListContains:
@@ -46,3 +67,72 @@ class TestRuleTextListContains:
     )
     def test_rule_to_eq(self, text: str, case_sensitive: bool, expected: bool, generic_email: Email) -> None:
         assert RuleToEq.create(text, case_sensitive).evaluate(generic_email) == expected
+        assert RuleToEq.create(text, case_sensitive).compile()(generic_email) == expected
+        assert RuleToEq.create(text, case_sensitive).evaluate_batch(EmailBatch(emails=[generic_email])) == expected
+
+    def test_rule_to_eq_follows_recipients_modified_in_place(self, generic_email: Email) -> None:
+        rule_filter = RuleToEq.create("B@example.com", case_sensitive=False)
+        compiled_filter = rule_filter.compile()
+        # Shared subexpressions are memoized per normalized email
+        memoized_filter = RuleFilterCompiler([rule_filter, rule_filter]).compile(rule_filter)
+        assert not rule_filter.evaluate(generic_email)
+        assert not compiled_filter(generic_email)
+        assert not memoized_filter(generic_email)
+
+        generic_email.email_to.append(EmailTo(EmailAddress("b@example.com")))
+        assert rule_filter.evaluate(generic_email)
+        assert compiled_filter(generic_email)
+        assert memoized_filter(generic_email)
+
+
+class TestNormalizedText:
+    @pytest.mark.parametrize(
+        "case_sensitive, expected",
+        [
+            pytest.param(True, "Subject 1", id="case_sensitive"),
+            pytest.param(False, "subject 1", id="case_insensitive"),
+        ],
+    )
+    def test_normalized_text(self, case_sensitive: bool, expected: str) -> None:
+        assert RuleSubjectEq.create("Subject 1", case_sensitive).normalized_text == expected
+
+    def test_normalized_text_follows_changes(self, generic_email: Email) -> None:
+        rule_filter = RuleSubjectEq.create("Subject 2", case_sensitive=False)
+        assert not rule_filter.evaluate(generic_email)
+
+        rule_filter.text = EmailSubject("SUBJECT 1")
+        assert rule_filter.evaluate(generic_email)
+        assert rule_filter.model_copy(update={"text": EmailSubject("Subject 3")}).normalized_text == "subject 3"
+
+
+def create_email(email_from: str, email_to: list[str], email_subject: str) -> Email:
+    return Email(
+        email_from=EmailFrom(EmailAddress(email_from)),
+        email_to=[EmailTo(EmailAddress(address)) for address in email_to],
+        email_subject=EmailSubject(email_subject),
+    )
+
+
+class TestEvaluateBatch:
+    @pytest.mark.parametrize(
+        "rule_filter",
+        [
+            pytest.param(RuleFromEq.create("a@example.com"), id="from_eq"),
+            pytest.param(RuleFromEq.create("A@example.com", case_sensitive=False), id="from_eq_insensitive"),
+            pytest.param(RuleSubjectEq.create("Hello"), id="subject_eq"),
+            pytest.param(RuleSubjectContains.create("ell"), id="subject_contains"),
+            pytest.param(RuleSubjectContains.create("ELL", case_sensitive=False), id="subject_contains_insensitive"),
+            pytest.param(RuleSubjectContains.create("missing"), id="subject_contains_missing"),
+            pytest.param(RuleToEq.create("c@example.com"), id="to_eq"),
+            pytest.param(RuleToEq.create("C@example.com", case_sensitive=False), id="to_eq_insensitive"),
+        ],
+    )
+    def test_matches_evaluate(self, rule_filter: RuleFilter) -> None:
+        emails = [
+            create_email("a@example.com", ["c@example.com"], "Hello"),
+            create_email("A@example.com", ["b@example.com", "C@example.com"], "HELLO there"),
+            create_email("b@example.com", [], "Goodbye"),
+            create_email("a@example.com", ["c@example.com", "c@example.com"], "Hello"),
+        ]
+        expected_mask = sum(1 << index for index, email in enumerate(emails) if rule_filter.evaluate(email))
+        assert rule_filter.evaluate_batch(EmailBatch(emails=emails)) == expected_mask
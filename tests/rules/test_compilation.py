@@ -0,0 +1,258 @@
+from typing import Hashable
+
+import pytest
+
+from email_rules.core import Email, EmailSubject
+from email_rules.rules import (
+    AggregatedRuleFilter,
+    CompiledRuleSet,
+    ConstantRuleFilter,
+    ExactMatchRuleIndex,
+    Rule,
+    RuleFilter,
+    RuleFilterCompiler,
+    RuleFromEq,
+    RuleSubjectContains,
+    RuleSubjectEq,
+    RuleToEq,
+    TextContainsIndex,
+    get_structural_key,
+)
+from email_rules.rules._aho_corasick import AhoCorasickAutomaton
+from tests.rules.common import ALWAYS_FALSE, ALWAYS_TRUE, RuleAlwaysTrueAndTrackCalls
+
+
+class TestAhoCorasickAutomaton:
+    @pytest.mark.parametrize(
+        "patterns, text, expected",
+        [
+            pytest.param([], "ushers", set(), id="no_patterns"),
+            pytest.param(["he", "she", "his", "hers"], "ushers", {"he", "she", "hers"}, id="overlapping"),
+            pytest.param(["a", "ab", "bab", "bc", "bca", "c", "caa"], "abccab", {"a", "ab", "bc", "c"}, id="fallbacks"),
+            pytest.param(["abc"], "ab", set(), id="partial_match"),
+            pytest.param(["", "x"], "abc", {""}, id="empty_pattern"),
+            pytest.param(["Sub"], "sub", set(), id="case_sensitive"),
+        ],
+    )
+    def test_find_all(self, patterns: list[str], text: str, expected: set[str]) -> None:
+        assert AhoCorasickAutomaton(patterns).find_all(text) == expected
+
+    @pytest.mark.parametrize(
+        "patterns, text",
+        [
+            pytest.param(["ab", "b", "aab", "abab"], "aabababba", id="repeated"),
+            pytest.param(
+                ["your feedback", "feedback is important", "us"], "your feedback is important to us", id="words"
+            ),
+        ],
+    )
+    def test_matches_str_contains(self, patterns: list[str], text: str) -> None:
+        assert AhoCorasickAutomaton(patterns).find_all(text) == {pattern for pattern in patterns if pattern in text}
+
+
+class TestRuleFilterCompiler:
+    @pytest.mark.parametrize(
+        "text, case_sensitive, expected",
+        [
+            pytest.param("Sub", True, True, id="case_right"),
+            pytest.param("Sub", False, True, id="case_right_and_insensitive"),
+            pytest.param("sub", True, False, id="case_wrong"),
+            pytest.param("sub", False, True, id="case_wrong_but_insensitive"),
+            pytest.param("Subject 2", False, False, id="not_contained"),
+        ],
+    )
+    def test_subject_contains(self, text: str, case_sensitive: bool, expected: bool, generic_email: Email) -> None:
+        compiler = RuleFilterCompiler()
+        compiled_filter = compiler.compile(RuleSubjectContains.create(text, case_sensitive))
+        assert compiled_filter(generic_email) == expected
+
+    def test_subject_is_scanned_once_per_email(self, generic_email: Email, monkeypatch: pytest.MonkeyPatch) -> None:
+        scanned_texts: list[str] = []
+        find_all = AhoCorasickAutomaton.find_all
+
+        def find_all_and_track_calls(self: AhoCorasickAutomaton, text: str) -> frozenset[str]:
+            scanned_texts.append(text)
+            return find_all(self, text)
+
+        monkeypatch.setattr(AhoCorasickAutomaton, "find_all", find_all_and_track_calls)
+
+        compiler = RuleFilterCompiler()
+        compiled_filters = [
+            compiler.compile(RuleSubjectContains.create(text, case_sensitive=False)) for text in ["a", "sub", "1", "2"]
+        ]
+        assert [compiled_filter(generic_email) for compiled_filter in compiled_filters] == [False, True, True, False]
+        assert scanned_texts == ["subject 1"]
+
+        other_email = generic_email.model_copy(update={"email_subject": EmailSubject("Subject 2")})
+        assert [compiled_filter(other_email) for compiled_filter in compiled_filters] == [False, True, False, True]
+        assert scanned_texts == ["subject 1", "subject 2"]
+
+    def test_index_is_rebuilt_when_patterns_are_added(self, generic_email: Email) -> None:
+        index = TextContainsIndex(
+            RuleSubjectContains.get_text_from_email,
+            RuleSubjectContains.get_normalized_text_from_email,
+            case_sensitive=True,
+        )
+        index.add_pattern("Sub")
+        assert index.find_all(generic_email) == {"Sub"}
+        index.add_pattern("1")
+        assert index.find_all(generic_email) == {"Sub", "1"}
+
+
+class TestSharedSubexpressions:
+    @pytest.fixture(autouse=True)
+    def clear_calls(self) -> None:
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+
+    @pytest.mark.parametrize(
+        "rule_filter_1, rule_filter_2, expected_equal",
+        [
+            pytest.param(RuleFromEq.create("a"), RuleFromEq.create("a"), True, id="same_leaf"),
+            pytest.param(RuleFromEq.create("a"), RuleFromEq.create("b"), False, id="different_text"),
+            pytest.param(RuleFromEq.create("a"), RuleFromEq.create("a", case_sensitive=False), False, id="case"),
+            pytest.param(RuleFromEq.create("a"), RuleSubjectEq.create("a"), False, id="different_type"),
+            pytest.param(
+                RuleFromEq.create("a") | ~RuleSubjectEq.create("b"),
+                RuleFromEq.create("a") | ~RuleSubjectEq.create("b"),
+                True,
+                id="same_tree",
+            ),
+            pytest.param(
+                RuleFromEq.create("a") | RuleSubjectEq.create("b"),
+                RuleFromEq.create("a") & RuleSubjectEq.create("b"),
+                False,
+                id="different_operator",
+            ),
+        ],
+    )
+    def test_structural_key(self, rule_filter_1: RuleFilter, rule_filter_2: RuleFilter, expected_equal: bool) -> None:
+        assert (get_structural_key(rule_filter_1) == get_structural_key(rule_filter_2)) == expected_equal
+
+    def test_subexpressions_are_collected(self) -> None:
+        subexpression_keys: list[Hashable] = []
+        rule_filter = RuleFromEq.create("a") | ~RuleSubjectEq.create("b")
+        get_structural_key(rule_filter, subexpression_keys)
+        assert subexpression_keys == [
+            get_structural_key(RuleFromEq.create("a")),
+            get_structural_key(RuleSubjectEq.create("b")),
+            get_structural_key(~RuleSubjectEq.create("b")),
+            get_structural_key(rule_filter),
+        ]
+
+    def test_shared_subexpression_is_evaluated_once_per_email(self, generic_email: Email) -> None:
+        rule_filters = [
+            ALWAYS_TRUE & RuleAlwaysTrueAndTrackCalls(instance=0),
+            RuleAlwaysTrueAndTrackCalls(instance=0) & RuleAlwaysTrueAndTrackCalls(instance=1),
+            RuleAlwaysTrueAndTrackCalls(instance=0) | ALWAYS_FALSE,
+        ]
+        compiler = RuleFilterCompiler(rule_filters)
+        compiled_filters = [compiler.compile(rule_filter) for rule_filter in rule_filters]
+
+        assert all(compiled_filter(generic_email) for compiled_filter in compiled_filters)
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0, 1]
+
+        other_email = generic_email.model_copy(update={"email_subject": EmailSubject("Subject 2")})
+        assert all(compiled_filter(other_email) for compiled_filter in compiled_filters)
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0, 1, 0, 1]
+
+    def test_result_follows_email_changes(self, generic_email: Email) -> None:
+        rule_filters = [RuleSubjectEq.create("Subject 2"), RuleSubjectEq.create("Subject 2") | ALWAYS_FALSE]
+        compiler = RuleFilterCompiler(rule_filters)
+        compiled_filters = [compiler.compile(rule_filter) for rule_filter in rule_filters]
+        assert compiled_filters[0] is compiler.compile(RuleSubjectEq.create("Subject 2"))
+
+        assert not compiled_filters[0](generic_email)
+        generic_email.email_subject = EmailSubject("Subject 2")
+        assert compiled_filters[0](generic_email)
+
+
+class TestExactMatchRuleIndex:
+    @pytest.mark.parametrize(
+        "rule_filter, is_candidate",
+        [
+            pytest.param(RuleFromEq.create("FROM@example.com", case_sensitive=False), True, id="from_insensitive"),
+            pytest.param(RuleFromEq.create("FROM@example.com", case_sensitive=True), False, id="from_sensitive"),
+            pytest.param(RuleFromEq.create("other@example.com"), False, id="from_other"),
+            pytest.param(RuleSubjectEq.create("Subject 1"), True, id="subject"),
+            pytest.param(RuleToEq.create("to_2@example.com"), True, id="second_recipient"),
+            pytest.param(RuleToEq.create("TO_2@example.com", case_sensitive=False), True, id="recipient_insensitive"),
+            pytest.param(RuleToEq.create("other@example.com"), False, id="recipient_other"),
+            pytest.param(ALWAYS_FALSE, True, id="not_indexed"),
+            pytest.param(RuleFromEq.create("other@example.com") & ALWAYS_TRUE, False, id="and_with_other_from"),
+            pytest.param(ALWAYS_TRUE & RuleSubjectEq.create("Subject 1"), True, id="and_with_subject"),
+            pytest.param(
+                RuleFromEq.create("other@example.com") | RuleToEq.create("to_1@example.com"), True, id="or_indexed"
+            ),
+            pytest.param(
+                RuleFromEq.create("other@example.com") | RuleToEq.create("other@example.com"),
+                False,
+                id="or_indexed_no_match",
+            ),
+            pytest.param(RuleFromEq.create("other@example.com") | ALWAYS_FALSE, True, id="or_not_indexed"),
+            pytest.param(~RuleFromEq.create("other@example.com"), True, id="negated"),
+            pytest.param(RuleSubjectContains.create("other"), True, id="contains"),
+            pytest.param(ConstantRuleFilter.create(True), True, id="constant_true"),
+            pytest.param(ConstantRuleFilter.create(False), False, id="constant_false"),
+        ],
+    )
+    def test_candidates(self, rule_filter: RuleFilter, is_candidate: bool, generic_email: Email) -> None:
+        index = ExactMatchRuleIndex([RuleFromEq.create("other@example.com"), rule_filter])
+        assert index.get_candidate_rule_indices(generic_email) == ([1] if is_candidate else [])
+
+    def test_candidates_are_in_rule_order(self, generic_email: Email) -> None:
+        index = ExactMatchRuleIndex(
+            [
+                RuleToEq.create("to_2@example.com"),
+                ALWAYS_FALSE,
+                RuleFromEq.create("other@example.com"),
+                RuleFromEq.create("from@example.com"),
+                RuleToEq.create("to_1@example.com"),
+                RuleFromEq.create("from@example.com"),
+            ]
+        )
+        assert index.get_candidate_rule_indices(generic_email) == [0, 1, 3, 4, 5]
+
+
+class TestCompiledRuleSet:
+    def test_matching_rules(self, generic_email: Email) -> None:
+        compiled_rules = CompiledRuleSet(
+            [
+                Rule(filter_expr=RuleFromEq.create("from@example.com") & ALWAYS_FALSE, actions=[]),
+                Rule(filter_expr=RuleFromEq.create("other@example.com"), actions=[]),
+                Rule(filter_expr=ALWAYS_TRUE, actions=[]),
+                Rule(filter_expr=RuleSubjectContains.create("1") & RuleToEq.create("to_1@example.com"), actions=[]),
+            ]
+        )
+        assert compiled_rules.get_candidate_rule_indices(generic_email) == [0, 2, 3]
+        assert list(compiled_rules.iterate_matching_rule_indices(generic_email)) == [2, 3]
+
+    def test_rules_are_simplified(self, generic_email: Email) -> None:
+        compiled_rules = CompiledRuleSet(
+            [
+                Rule(filter_expr=ALWAYS_TRUE & ~ConstantRuleFilter.create(True), actions=[]),
+                Rule(filter_expr=RuleFromEq.create("other@example.com") | ~~ALWAYS_TRUE, actions=[]),
+                Rule(filter_expr=RuleFromEq.create("other@example.com") & (ALWAYS_TRUE | ~~ALWAYS_TRUE), actions=[]),
+            ]
+        )
+        assert compiled_rules.get_candidate_rule_indices(generic_email) == [1]
+        assert list(compiled_rules.iterate_matching_rule_indices(generic_email)) == [1]
+
+    def test_is_compiled_from(self) -> None:
+        rules = [Rule(filter_expr=ALWAYS_TRUE, actions=[])]
+        compiled_rules = CompiledRuleSet(rules)
+        assert compiled_rules.is_compiled_from(rules)
+        assert compiled_rules.is_compiled_from(list(rules))
+
+        rules.append(Rule(filter_expr=ALWAYS_FALSE, actions=[]))
+        assert not compiled_rules.is_compiled_from(rules)
+        rules.pop()
+        rules[0] = Rule(filter_expr=ALWAYS_TRUE, actions=[])
+        assert not compiled_rules.is_compiled_from(rules)
+
+    def test_rule_modified_in_place_is_not_compiled_from(self) -> None:
+        rule = Rule(filter_expr=ALWAYS_TRUE & ALWAYS_TRUE, actions=[])
+        compiled_rules = CompiledRuleSet([rule])
+        assert compiled_rules.is_compiled_from([rule])
+        assert isinstance(rule.filter_expr, AggregatedRuleFilter)
+        rule.filter_expr.append_arg(ALWAYS_FALSE)
+        assert not compiled_rules.is_compiled_from([rule])
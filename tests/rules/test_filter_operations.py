@@ -1,8 +1,31 @@
+import pickle
+from pathlib import PurePosixPath
+
 import pytest
 
-from email_rules.core import Email
-from email_rules.rules import RuleFilter
-from tests.rules.common import ALWAYS_FALSE, ALWAYS_TRUE
+from email_rules.core import Email, EmailBatch, EmailFolder, EmailSubject, EmailTag
+from email_rules.rules import (
+    AggregatedRuleFilter,
+    ConstantRuleFilter,
+    Rule,
+    RuleActionAddTag,
+    RuleActionMarkAsRead,
+    RuleActionMoveToFolder,
+    RuleActionStopProcessingAllFiles,
+    RuleActionStopProcessingCurrentFile,
+    RuleFilter,
+    RuleFilterOperator,
+    RuleFromEq,
+    RuleSubjectContains,
+    RuleSubjectEq,
+    RuleToEq,
+)
+from tests.rules.common import (
+    ALWAYS_FALSE,
+    ALWAYS_TRUE,
+    RuleActionDoNothingAndTrackCalls,
+    RuleAlwaysTrueAndTrackCalls,
+)
 
 
 class TestCombination:
@@ -115,3 +138,219 @@ class TestCombination:
     )
     def test_combination_structure(self, rule_filter: RuleFilter, expected_repr: str) -> None:
         assert repr(rule_filter) == expected_repr
+
+    def test_combination_does_not_modify_operands(self, generic_email: Email) -> None:
+        rule = Rule(filter_expr=ALWAYS_TRUE & ALWAYS_TRUE, actions=[])
+        assert rule.compiled_filter_expr(generic_email)
+        combined_filter = rule.filter_expr & ALWAYS_FALSE
+        combined_filter = combined_filter | ALWAYS_FALSE & ALWAYS_FALSE
+        assert repr(rule.filter_expr) == "(TRUE & TRUE)"
+        assert repr(combined_filter) == "((TRUE & TRUE & FALSE) | (FALSE & FALSE))"
+        assert rule.compiled_filter_expr(generic_email) == rule.filter_expr.evaluate(generic_email)
+
+
+class TestCompile:
+    @pytest.fixture(autouse=True)
+    def clear_calls(self) -> None:
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+
+    @pytest.mark.parametrize(
+        "rule, expected_eval",
+        [
+            pytest.param(~ALWAYS_TRUE, False, id="not_true"),
+            pytest.param(ALWAYS_TRUE & ALWAYS_FALSE, False, id="true_and_false"),
+            pytest.param(ALWAYS_FALSE | ALWAYS_TRUE, True, id="false_or_true"),
+            pytest.param(ALWAYS_FALSE | ALWAYS_TRUE & ALWAYS_TRUE & ALWAYS_FALSE, False, id="false_or_and"),
+            pytest.param(~(ALWAYS_FALSE & ALWAYS_FALSE) & ALWAYS_TRUE, True, id="not_and_then_and"),
+        ],
+    )
+    def test_compiled_matches_evaluate(self, rule: RuleFilter, expected_eval: bool, generic_email: Email) -> None:
+        assert rule.evaluate(generic_email) == expected_eval
+        assert rule.compile()(generic_email) == expected_eval
+
+    @pytest.mark.parametrize(
+        "rule, expected_calls",
+        [
+            pytest.param(
+                ALWAYS_FALSE & RuleAlwaysTrueAndTrackCalls(instance=0),
+                [],
+                id="and_stops_at_false",
+            ),
+            pytest.param(
+                RuleAlwaysTrueAndTrackCalls(instance=0) | RuleAlwaysTrueAndTrackCalls(instance=1),
+                [0],
+                id="or_stops_at_true",
+            ),
+            pytest.param(
+                RuleAlwaysTrueAndTrackCalls(instance=0)
+                & (ALWAYS_FALSE | RuleAlwaysTrueAndTrackCalls(instance=1) | RuleAlwaysTrueAndTrackCalls(instance=2)),
+                [0, 1],
+                id="nested",
+            ),
+        ],
+    )
+    def test_compiled_short_circuits(self, rule: RuleFilter, expected_calls: list[int], generic_email: Email) -> None:
+        rule.compile()(generic_email)
+        assert RuleAlwaysTrueAndTrackCalls.calls == expected_calls
+
+
+X = RuleAlwaysTrueAndTrackCalls(instance=0)
+Y = RuleAlwaysTrueAndTrackCalls(instance=1)
+Z = RuleAlwaysTrueAndTrackCalls(instance=2)
+TRUE = ConstantRuleFilter.create(True)
+FALSE = ConstantRuleFilter.create(False)
+
+
+class TestSimplify:
+    @pytest.mark.parametrize(
+        "rule_filter, expected_repr",
+        [
+            pytest.param(X, "TRUE_0", id="leaf"),
+            pytest.param(X & (Y & Z), "(TRUE_0 & TRUE_1 & TRUE_2)", id="flatten_and"),
+            pytest.param((X | Y) | (Z | X), "(TRUE_0 | TRUE_1 | TRUE_2)", id="flatten_and_dedupe_or"),
+            pytest.param(X & (Y | Z), "(TRUE_0 & (TRUE_1 | TRUE_2))", id="no_flatten_other_operator"),
+            pytest.param(X & X, "TRUE_0", id="dedupe_to_single_arg"),
+            pytest.param(X & RuleAlwaysTrueAndTrackCalls(instance=0), "TRUE_0", id="dedupe_equal_args"),
+            pytest.param(~~X, "TRUE_0", id="double_negation"),
+            pytest.param(~~~X, "~TRUE_0", id="triple_negation"),
+            pytest.param(~(~X & ~~Y), "~(~TRUE_0 & TRUE_1)", id="nested_double_negation"),
+            pytest.param(~TRUE, "False", id="not_true"),
+            pytest.param(X & TRUE, "TRUE_0", id="and_true"),
+            pytest.param(X & FALSE & Y, "False", id="and_false"),
+            pytest.param(X | TRUE, "True", id="or_true"),
+            pytest.param(X | FALSE | Y, "(TRUE_0 | TRUE_1)", id="or_false"),
+            pytest.param(TRUE & ~FALSE, "True", id="and_only_constants"),
+            pytest.param(X | (Y & ~TRUE), "TRUE_0", id="nested_constant"),
+            pytest.param(X & (X | Y), "TRUE_0", id="absorb_and"),
+            pytest.param((Y & X) | X, "TRUE_0", id="absorb_or"),
+            pytest.param(X & (Y | Z) & (Z | Y | X), "(TRUE_0 & (TRUE_1 | TRUE_2))", id="absorb_group"),
+            pytest.param((X | Y) & (Y | X), "(TRUE_0 | TRUE_1)", id="absorb_same_group_keeps_first"),
+            pytest.param((X | Y) & (Y | Z), "((TRUE_0 | TRUE_1) & (TRUE_1 | TRUE_2))", id="no_absorb_overlap"),
+            pytest.param((X | Y | Z) & (Z | X), "(TRUE_2 | TRUE_0)", id="absorb_group_by_later_group"),
+            pytest.param((X | Y) & (Y | Z) & Y, "TRUE_1", id="absorb_groups_by_later_arg"),
+        ],
+    )
+    def test_simplify(self, rule_filter: RuleFilter, expected_repr: str) -> None:
+        assert repr(rule_filter.simplify()) == expected_repr
+
+    def test_unchanged_filter_is_returned(self) -> None:
+        rule_filter = X & ~(Y | Z)
+        assert rule_filter.simplify() is rule_filter
+
+    def test_original_is_not_modified(self) -> None:
+        rule_filter = X & (Y & ~~Z) & TRUE
+        assert repr(rule_filter.simplify()) == "(TRUE_0 & TRUE_1 & TRUE_2)"
+        assert repr(rule_filter) == "(TRUE_0 & (TRUE_1 & ~~TRUE_2) & True)"
+
+    @pytest.mark.parametrize(
+        "rule_filter",
+        [
+            pytest.param(ALWAYS_FALSE | ~~(ALWAYS_TRUE & ALWAYS_TRUE), id="double_negation"),
+            pytest.param(ALWAYS_FALSE & (ALWAYS_FALSE | ALWAYS_TRUE), id="absorption"),
+            pytest.param(~(ALWAYS_FALSE & ALWAYS_FALSE) & TRUE & ~FALSE, id="constants"),
+        ],
+    )
+    def test_simplified_matches_evaluate(self, rule_filter: RuleFilter, generic_email: Email) -> None:
+        assert rule_filter.simplify().evaluate(generic_email) == rule_filter.evaluate(generic_email)
+
+    def test_rule_evaluates_simplified_filter(self, generic_email: Email) -> None:
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+        rule = Rule(filter_expr=~~X & (X | Y) & X, actions=[])
+        assert rule.compiled_filter_expr(generic_email)
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0]
+
+
+class TestEvaluateBatch:
+    @pytest.mark.parametrize(
+        "rule_filter, expected_mask",
+        [
+            pytest.param(ALWAYS_TRUE, 0b111, id="custom_filter"),
+            pytest.param(RuleSubjectEq.create("Subject 2"), 0b010, id="leaf"),
+            pytest.param(~RuleSubjectEq.create("Subject 2"), 0b101, id="not"),
+            pytest.param(RuleSubjectEq.create("Subject 2") & ALWAYS_FALSE, 0b000, id="and"),
+            pytest.param(RuleSubjectEq.create("Subject 2") | RuleSubjectEq.create("Subject 3"), 0b110, id="or"),
+            pytest.param(ALWAYS_TRUE | RuleSubjectEq.create("Subject 2"), 0b111, id="or_full"),
+            pytest.param(TRUE, 0b111, id="constant_true"),
+            pytest.param(FALSE, 0b000, id="constant_false"),
+        ],
+    )
+    def test_evaluate_batch(self, rule_filter: RuleFilter, expected_mask: int, generic_email: Email) -> None:
+        emails = [
+            generic_email.model_copy(update={"email_subject": EmailSubject(f"Subject {index}")}) for index in [1, 2, 3]
+        ]
+        assert rule_filter.evaluate_batch(EmailBatch(emails=emails)) == expected_mask
+        assert rule_filter.evaluate_batch(EmailBatch(emails=[])) == 0
+
+    def test_rule_evaluates_simplified_filter(self, generic_email: Email) -> None:
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+        rule = Rule(filter_expr=FALSE & X, actions=[])
+        assert rule.evaluate_batch(EmailBatch(emails=[generic_email])) == 0
+        assert RuleAlwaysTrueAndTrackCalls.calls == []
+
+
+SERIALIZED_RULE_FILTER = (
+    RuleFromEq.create("from@example.com") & ~RuleSubjectContains.create("subject", case_sensitive=False)
+) | (RuleToEq.create("to@example.com") & ConstantRuleFilter.create(True) & RuleAlwaysTrueAndTrackCalls(instance=1))
+SERIALIZED_RULE = Rule(
+    filter_expr=SERIALIZED_RULE_FILTER,
+    actions=[
+        RuleActionAddTag(tag_to_apply=EmailTag("TAG")),
+        RuleActionMoveToFolder(folder=EmailFolder(PurePosixPath("parent/child"))),
+        RuleActionMarkAsRead(),
+        RuleActionDoNothingAndTrackCalls(instance=1),
+        RuleActionStopProcessingCurrentFile(),
+        RuleActionStopProcessingAllFiles(),
+    ],
+    comment="comment",
+)
+
+
+class TestSerialization:
+    def test_operator(self) -> None:
+        assert SERIALIZED_RULE_FILTER.operator == RuleFilterOperator.OR
+        assert not SERIALIZED_RULE_FILTER.is_operator_and()
+        assert (ALWAYS_TRUE & ALWAYS_FALSE).is_operator_and()
+
+    @pytest.mark.parametrize(
+        "operator, expected_operator",
+        [
+            pytest.param(lambda x, y: x and y, RuleFilterOperator.AND, id="and"),
+            pytest.param(lambda x, y: x or y, RuleFilterOperator.OR, id="or"),
+        ],
+    )
+    def test_operator_function_is_converted(self, operator: object, expected_operator: RuleFilterOperator) -> None:
+        rule_filter = AggregatedRuleFilter.model_validate({"args": [ALWAYS_TRUE, ALWAYS_FALSE], "operator": operator})
+        assert rule_filter.operator == expected_operator
+
+    def test_pickle_rule(self, generic_email: Email) -> None:
+        # Compiled filters are closures, which are dropped when pickling
+        SERIALIZED_RULE.compiled_filter_expr(generic_email)
+        unpickled_rule = pickle.loads(pickle.dumps(SERIALIZED_RULE))
+        assert unpickled_rule == SERIALIZED_RULE
+        assert repr(unpickled_rule) == repr(SERIALIZED_RULE)
+        assert unpickled_rule.compiled_filter_expr(generic_email) == SERIALIZED_RULE.compiled_filter_expr(generic_email)
+
+    def test_model_dump_rule(self) -> None:
+        validated_rule = Rule.model_validate(SERIALIZED_RULE.model_dump())
+        assert validated_rule == SERIALIZED_RULE
+        assert repr(validated_rule) == repr(SERIALIZED_RULE)
+
+    def test_model_dump_json_rule(self) -> None:
+        validated_rule = Rule.model_validate_json(SERIALIZED_RULE.model_dump_json())
+        assert validated_rule == SERIALIZED_RULE
+        assert repr(validated_rule) == repr(SERIALIZED_RULE)
+
+    def test_model_validate_base_class(self) -> None:
+        rule_filter = RuleFromEq.create("from@example.com")
+        assert RuleFilter.model_validate(rule_filter.model_dump()) == rule_filter
+
+    @pytest.mark.parametrize(
+        "data",
+        [
+            pytest.param({"type": "unknown.RuleFilter"}, id="unknown_type"),
+            pytest.param(RuleActionMarkAsRead().model_dump(), id="not_a_filter"),
+        ],
+    )
+    def test_model_validate_invalid_type(self, data: dict[str, object]) -> None:
+        with pytest.raises(ValueError):
+            RuleFilter.model_validate(data)
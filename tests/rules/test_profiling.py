@@ -0,0 +1,104 @@
+import pytest
+
+from email_rules.core import Email, EmailSubject
+from email_rules.rules import (
+    CompiledRuleSet,
+    ConstantRuleFilter,
+    Rule,
+    RuleFilter,
+    RuleFilterLeafStats,
+    RuleFilterProfile,
+    RuleSubjectEq,
+    get_leaf_stats_key,
+    iterate_leaf_rule_filters,
+    reorder_rule_filter,
+)
+from tests.rules.common import RuleAlwaysTrueAndTrackCalls
+
+X = RuleAlwaysTrueAndTrackCalls(instance=0)
+Y = RuleAlwaysTrueAndTrackCalls(instance=1)
+Z = RuleAlwaysTrueAndTrackCalls(instance=2)
+
+
+def create_profile(leaves_with_costs_and_hit_rates: list[tuple[RuleFilter, int, float]]) -> RuleFilterProfile:
+    return RuleFilterProfile(
+        leaf_stats={
+            get_leaf_stats_key(leaf): RuleFilterLeafStats(
+                evaluations=100, hits=round(hit_rate * 100), total_time_ns=cost * 100
+            )
+            for leaf, cost, hit_rate in leaves_with_costs_and_hit_rates
+        }
+    )
+
+
+class TestRuleFilterProfile:
+    @pytest.fixture(autouse=True)
+    def clear_calls(self) -> None:
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+
+    def test_iterate_leaf_rule_filters(self) -> None:
+        assert list(iterate_leaf_rule_filters(X & ~(Y | X))) == [X, Y, X]
+
+    def test_record(self, generic_email: Email) -> None:
+        subject_eq = RuleSubjectEq.create("Subject 2")
+        other_email = generic_email.model_copy(update={"email_subject": EmailSubject("Subject 2")})
+        profile = RuleFilterProfile.create([X & ~subject_eq, X | Y], [generic_email, other_email, other_email])
+
+        # Shared leaves are only evaluated once per email, without short-circuiting
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0, 1, 0, 1, 0, 1]
+        subject_eq_stats = profile.leaf_stats[get_leaf_stats_key(subject_eq)]
+        assert (subject_eq_stats.evaluations, subject_eq_stats.hits) == (3, 2)
+        assert subject_eq_stats.get_hit_rate() == pytest.approx(2 / 3)
+        assert profile.leaf_stats[get_leaf_stats_key(X)].get_hit_rate() == 1.0
+        assert profile.leaf_stats[get_leaf_stats_key(X)].get_cost() > 0
+
+    @pytest.mark.parametrize(
+        "rule_filter, expected_cost, expected_hit_rate",
+        [
+            pytest.param(X, 10, 0.5, id="leaf"),
+            pytest.param(Z, 15, 0.5, id="unknown_leaf"),
+            pytest.param(ConstantRuleFilter.create(True), 0, 1.0, id="constant"),
+            pytest.param(~Y, 20, 0.75, id="negated"),
+            pytest.param(X & Y, 10 + 0.5 * 20, 0.125, id="and"),
+            pytest.param(Y & X, 20 + 0.25 * 10, 0.125, id="and_reversed"),
+            pytest.param(X | Y, 10 + 0.5 * 20, 0.625, id="or"),
+        ],
+    )
+    def test_estimate_cost_and_hit_rate(
+        self, rule_filter: RuleFilter, expected_cost: float, expected_hit_rate: float
+    ) -> None:
+        profile = create_profile([(X, 10, 0.5), (Y, 20, 0.25)])
+        assert profile.estimate_cost_and_hit_rate(rule_filter) == pytest.approx((expected_cost, expected_hit_rate))
+
+
+class TestReorderRuleFilter:
+    @pytest.mark.parametrize(
+        "rule_filter, expected_repr",
+        [
+            pytest.param(Y & X, "(TRUE_0 & TRUE_1)", id="and_cheaper_first"),
+            pytest.param(Y | X, "(TRUE_0 | TRUE_1)", id="or_cheaper_first"),
+            pytest.param(X & Z, "(TRUE_2 & TRUE_0)", id="and_selective_first"),
+            pytest.param(Z | X, "(TRUE_0 | TRUE_2)", id="or_selective_first"),
+            pytest.param(~(Y & X) | ~~Z, "(~~TRUE_2 | ~(TRUE_0 & TRUE_1))", id="nested"),
+        ],
+    )
+    def test_reorder(self, rule_filter: RuleFilter, expected_repr: str) -> None:
+        # X is cheap, Y is expensive and Z is as cheap as X but rarely matches
+        profile = create_profile([(X, 1, 0.9), (Y, 10, 0.9), (Z, 2, 0.1)])
+        assert repr(reorder_rule_filter(rule_filter, profile)) == expected_repr
+
+    def test_unchanged_filter_is_returned(self) -> None:
+        rule_filter = X & ~(Y | Z)
+        assert reorder_rule_filter(rule_filter, create_profile([])) is rule_filter
+
+    def test_original_is_not_modified(self) -> None:
+        rule_filter = Y & X
+        reorder_rule_filter(rule_filter, create_profile([(X, 1, 0.5), (Y, 10, 0.5)]))
+        assert repr(rule_filter) == "(TRUE_1 & TRUE_0)"
+
+    def test_compiled_rule_set_uses_order(self, generic_email: Email) -> None:
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+        profile = create_profile([(X, 10, 0.5), (Y, 1, 0.5)])
+        compiled_rules = CompiledRuleSet([Rule(filter_expr=X | Y, actions=[])], rule_filter_profile=profile)
+        assert list(compiled_rules.iterate_matching_rule_indices(generic_email)) == [0]
+        assert RuleAlwaysTrueAndTrackCalls.calls == [1]
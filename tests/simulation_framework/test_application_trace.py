@@ -0,0 +1,137 @@
+import pytest
+
+from email_rules.core import Email
+from email_rules.rules import RuleApplicationInterruptState
+from email_rules.simulation_framework import (
+    RuleApplicationTrace,
+    RuleApplicationTraceStep,
+    TraceVerbosity,
+    apply_rule_files_to_email_final_state,
+    apply_rule_files_to_email_iteratively,
+    apply_rule_files_to_email_with_trace,
+    display_rule_file_application_states,
+)
+from tests.rules.common import (
+    ALWAYS_FALSE,
+    ALWAYS_TRUE,
+    RuleActionDoNothingAndTrackCalls,
+)
+from tests.simulation_framework.test_rule_application import RuleInfo, create_rule_file
+
+CONTINUE = RuleApplicationInterruptState.CONTINUE
+STOP_CURRENT_FILE = RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE
+STOP_ALL_FILES = RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES
+
+
+@pytest.fixture
+def do_nothing_actions() -> list[RuleActionDoNothingAndTrackCalls]:
+    RuleActionDoNothingAndTrackCalls.clear_calls()
+    return [RuleActionDoNothingAndTrackCalls(instance=i) for i in range(3)]
+
+
+RULE_INFO_FOR_FILES = [
+    pytest.param([[([0, 1], ALWAYS_TRUE), ([2], ALWAYS_FALSE)]], id="one_file"),
+    pytest.param([[([0, -2], ALWAYS_TRUE), ([1], ALWAYS_TRUE)], [([2], ALWAYS_TRUE)]], id="stop_current_file"),
+    pytest.param([[([0], ALWAYS_FALSE), ([1, -1], ALWAYS_TRUE)], [([2], ALWAYS_TRUE)]], id="stop_all_files"),
+]
+
+
+class TestRuleApplicationTrace:
+    def test_record_and_iterate(self) -> None:
+        trace = RuleApplicationTrace()
+        steps = [
+            RuleApplicationTraceStep(None, None, False, None, CONTINUE),
+            RuleApplicationTraceStep(0, 1, True, 2, STOP_ALL_FILES),
+        ]
+        for step in steps:
+            trace.record(*step)
+        assert list(trace.iterate_steps()) == steps
+        assert len(trace) == 2
+
+    def test_ring_buffer_keeps_last_steps(self) -> None:
+        trace = RuleApplicationTrace(max_steps=3)
+        for rule_index in range(5):
+            trace.record(0, rule_index, False, None, CONTINUE)
+        assert [step.rule_index for step in trace.iterate_steps()] == [2, 3, 4]
+        assert (len(trace), trace.recorded_step_count) == (3, 5)
+
+    def test_clear(self) -> None:
+        trace = RuleApplicationTrace(max_steps=3)
+        trace.record(0, 0, False, None, CONTINUE)
+        trace.clear()
+        assert list(trace.iterate_steps()) == []
+        assert trace.recorded_step_count == 0
+
+
+class TestApplyRuleFilesToEmailWithTrace:
+    @pytest.mark.parametrize("rule_info_for_files", RULE_INFO_FOR_FILES)
+    def test_full_trace_matches_state_history(
+        self,
+        rule_info_for_files: list[list[RuleInfo]],
+        generic_email: Email,
+        do_nothing_actions: list[RuleActionDoNothingAndTrackCalls],
+    ) -> None:
+        rule_files = create_rule_file(rule_info_for_files, do_nothing_actions)
+        file_states = list(apply_rule_files_to_email_iteratively(generic_email, rule_files))
+        expected_steps = [
+            RuleApplicationTraceStep(
+                state.rule_file_index,
+                state.rule_index,
+                state.current_rule_applied,
+                state.action_index,
+                state.rule_application_interrupt_state,
+            )
+            for file_state in file_states
+            for state in file_state.rule_application_state_history
+        ]
+
+        trace = RuleApplicationTrace(TraceVerbosity.FULL)
+        result = apply_rule_files_to_email_with_trace(generic_email, rule_files, trace)
+        assert list(trace.iterate_steps()) == expected_steps
+        assert result == apply_rule_files_to_email_final_state(generic_email, rule_files)
+        assert display_rule_file_application_states(trace, rule_files) == display_rule_file_application_states(
+            file_states, rule_files
+        )
+
+    @pytest.mark.parametrize("rule_info_for_files", RULE_INFO_FOR_FILES)
+    def test_rules_matched_trace(
+        self,
+        rule_info_for_files: list[list[RuleInfo]],
+        generic_email: Email,
+        do_nothing_actions: list[RuleActionDoNothingAndTrackCalls],
+    ) -> None:
+        rule_files = create_rule_file(rule_info_for_files, do_nothing_actions)
+        file_states = list(apply_rule_files_to_email_iteratively(generic_email, rule_files))
+        expected_steps = [
+            RuleApplicationTraceStep(
+                state.rule_file_index, state.rule_index, True, None, state.rule_application_interrupt_state
+            )
+            for file_state in file_states
+            for state in file_state.rule_application_state_history
+            if state.current_rule_applied and state.action_index is None
+        ]
+
+        trace = RuleApplicationTrace(TraceVerbosity.RULES_MATCHED)
+        result = apply_rule_files_to_email_with_trace(generic_email, rule_files, trace)
+        assert list(trace.iterate_steps()) == expected_steps
+        assert result == apply_rule_files_to_email_final_state(generic_email, rule_files)
+
+    def test_no_trace(self, generic_email: Email, do_nothing_actions: list[RuleActionDoNothingAndTrackCalls]) -> None:
+        rule_files = create_rule_file([[([0], ALWAYS_TRUE)]], do_nothing_actions)
+        trace = RuleApplicationTrace(TraceVerbosity.NONE)
+        apply_rule_files_to_email_with_trace(generic_email, rule_files, trace)
+        assert len(trace) == 0
+        assert RuleActionDoNothingAndTrackCalls.calls == [0]
+
+    def test_display_dropped_steps(
+        self, generic_email: Email, do_nothing_actions: list[RuleActionDoNothingAndTrackCalls]
+    ) -> None:
+        rule_files = create_rule_file([[([0], ALWAYS_FALSE), ([1], ALWAYS_FALSE)]], do_nothing_actions)
+        trace = RuleApplicationTrace(TraceVerbosity.FULL, max_steps=1)
+        apply_rule_files_to_email_with_trace(generic_email, rule_files, trace)
+        assert trace.display(rule_files).splitlines() == [
+            "2 earlier steps dropped",
+            "file_0",
+            "\tcurrent_rule=<rule_1 filter_expr=FALSE, actions=[DO_NOTHING_1]> current_rule_applied=False "
+            "current_action=None interrupt_state=RuleApplicationInterruptState.CONTINUE",
+        ]
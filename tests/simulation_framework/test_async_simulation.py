@@ -0,0 +1,115 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator
+
+import pytest
+
+from email_rules.core import Email, EmailState
+from email_rules.simulation_framework import (
+    apply_rule_files_to_email_iteratively,
+    apply_rule_files_to_email_iteratively_async,
+    get_final_email_states_async,
+    merge_email_sources,
+)
+from tests.simulation_framework.test_batch_simulation import INBOX, create_email
+
+
+async def iterate_emails(emails: list[Email], emails_read: list[Email] | None = None) -> AsyncIterator[Email]:
+    for email in emails:
+        if emails_read is not None:
+            emails_read.append(email)
+        yield email
+        await asyncio.sleep(0)
+
+
+async def iterate_emails_then_raise(emails: list[Email]) -> AsyncIterator[Email]:
+    async for email in iterate_emails(emails):
+        yield email
+    raise ValueError("Source failed")
+
+
+class TestApplyRuleFilesToEmailIterativelyAsync:
+    def test_matches_iterative_application(self, generic_email: Email) -> None:
+        async def collect() -> list[object]:
+            return [
+                file_state
+                async for file_state in apply_rule_files_to_email_iteratively_async(generic_email, INBOX.rule_files)
+            ]
+
+        assert asyncio.run(collect()) == list(apply_rule_files_to_email_iteratively(generic_email, INBOX.rule_files))
+
+
+class TestMergeEmailSources:
+    def test_yields_every_email(self) -> None:
+        emails = [create_email(index) for index in range(10)]
+
+        async def collect() -> list[Email]:
+            return [
+                email async for email in merge_email_sources(iterate_emails(emails[:3]), iterate_emails(emails[3:]))
+            ]
+
+        merged_emails = asyncio.run(collect())
+        assert sorted(merged_emails, key=emails.index) == emails
+        # The emails of each source keep their order
+        assert [email for email in merged_emails if email in emails[:3]] == emails[:3]
+
+    def test_source_exception_is_raised(self) -> None:
+        async def collect() -> list[Email]:
+            return [email async for email in merge_email_sources(iterate_emails_then_raise([create_email(0)]))]
+
+        with pytest.raises(ValueError, match="Source failed"):
+            asyncio.run(collect())
+
+
+class TestGetFinalEmailStatesAsync:
+    @pytest.mark.parametrize(
+        "max_batch_size, executor_batch_size",
+        [
+            pytest.param(1, 100, id="on_event_loop"),
+            pytest.param(4, 2, id="in_executor"),
+        ],
+    )
+    def test_matches_single_email_simulation(self, max_batch_size: int, executor_batch_size: int) -> None:
+        emails = [create_email(index) for index in range(25)]
+
+        async def collect() -> list[EmailState]:
+            with ThreadPoolExecutor(1) as executor:
+                return [
+                    email_state
+                    async for email_state in get_final_email_states_async(
+                        INBOX,
+                        iterate_emails(emails),
+                        max_batch_size=max_batch_size,
+                        executor_batch_size=executor_batch_size,
+                        executor=executor,
+                    )
+                ]
+
+        assert asyncio.run(collect()) == [INBOX.get_final_email_state_after_filtering(email) for email in emails]
+
+    def test_source_is_limited_by_queue_size(self) -> None:
+        emails = [create_email(index) for index in range(100)]
+        emails_read: list[Email] = []
+
+        async def read_first_state() -> None:
+            email_states = get_final_email_states_async(INBOX, iterate_emails(emails, emails_read), max_queue_size=2)
+            await email_states.__anext__()
+            for _ in range(10):
+                await asyncio.sleep(0)
+            # The queue, the email waiting to be queued and the batch being matched
+            assert len(emails_read) <= 2 + 1 + 2
+            await email_states.aclose()
+
+        asyncio.run(read_first_state())
+
+    def test_source_exception_is_raised(self) -> None:
+        async def collect() -> list[EmailState]:
+            return [
+                email_state
+                async for email_state in get_final_email_states_async(
+                    INBOX, iterate_emails_then_raise([create_email(0)])
+                )
+            ]
+
+        with pytest.raises(ValueError, match="Source failed"):
+            asyncio.run(collect())
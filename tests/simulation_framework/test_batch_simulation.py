@@ -0,0 +1,138 @@
+from pathlib import PurePosixPath
+from typing import Iterator
+
+import pytest
+
+from email_rules.core import (
+    Email,
+    EmailAddress,
+    EmailBatch,
+    EmailFolder,
+    EmailFrom,
+    EmailSubject,
+    EmailTag,
+    EmailTo,
+)
+from email_rules.rules import (
+    Rule,
+    RuleActionAddTag,
+    RuleActionMarkAsRead,
+    RuleActionMoveToFolder,
+    RuleActionStopProcessingAllFiles,
+    RuleActionStopProcessingCurrentFile,
+    RuleFromEq,
+    RuleSubjectContains,
+)
+from email_rules.simulation_framework import (
+    EmailAccountSettings,
+    RuleFile,
+    get_final_email_states,
+    get_final_email_states_from_batch,
+    iterate_email_chunks,
+)
+
+FOLDER = EmailFolder(PurePosixPath("folder"))
+TAG = EmailTag("TAG")
+INBOX = EmailAccountSettings(
+    folders=[FOLDER],
+    tags=[TAG],
+    rule_files=[
+        RuleFile(
+            file_name="file_1",
+            rules=[
+                Rule(
+                    filter_expr=RuleFromEq.create("from_1@example.com"),
+                    actions=[RuleActionAddTag(tag_to_apply=TAG), RuleActionStopProcessingCurrentFile()],
+                ),
+                Rule(filter_expr=RuleSubjectContains.create("1"), actions=[RuleActionMoveToFolder(folder=FOLDER)]),
+            ],
+        ),
+        RuleFile(
+            file_name="file_2",
+            rules=[Rule(filter_expr=RuleSubjectContains.create("2"), actions=[RuleActionAddTag(tag_to_apply=TAG)])],
+        ),
+    ],
+)
+
+
+def create_email(index: int) -> Email:
+    return Email(
+        email_from=EmailFrom(EmailAddress(f"from_{index % 3}@example.com")),
+        email_to=[EmailTo(EmailAddress("to@example.com"))],
+        email_subject=EmailSubject(f"Subject {index}"),
+    )
+
+
+class TestIterateEmailChunks:
+    @pytest.mark.parametrize(
+        "email_count, chunk_size, expected_chunk_sizes",
+        [
+            pytest.param(0, 2, [], id="no_emails"),
+            pytest.param(4, 2, [2, 2], id="full_chunks"),
+            pytest.param(5, 2, [2, 2, 1], id="partial_last_chunk"),
+        ],
+    )
+    def test_chunk_sizes(self, email_count: int, chunk_size: int, expected_chunk_sizes: list[int]) -> None:
+        emails = [create_email(index) for index in range(email_count)]
+        chunks = list(iterate_email_chunks(iter(emails), chunk_size))
+        assert [len(chunk) for chunk in chunks] == expected_chunk_sizes
+        assert [email for chunk in chunks for email in chunk] == emails
+
+
+class TestGetFinalEmailStates:
+    def test_matches_single_email_simulation(self) -> None:
+        emails = [create_email(index) for index in range(25)]
+        expected_email_states = [INBOX.get_final_email_state_after_filtering(email) for email in emails]
+        email_states = list(get_final_email_states(INBOX, emails, max_workers=2, chunk_size=3, max_chunks_in_flight=2))
+        assert email_states == expected_email_states
+
+    def test_no_emails(self) -> None:
+        assert list(get_final_email_states(INBOX, [], max_workers=1)) == []
+
+    def test_emails_are_read_lazily(self) -> None:
+        emails_read: list[int] = []
+
+        def iterate_emails() -> Iterator[Email]:
+            for index in range(100):
+                emails_read.append(index)
+                yield create_email(index)
+
+        email_states = get_final_email_states(
+            INBOX, iterate_emails(), max_workers=1, chunk_size=2, max_chunks_in_flight=2
+        )
+        next(email_states)
+        # The first result is ready once the third chunk is about to be submitted
+        assert len(emails_read) <= 3 * 2 + 1
+        email_states.close()
+
+
+class TestGetFinalEmailStatesFromBatch:
+    def test_matches_single_email_simulation(self) -> None:
+        emails = [create_email(index) for index in range(25)]
+        expected_email_states = [INBOX.get_final_email_state_after_filtering(email) for email in emails]
+        assert get_final_email_states_from_batch(INBOX, EmailBatch(emails=emails)) == expected_email_states
+
+    def test_stop_processing_all_files(self) -> None:
+        inbox = INBOX.model_copy(
+            update={
+                "rule_files": [
+                    RuleFile(
+                        file_name="file_1",
+                        rules=[
+                            Rule(
+                                filter_expr=RuleFromEq.create("from_0@example.com"),
+                                actions=[RuleActionStopProcessingAllFiles(), RuleActionAddTag(tag_to_apply=TAG)],
+                            ),
+                            Rule(filter_expr=RuleSubjectContains.create("1"), actions=[RuleActionMarkAsRead()]),
+                        ],
+                    ),
+                    *INBOX.rule_files,
+                ]
+            }
+        )
+        emails = [create_email(index) for index in range(25)]
+        expected_email_states = [inbox.get_final_email_state_after_filtering(email) for email in emails]
+        assert get_final_email_states_from_batch(inbox, EmailBatch(emails=emails)) == expected_email_states
+
+    def test_no_emails(self) -> None:
+        assert get_final_email_states_from_batch(INBOX, EmailBatch(emails=[])) == []
@@ -0,0 +1,123 @@
+from email_rules.core import (
+    Email,
+    EmailAddress,
+    EmailFrom,
+    EmailSubject,
+    EmailTag,
+    EmailTo,
+)
+from email_rules.rules import Rule, RuleActionAddTag
+from email_rules.simulation_framework import (
+    EmailAccountSettings,
+    EmailStateCache,
+    RuleFile,
+    get_email_state_cache_key,
+)
+from tests.rules.common import RuleAlwaysTrueAndTrackCalls
+
+TAG = EmailTag("TAG")
+
+
+def create_email(email_from: str, email_subject: str = "Subject") -> Email:
+    return Email(
+        email_from=EmailFrom(EmailAddress(email_from)),
+        email_to=[EmailTo(EmailAddress("to@example.com"))],
+        email_subject=EmailSubject(email_subject),
+    )
+
+
+def create_inbox(email_state_cache_size: int) -> EmailAccountSettings:
+    return EmailAccountSettings(
+        folders=[],
+        tags=[TAG],
+        rule_files=[
+            RuleFile(
+                file_name="file",
+                rules=[
+                    Rule(
+                        filter_expr=RuleAlwaysTrueAndTrackCalls(instance=0),
+                        actions=[RuleActionAddTag(tag_to_apply=TAG)],
+                    )
+                ],
+            )
+        ],
+        email_state_cache_size=email_state_cache_size,
+    )
+
+
+class TestEmailStateCache:
+    def test_key_is_not_normalized(self) -> None:
+        assert get_email_state_cache_key(create_email("from@example.com")) != get_email_state_cache_key(
+            create_email("FROM@example.com")
+        )
+
+    def test_get_and_put(self) -> None:
+        cache: EmailStateCache[int] = EmailStateCache(2)
+        assert cache.get(create_email("from@example.com")) is None
+        cache.put(create_email("from@example.com"), 1)
+        # Equal fields are enough, it does not have to be the same email
+        assert cache.get(create_email("from@example.com")) == 1
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_least_recently_used_is_evicted(self) -> None:
+        cache: EmailStateCache[int] = EmailStateCache(2)
+        cache.put(create_email("a@example.com"), 1)
+        cache.put(create_email("b@example.com"), 2)
+        cache.get(create_email("a@example.com"))
+        cache.put(create_email("c@example.com"), 3)
+        assert len(cache) == 2
+        assert cache.get(create_email("a@example.com")) == 1
+        assert cache.get(create_email("b@example.com")) is None
+        assert cache.get(create_email("c@example.com")) == 3
+
+    def test_clear(self) -> None:
+        cache: EmailStateCache[int] = EmailStateCache(2)
+        cache.put(create_email("a@example.com"), 1)
+        cache.clear()
+        assert len(cache) == 0
+        assert cache.get(create_email("a@example.com")) is None
+
+
+class TestEmailAccountSettingsEmailStateCache:
+    def test_disabled_by_default(self) -> None:
+        inbox = create_inbox(0)
+        assert inbox.final_email_state_cache is None
+        assert inbox.email_state_history_cache is None
+
+    def test_repeated_emails_are_filtered_once(self) -> None:
+        inbox = create_inbox(10)
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+        email_states = [inbox.get_final_email_state_after_filtering(create_email("from@example.com")) for _ in range(3)]
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0]
+        assert all(email_state.tags == {TAG} for email_state in email_states)
+
+        histories = [inbox.get_email_state_after_filtering(create_email("from@example.com"))[1] for _ in range(2)]
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0, 0]
+        assert histories[0] == histories[1]
+        assert histories[0] is not histories[1]
+
+    def test_cache_is_cleared_when_rules_change(self) -> None:
+        inbox = create_inbox(10)
+        inbox.get_final_email_state_after_filtering(create_email("from@example.com"))
+        inbox.rule_files = []
+        assert inbox.get_final_email_state_after_filtering(create_email("from@example.com")).tags == frozenset()
+
+    def test_cache_is_cleared_when_rules_are_modified_in_place(self) -> None:
+        inbox = create_inbox(10)
+        assert inbox.get_final_email_state_after_filtering(create_email("from@example.com")).tags == {TAG}
+        assert inbox.get_email_state_after_filtering(create_email("from@example.com"))[0].tags == {TAG}
+
+        inbox.rule_files[0].rules[0].actions.clear()
+        assert inbox.get_final_email_state_after_filtering(create_email("from@example.com")).tags == frozenset()
+        assert inbox.get_email_state_after_filtering(create_email("from@example.com"))[0].tags == frozenset()
+
+    def test_cache_is_kept_when_other_rules_are_modified_in_place(self) -> None:
+        inbox = create_inbox(10)
+        other_inbox = create_inbox(10)
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+        inbox.get_final_email_state_after_filtering(create_email("from@example.com"))
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0]
+
+        other_inbox.rule_files[0].rules[0].actions.clear()
+        assert inbox.get_final_email_state_after_filtering(create_email("from@example.com")).tags == {TAG}
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0]
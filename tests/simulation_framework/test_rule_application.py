@@ -2,21 +2,28 @@ from typing import Sequence
 
 import pytest
 
-from email_rules.core import Email, EmailState
+from email_rules.core import Email, EmailState, EmailTag
 from email_rules.rules import (
+    CompiledRuleSet,
     Rule,
     RuleAction,
+    RuleActionAddTag,
     RuleActionStopProcessingAllFiles,
     RuleActionStopProcessingCurrentFile,
+    RuleActionStopProcessingCurrentFileException,
     RuleFilter,
+    RuleFromEq,
+    RuleToEq,
 )
 from email_rules.simulation_framework import (
     RuleApplicationInterruptState,
     RuleApplicationState,
     RuleFile,
     RuleFileApplicationState,
+    apply_rule_files_to_email_final_state,
     apply_rule_files_to_email_iteratively,
     apply_rules_to_email,
+    apply_rules_to_email_final_state,
     apply_rules_to_email_iteratively,
     display_rule_file_application_states,
 )
@@ -166,9 +173,69 @@ class TestApply:
     ) -> None:
         rule_info = [(action_order, ALWAYS_TRUE) for action_order in action_orders]
         rules = create_rules(rule_info, do_nothing_actions)
-        apply_rules_to_email(generic_email, rules)
+        last_state = apply_rules_to_email(generic_email, rules)
         assert RuleActionDoNothingAndTrackCalls.calls == applied
 
+        RuleActionDoNothingAndTrackCalls.clear_calls()
+        email_state, rule_application_interrupt_state = apply_rules_to_email_final_state(generic_email, rules)
+        assert RuleActionDoNothingAndTrackCalls.calls == applied
+        assert email_state == last_state.email_state
+        assert rule_application_interrupt_state == last_state.rule_application_interrupt_state
+
+    @pytest.mark.parametrize(
+        "rule_info_for_files, applied",
+        [
+            pytest.param(
+                [
+                    [
+                        ([0], RuleFromEq.create("from@example.com")),
+                        ([-2], RuleFromEq.create("FROM@example.com", case_sensitive=False)),
+                        ([1], RuleFromEq.create("from@example.com")),
+                    ],
+                    [
+                        ([1], RuleFromEq.create("other@example.com")),
+                        ([2], RuleToEq.create("to_2@example.com")),
+                    ],
+                ],
+                [0, 2],
+                id="stop_current_file",
+            ),
+            pytest.param(
+                [
+                    [
+                        ([0], RuleToEq.create("to_1@example.com")),
+                        ([1], ALWAYS_TRUE),
+                        ([-1], RuleToEq.create("to_2@example.com")),
+                    ],
+                    [
+                        ([2], RuleFromEq.create("from@example.com")),
+                    ],
+                ],
+                [0, 1],
+                id="stop_all_files",
+            ),
+        ],
+    )
+    def test_indexed_rules_keep_rule_order(
+        self,
+        rule_info_for_files: list[list[RuleInfo]],
+        applied: list[int],
+        generic_email: Email,
+        do_nothing_actions: list[RuleActionDoNothingAndTrackCalls],
+    ) -> None:
+        rule_files = create_rule_file(rule_info_for_files, do_nothing_actions)
+        file_states = list(apply_rule_files_to_email_iteratively(generic_email, rule_files))
+        assert RuleActionDoNothingAndTrackCalls.calls == applied
+
+        RuleActionDoNothingAndTrackCalls.clear_calls()
+        email_state, rule_application_interrupt_state = apply_rule_files_to_email_final_state(generic_email, rule_files)
+        assert RuleActionDoNothingAndTrackCalls.calls == applied
+        assert email_state == file_states[-1].last_rule_application_state.email_state
+        assert (
+            rule_application_interrupt_state
+            == file_states[-1].last_rule_application_state.rule_application_interrupt_state
+        )
+
     @pytest.mark.parametrize(
         "rule_info, expected_states",
         [
@@ -182,9 +249,9 @@ class TestApply:
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_0 filter_expr=TRUE, actions=[]>",
+                        rule_index=0,
                         current_rule_applied=True,
-                        current_action=None,
+                        action_index=None,
                     ),
                 ],
                 id="one_rule_no_actions",
@@ -198,16 +265,16 @@ class TestApply:
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_1]>",
+                        rule_index=0,
                         current_rule_applied=True,
-                        current_action="DO_NOTHING_1",
+                        action_index=0,
                     ),
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_1]>",
+                        rule_index=0,
                         current_rule_applied=True,
-                        current_action=None,
+                        action_index=None,
                     ),
                 ],
                 id="one_rule_one_action",
@@ -222,37 +289,37 @@ class TestApply:
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, DO_NOTHING_1, DO_NOTHING_2]>",
+                        rule_index=0,
                         current_rule_applied=True,
-                        current_action="DO_NOTHING_0",
+                        action_index=0,
                     ),
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, DO_NOTHING_1, DO_NOTHING_2]>",
+                        rule_index=0,
                         current_rule_applied=True,
-                        current_action="DO_NOTHING_1",
+                        action_index=1,
                     ),
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, DO_NOTHING_1, DO_NOTHING_2]>",
+                        rule_index=0,
                         current_rule_applied=True,
-                        current_action="DO_NOTHING_2",
+                        action_index=2,
                     ),
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, DO_NOTHING_1, DO_NOTHING_2]>",
+                        rule_index=0,
                         current_rule_applied=True,
-                        current_action=None,
+                        action_index=None,
                     ),
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_1 filter_expr=FALSE, actions=[DO_NOTHING_2, DO_NOTHING_1, DO_NOTHING_0]>",
+                        rule_index=1,
                         current_rule_applied=False,
-                        current_action=None,
+                        action_index=None,
                     ),
                 ],
                 id="two_rules_multiple_actions_skip_second",
@@ -268,37 +335,37 @@ class TestApply:
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0]>",
+                        rule_index=0,
                         current_rule_applied=True,
-                        current_action="DO_NOTHING_0",
+                        action_index=0,
                     ),
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0]>",
+                        rule_index=0,
                         current_rule_applied=True,
-                        current_action=None,
+                        action_index=None,
                     ),
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                        current_rule="<rule_1 filter_expr=TRUE, actions=[DO_NOTHING_1, STOP_ALL_FILES, DO_NOTHING_1]>",
+                        rule_index=1,
                         current_rule_applied=True,
-                        current_action="DO_NOTHING_1",
+                        action_index=0,
                     ),
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES,
-                        current_rule="<rule_1 filter_expr=TRUE, actions=[DO_NOTHING_1, STOP_ALL_FILES, DO_NOTHING_1]>",
+                        rule_index=1,
                         current_rule_applied=True,
-                        current_action="STOP_ALL_FILES",
+                        action_index=1,
                     ),
                     RuleApplicationState(
                         email_state=EmailState.create_initial_state(),
                         rule_application_interrupt_state=RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES,
-                        current_rule="<rule_1 filter_expr=TRUE, actions=[DO_NOTHING_1, STOP_ALL_FILES, DO_NOTHING_1]>",
+                        rule_index=1,
                         current_rule_applied=True,
-                        current_action=None,
+                        action_index=None,
                     ),
                 ],
                 id="three_rules_end_after_second",
@@ -332,9 +399,10 @@ class TestApply:
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[]>",
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action=None,
+                                action_index=None,
                             ),
                         ],
                     ),
@@ -353,16 +421,18 @@ class TestApply:
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_1]>",
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action="DO_NOTHING_1",
+                                action_index=0,
                             ),
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_1]>",
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action=None,
+                                action_index=None,
                             ),
                         ],
                     ),
@@ -382,30 +452,34 @@ class TestApply:
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, DO_NOTHING_1, DO_NOTHING_2]>",  # noqa: E501
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action="DO_NOTHING_0",
+                                action_index=0,
                             ),
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, DO_NOTHING_1, DO_NOTHING_2]>",  # noqa: E501
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action="DO_NOTHING_1",
+                                action_index=1,
                             ),
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, DO_NOTHING_1, DO_NOTHING_2]>",  # noqa: E501
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action="DO_NOTHING_2",
+                                action_index=2,
                             ),
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, DO_NOTHING_1, DO_NOTHING_2]>",  # noqa: E501
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action=None,
+                                action_index=None,
                             ),
                         ],
                     ),
@@ -415,9 +489,10 @@ class TestApply:
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=FALSE, actions=[DO_NOTHING_2, DO_NOTHING_1, DO_NOTHING_0]>",  # noqa: E501
+                                rule_file_index=1,
+                                rule_index=0,
                                 current_rule_applied=False,
-                                current_action=None,
+                                action_index=None,
                             ),
                         ],
                     ),
@@ -438,16 +513,18 @@ class TestApply:
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES,  # noqa: E501
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[STOP_ALL_FILES, DO_NOTHING_0]>",
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action="STOP_ALL_FILES",
+                                action_index=0,
                             ),
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.STOP_PROCESSING_ALL_FILES,  # noqa: E501
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[STOP_ALL_FILES, DO_NOTHING_0]>",
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action=None,
+                                action_index=None,
                             ),
                         ],
                     ),
@@ -468,16 +545,18 @@ class TestApply:
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE,  # noqa: E501
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[STOP_CURRENT_FILE, DO_NOTHING_0]>",
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action="STOP_CURRENT_FILE",
+                                action_index=0,
                             ),
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE,  # noqa: E501
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[STOP_CURRENT_FILE, DO_NOTHING_0]>",
+                                rule_file_index=0,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action=None,
+                                action_index=None,
                             ),
                         ],
                     ),
@@ -487,16 +566,18 @@ class TestApply:
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_1]>",
+                                rule_file_index=1,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action="DO_NOTHING_1",
+                                action_index=0,
                             ),
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_1]>",
+                                rule_file_index=1,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action=None,
+                                action_index=None,
                             ),
                         ],
                     ),
@@ -506,16 +587,18 @@ class TestApply:
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_2]>",
+                                rule_file_index=2,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action="DO_NOTHING_2",
+                                action_index=0,
                             ),
                             RuleApplicationState(
                                 email_state=EmailState.create_initial_state(),
                                 rule_application_interrupt_state=RuleApplicationInterruptState.CONTINUE,
-                                current_rule="<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_2]>",
+                                rule_file_index=2,
+                                rule_index=0,
                                 current_rule_applied=True,
-                                current_action=None,
+                                action_index=None,
                             ),
                         ],
                     ),
@@ -534,4 +617,91 @@ class TestApply:
         rule_files = create_rule_file(rule_info_for_files, do_nothing_actions)
         all_states = list(apply_rule_files_to_email_iteratively(generic_email, rule_files))
 
-        assert display_rule_file_application_states(expected_states) == display_rule_file_application_states(all_states)
+        assert display_rule_file_application_states(
+            expected_states, rule_files
+        ) == display_rule_file_application_states(all_states, rule_files)
+
+    def test_display_formats_rules_and_actions(
+        self, generic_email: Email, do_nothing_actions: list[RuleActionDoNothingAndTrackCalls]
+    ) -> None:
+        rule_files = create_rule_file([[([1], ALWAYS_FALSE)], [([0, -2], ALWAYS_TRUE)]], do_nothing_actions)
+        all_states = list(apply_rule_files_to_email_iteratively(generic_email, rule_files))
+
+        assert display_rule_file_application_states(all_states, rule_files).splitlines() == [
+            "None",
+            "\tcurrent_rule=None current_rule_applied=False current_action=None "
+            "interrupt_state=RuleApplicationInterruptState.CONTINUE",
+            "file_0",
+            "\tcurrent_rule=<rule_0 filter_expr=FALSE, actions=[DO_NOTHING_1]> current_rule_applied=False "
+            "current_action=None interrupt_state=RuleApplicationInterruptState.CONTINUE",
+            "file_1",
+            "\tcurrent_rule=<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, STOP_CURRENT_FILE]> "
+            "current_rule_applied=True current_action=DO_NOTHING_0 "
+            "interrupt_state=RuleApplicationInterruptState.CONTINUE",
+            "\tcurrent_rule=<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, STOP_CURRENT_FILE]> "
+            "current_rule_applied=True current_action=STOP_CURRENT_FILE "
+            "interrupt_state=RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE",
+            "\tcurrent_rule=<rule_0 filter_expr=TRUE, actions=[DO_NOTHING_0, STOP_CURRENT_FILE]> "
+            "current_rule_applied=True current_action=None "
+            "interrupt_state=RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE",
+        ]
+
+    def test_display_states_without_rule_file(self, generic_email: Email) -> None:
+        rules = [Rule(filter_expr=ALWAYS_FALSE, actions=[]), Rule(filter_expr=ALWAYS_TRUE, actions=[])]
+        file_states = [
+            RuleFileApplicationState(
+                current_file_name=None,
+                rule_application_state_history=list(apply_rules_to_email_iteratively(generic_email, rules)),
+            )
+        ]
+        assert display_rule_file_application_states(file_states, [], rules).splitlines()[2:] == [
+            f"\tcurrent_rule={rule!r} current_rule_applied={applied} current_action=None "
+            "interrupt_state=RuleApplicationInterruptState.CONTINUE"
+            for rule, applied in zip(rules, [False, True])
+        ]
+        with pytest.raises(ValueError):
+            display_rule_file_application_states(file_states, [])
+
+    def test_history_keeps_each_state(self, generic_email: Email) -> None:
+        rules = [
+            Rule(
+                filter_expr=ALWAYS_TRUE,
+                actions=[
+                    RuleActionAddTag(tag_to_apply=EmailTag("tag_1")),
+                    RuleActionAddTag(tag_to_apply=EmailTag("tag_2")),
+                ],
+            )
+        ]
+        all_states = list(apply_rules_to_email_iteratively(generic_email, rules))
+        assert [state.email_state.tags for state in all_states] == [
+            set(),
+            {EmailTag("tag_1")},
+            {EmailTag("tag_1"), EmailTag("tag_2")},
+            {EmailTag("tag_1"), EmailTag("tag_2")},
+        ]
+
+    def test_custom_action_can_raise_to_stop(
+        self, generic_email: Email, do_nothing_actions: list[RuleActionDoNothingAndTrackCalls]
+    ) -> None:
+        class RuleActionRaiseStopProcessingCurrentFile(RuleAction):
+            def apply(self, email_state: EmailState) -> EmailState:
+                raise RuleActionStopProcessingCurrentFileException()
+
+        rules = [
+            Rule(filter_expr=ALWAYS_TRUE, actions=[do_nothing_actions[0], RuleActionRaiseStopProcessingCurrentFile()]),
+            Rule(filter_expr=ALWAYS_TRUE, actions=[do_nothing_actions[1]]),
+        ]
+        last_state = apply_rules_to_email(generic_email, rules)
+        assert last_state.rule_application_interrupt_state == RuleApplicationInterruptState.STOP_PROCESSING_CURRENT_FILE
+        assert RuleActionDoNothingAndTrackCalls.calls == [0]
+
+    def test_stale_compiled_rules_are_not_used(self, generic_email: Email) -> None:
+        tag = EmailTag("tag")
+        rules = [Rule(filter_expr=ALWAYS_FALSE, actions=[])]
+        compiled_rules = CompiledRuleSet(rules)
+        rules.append(Rule(filter_expr=ALWAYS_TRUE, actions=[RuleActionAddTag(tag_to_apply=tag)]))
+
+        email_state, _ = apply_rules_to_email_final_state(generic_email, rules, compiled_rules=compiled_rules)
+        assert tag in email_state.tags
+        last_state = list(apply_rules_to_email_iteratively(generic_email, rules, compiled_rules=compiled_rules))[-1]
+        assert tag in last_state.email_state.tags
@@ -0,0 +1,156 @@
+import pytest
+
+from email_rules.core import Email, EmailState, EmailTag
+from email_rules.rules import (
+    Rule,
+    RuleAction,
+    RuleActionAddTag,
+    RuleActionMarkAsRead,
+    RuleActionStopProcessingAllFiles,
+    RuleActionStopProcessingCurrentFile,
+    RuleActionStopProcessingCurrentFileException,
+    RuleFilter,
+    RuleFromEq,
+)
+from email_rules.simulation_framework import (
+    RuleApplicationInterruptState,
+    RuleFile,
+    RuleFileIndex,
+    RuleOpcode,
+    RuleProgram,
+    apply_rule_files_to_email_final_state,
+)
+from tests.rules.common import ALWAYS_FALSE, ALWAYS_TRUE, RuleAlwaysTrueAndTrackCalls
+
+
+class RuleActionRaiseStopProcessingCurrentFile(RuleAction):
+    def apply(self, email_state: EmailState) -> EmailState:
+        raise RuleActionStopProcessingCurrentFileException()
+
+
+def add_tag(tag: str) -> RuleActionAddTag:
+    return RuleActionAddTag(tag_to_apply=EmailTag(tag))
+
+
+def create_rule_files(rules_for_files: list[list[tuple[RuleFilter, list[RuleAction]]]]) -> list[RuleFile]:
+    return [
+        RuleFile(
+            file_name=f"file_{file_index}",
+            rules=[Rule(filter_expr=filter_expr, actions=actions) for filter_expr, actions in rules],
+        )
+        for file_index, rules in enumerate(rules_for_files)
+    ]
+
+
+class TestRuleProgram:
+    def test_compile(self) -> None:
+        rule_files = create_rule_files(
+            [
+                [
+                    (ALWAYS_TRUE, [add_tag("a"), RuleActionStopProcessingCurrentFile()]),
+                    (ALWAYS_FALSE, [RuleActionStopProcessingAllFiles()]),
+                ],
+                [],
+                [(ALWAYS_TRUE, [])],
+            ]
+        )
+        instructions = RuleProgram.compile(rule_files).instructions
+        assert [(instruction.opcode, instruction.target) for instruction in instructions] == [
+            (RuleOpcode.INDEX, 6),
+            (RuleOpcode.TEST, 0),
+            (RuleOpcode.APPLY, 6),
+            (RuleOpcode.JUMP_TO_END_OF_FILE, 6),
+            (RuleOpcode.TEST, 0),
+            (RuleOpcode.HALT, 0),
+            (RuleOpcode.INDEX, 7),
+            (RuleOpcode.INDEX, 9),
+            (RuleOpcode.TEST, 0),
+            (RuleOpcode.HALT, 0),
+        ]
+        assert isinstance(instructions[0].operand, RuleFileIndex)
+        assert instructions[0].operand.test_positions == (1, 4)
+        assert [instructions[position].operand for position in (1, 4, 8)] == [0, 1, 0]
+
+    @pytest.mark.parametrize(
+        "rules_for_files",
+        [
+            pytest.param([], id="no_files"),
+            pytest.param([[], []], id="empty_files"),
+            pytest.param(
+                [[(ALWAYS_TRUE, [add_tag("a")]), (ALWAYS_FALSE, [add_tag("b")]), (ALWAYS_TRUE, [add_tag("c")])]],
+                id="one_file",
+            ),
+            pytest.param(
+                [
+                    [(ALWAYS_TRUE, [add_tag("a"), RuleActionStopProcessingCurrentFile(), add_tag("b")])],
+                    [(ALWAYS_TRUE, [add_tag("c")]), (RuleFromEq.create("from@example.com"), [RuleActionMarkAsRead()])],
+                ],
+                id="stop_current_file",
+            ),
+            pytest.param(
+                [
+                    [(ALWAYS_TRUE, [add_tag("a")])],
+                    [(ALWAYS_TRUE, [RuleActionStopProcessingCurrentFile()])],
+                ],
+                id="stop_current_file_in_last_file",
+            ),
+            pytest.param(
+                [[(ALWAYS_TRUE, [RuleActionStopProcessingCurrentFile()])], []],
+                id="empty_file_after_stop_current_file",
+            ),
+            pytest.param(
+                [
+                    [(ALWAYS_FALSE, [add_tag("a")]), (ALWAYS_TRUE, [add_tag("b"), RuleActionStopProcessingAllFiles()])],
+                    [(ALWAYS_TRUE, [add_tag("c")])],
+                ],
+                id="stop_all_files",
+            ),
+            pytest.param(
+                [
+                    [(ALWAYS_TRUE, [RuleActionRaiseStopProcessingCurrentFile(), add_tag("a")])],
+                    [(ALWAYS_TRUE, [add_tag("b")])],
+                ],
+                id="custom_action_stop",
+            ),
+            pytest.param(
+                [
+                    [
+                        (RuleFromEq.create("other@example.com"), [add_tag("a")]),
+                        (ALWAYS_TRUE, [add_tag("b")]),
+                        (RuleFromEq.create("other@example.com"), [add_tag("c")]),
+                        (RuleFromEq.create("from@example.com"), [add_tag("d")]),
+                        (RuleFromEq.create("other@example.com"), [add_tag("e")]),
+                    ]
+                ],
+                id="non_candidates_between_applied_rules",
+            ),
+        ],
+    )
+    def test_matches_rule_file_application(
+        self, rules_for_files: list[list[tuple[RuleFilter, list[RuleAction]]]], generic_email: Email
+    ) -> None:
+        rule_files = create_rule_files(rules_for_files)
+        expected = apply_rule_files_to_email_final_state(generic_email, rule_files)
+        assert RuleProgram.compile(rule_files).run(generic_email) == expected
+
+    def test_interrupt_state_is_reset_between_files(self, generic_email: Email) -> None:
+        rule_files = create_rule_files(
+            [[(ALWAYS_TRUE, [RuleActionStopProcessingCurrentFile()])], [(ALWAYS_TRUE, [add_tag("a")])]]
+        )
+        email_state, interrupt_state = RuleProgram.compile(rule_files).run(generic_email)
+        assert email_state.tags == {EmailTag("a")}
+        assert interrupt_state == RuleApplicationInterruptState.CONTINUE
+
+    def test_non_candidate_filters_are_not_called(self, generic_email: Email) -> None:
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+        rule_files = create_rule_files(
+            [
+                [
+                    (RuleAlwaysTrueAndTrackCalls(instance=0) & RuleFromEq.create("other@example.com"), [add_tag("a")]),
+                    (RuleAlwaysTrueAndTrackCalls(instance=1) & RuleFromEq.create("from@example.com"), [add_tag("b")]),
+                ]
+            ]
+        )
+        email_state, _ = RuleProgram.compile(rule_files).run(generic_email)
+        assert email_state.tags == {EmailTag("b")}
+        assert RuleAlwaysTrueAndTrackCalls.calls == [1]
@@ -5,6 +5,7 @@ from pydantic import ValidationError
 
 from email_rules.core import Email, EmailFolder, EmailTag
 from email_rules.rules import (
+    AggregatedRuleFilter,
     Rule,
     RuleActionAddTag,
     RuleActionMarkAsRead,
@@ -12,13 +13,19 @@ from email_rules.rules import (
     RuleActionStopProcessingAllFiles,
     RuleActionStopProcessingCurrentFile,
     RuleFilter,
+    RuleFilterLeafStats,
+    RuleFilterProfile,
+    get_leaf_stats_key,
 )
 from email_rules.simulation_framework import (
     EmailAccountSettings,
     EmailRuleSimulation,
     IterableClass,
+    RuleApplicationTrace,
     RuleFile,
+    TraceVerbosity,
 )
+from tests.rules.common import RuleAlwaysTrueAndTrackCalls
 
 
 # TODO: consolidate with other definition
@@ -251,3 +258,171 @@ class TestEmailAccountSettingsValidation:
                 tags=list(Tags.iterate_values()),
                 rule_files=[RuleFile(file_name="rule_file_1", rules=rules)],
             )
+
+
+class TestEmailAccountSettingsFiltering:
+    def test_repeated_filters_are_evaluated_once(self, generic_email: Email) -> None:
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+        repeated_filter = RuleAlwaysTrueAndTrackCalls(instance=0)
+        inbox_settings = EmailAccountSettings(
+            folders=list(Folders.iterate_values()),
+            tags=list(Tags.iterate_values()),
+            rule_files=[
+                RuleFile(
+                    file_name="rule_file_1", rules=[RULE_ADD_TAG_1.model_copy(update={"filter_expr": repeated_filter})]
+                ),
+                RuleFile(
+                    file_name="rule_file_2",
+                    rules=[RULE_MOVE_TO_PARENT_1.model_copy(update={"filter_expr": ALWAYS_TRUE & repeated_filter})],
+                ),
+            ],
+        )
+
+        with EmailRuleSimulation(inbox=inbox_settings, email=generic_email) as email_final_state:
+            email_final_state.assert_has_tag(Tags.TAG_1)
+            email_final_state.assert_is_moved_to(Folders.PARENT_1)
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0]
+
+    def test_rule_filter_profile_reorders_filters(self, generic_email: Email) -> None:
+        RuleAlwaysTrueAndTrackCalls.clear_calls()
+        expensive_filter = RuleAlwaysTrueAndTrackCalls(instance=0)
+        cheap_filter = RuleAlwaysTrueAndTrackCalls(instance=1)
+        inbox_settings = EmailAccountSettings(
+            folders=list(Folders.iterate_values()),
+            tags=list(Tags.iterate_values()),
+            rule_files=[
+                RuleFile(
+                    file_name="rule_file_1",
+                    rules=[RULE_ADD_TAG_1.model_copy(update={"filter_expr": expensive_filter | cheap_filter})],
+                ),
+            ],
+        )
+        inbox_settings.get_email_state_after_filtering(generic_email)
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0]
+
+        inbox_settings.rule_filter_profile = RuleFilterProfile(
+            leaf_stats={
+                get_leaf_stats_key(expensive_filter): RuleFilterLeafStats(evaluations=1, hits=1, total_time_ns=100),
+                get_leaf_stats_key(cheap_filter): RuleFilterLeafStats(evaluations=1, hits=1, total_time_ns=1),
+            }
+        )
+        email_state, _ = inbox_settings.get_email_state_after_filtering(generic_email)
+        assert Tags.TAG_1 in email_state.tags
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0, 1]
+
+        # The profile is serialized along with the rules and still reorders them once validated again
+        validated_settings = EmailAccountSettings.model_validate_json(inbox_settings.model_dump_json())
+        assert validated_settings.rule_filter_profile == inbox_settings.rule_filter_profile
+        validated_settings.get_email_state_after_filtering(generic_email)
+        assert RuleAlwaysTrueAndTrackCalls.calls == [0, 1, 1]
+
+    def test_final_email_state_matches_history(self, generic_email: Email) -> None:
+        inbox_settings = EmailAccountSettings(
+            folders=list(Folders.iterate_values()),
+            tags=list(Tags.iterate_values()),
+            rule_files=[
+                RuleFile(file_name="rule_file_1", rules=[RULE_ADD_TAG_1]),
+                RuleFile(file_name="rule_file_2", rules=[RULE_MOVE_TO_PARENT_1]),
+            ],
+        )
+        email_state, _ = inbox_settings.get_email_state_after_filtering(generic_email)
+        assert inbox_settings.get_final_email_state_after_filtering(generic_email) == email_state
+        assert Tags.TAG_1 in email_state.tags
+        assert email_state.current_folder == Folders.PARENT_1
+
+    def test_rules_modified_in_place_are_applied(self, generic_email: Email) -> None:
+        rule_file = RuleFile(
+            file_name="rule_file_1", rules=[RULE_MOVE_TO_PARENT_1.model_copy(update={"filter_expr": ~ALWAYS_TRUE})]
+        )
+        inbox_settings = EmailAccountSettings(
+            folders=list(Folders.iterate_values()), tags=list(Tags.iterate_values()), rule_files=[rule_file]
+        )
+        assert Tags.TAG_1 not in inbox_settings.get_final_email_state_after_filtering(generic_email).tags
+        assert Tags.TAG_1 not in inbox_settings.get_email_state_after_filtering(generic_email)[0].tags
+
+        rule = Rule(filter_expr=ALWAYS_TRUE & ALWAYS_TRUE, actions=[RuleActionAddTag(tag_to_apply=Tags.TAG_1)])
+        rule_file.rules.append(rule)
+        assert Tags.TAG_1 in inbox_settings.get_final_email_state_after_filtering(generic_email).tags
+        assert Tags.TAG_1 in inbox_settings.get_email_state_after_filtering(generic_email)[0].tags
+
+        assert isinstance(rule.filter_expr, AggregatedRuleFilter)
+        rule.filter_expr.append_arg(~ALWAYS_TRUE)
+        assert Tags.TAG_1 not in inbox_settings.get_final_email_state_after_filtering(generic_email).tags
+        assert Tags.TAG_1 not in inbox_settings.get_email_state_after_filtering(generic_email)[0].tags
+
+    def test_changes_outside_of_the_settings_keep_compiled_rules(self) -> None:
+        shared_rule = Rule(filter_expr=ALWAYS_TRUE, actions=[RuleActionAddTag(tag_to_apply=Tags.TAG_1)])
+        inbox_settings = EmailAccountSettings(
+            folders=list(Folders.iterate_values()),
+            tags=list(Tags.iterate_values()),
+            rule_files=[RuleFile(file_name="rule_file_1", rules=[shared_rule, RULE_MOVE_TO_PARENT_1.model_copy()])],
+        )
+        other_rule = RULE_MOVE_TO_PARENT_1.model_copy()
+        other_inbox_settings = EmailAccountSettings(
+            folders=list(Folders.iterate_values()),
+            tags=list(Tags.iterate_values()),
+            rule_files=[RuleFile(file_name="rule_file_1", rules=[shared_rule, other_rule])],
+        )
+        compiled_rule_files = inbox_settings.compiled_rule_files
+        rule_program = inbox_settings.rule_program
+        other_compiled_rule_files = other_inbox_settings.compiled_rule_files
+
+        other_rule.comment = "Comment"
+        scratch_filter = ALWAYS_TRUE & ALWAYS_TRUE
+        assert isinstance(scratch_filter, AggregatedRuleFilter)
+        scratch_filter.append_arg(ALWAYS_TRUE)
+        assert inbox_settings.compiled_rule_files is compiled_rule_files
+        assert inbox_settings.rule_program is rule_program
+        assert other_inbox_settings.compiled_rule_files is not other_compiled_rule_files
+
+        # Rules can be shared by several settings, which all see the change
+        other_compiled_rule_files = other_inbox_settings.compiled_rule_files
+        shared_rule.actions.append(RuleActionMarkAsRead())
+        assert inbox_settings.compiled_rule_files is not compiled_rule_files
+        assert other_inbox_settings.compiled_rule_files is not other_compiled_rule_files
+
+
+class TestEmailAccountSettingsContentHash:
+    def test_equal_settings_have_equal_hashes(self) -> None:
+        def create_inbox() -> EmailAccountSettings:
+            return EmailAccountSettings(
+                folders=list(Folders.iterate_values()),
+                tags=list(Tags.iterate_values()),
+                rule_files=[RuleFile(file_name="file", rules=[RULE_ADD_TAG_1, RULE_MOVE_TO_PARENT_1])],
+            )
+
+        assert create_inbox().content_hash == create_inbox().content_hash
+
+    def test_hash_changes_with_rules(self) -> None:
+        inbox = EmailAccountSettings(
+            folders=list(Folders.iterate_values()),
+            tags=list(Tags.iterate_values()),
+            rule_files=[RuleFile(file_name="file", rules=[RULE_ADD_TAG_1])],
+        )
+        content_hash = inbox.content_hash
+        inbox.rule_files = [RuleFile(file_name="file", rules=[RULE_MOVE_TO_PARENT_1])]
+        assert inbox.content_hash != content_hash
+
+
+class TestEmailRuleSimulationTrace:
+    def test_print_trace(self, generic_email: Email, capsys: pytest.CaptureFixture[str]) -> None:
+        inbox = EmailAccountSettings(
+            folders=list(Folders.iterate_values()),
+            tags=list(Tags.iterate_values()),
+            rule_files=[
+                RuleFile(
+                    file_name="file",
+                    rules=[Rule(filter_expr=ALWAYS_TRUE, actions=[RuleActionAddTag(tag_to_apply=Tags.TAG_1)])],
+                )
+            ],
+        )
+        simulation = EmailRuleSimulation(inbox, generic_email, trace_verbosity=TraceVerbosity.RULES_MATCHED)
+        simulation.assert_has_tag(Tags.TAG_1)
+        assert isinstance(simulation.email_state_history, RuleApplicationTrace)
+
+        simulation.print_email_state_history()
+        assert capsys.readouterr().out.splitlines()[2:] == [
+            "file",
+            "\tcurrent_rule=<filter_expr=TRUE, actions=[ADD_TAG[TAG_1]]> current_rule_applied=True current_action=None "
+            "interrupt_state=RuleApplicationInterruptState.CONTINUE",
+        ]
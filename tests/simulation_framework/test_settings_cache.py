@@ -0,0 +1,191 @@
+from pathlib import Path, PurePosixPath
+from typing import Callable, ClassVar
+
+import pytest
+
+from email_rules.core import Email, EmailFolder, EmailState, EmailTag
+from email_rules.rules import (
+    AggregatedRuleFilter,
+    CompiledRuleFilter,
+    Rule,
+    RuleAction,
+    RuleActionAddTag,
+    RuleActionMoveToFolder,
+    RuleFilter,
+    RuleFilterCompiler,
+    RuleFromEq,
+    RuleSubjectContains,
+)
+from email_rules.simulation_framework import (
+    EmailAccountSettings,
+    EmailAccountSettingsCache,
+    RuleFile,
+    get_files_content_hash,
+    get_settings_schema_fingerprint,
+)
+
+FOLDER = EmailFolder(PurePosixPath("folder"))
+TAG = EmailTag("TAG")
+
+
+class RuleMatchesPredicate(RuleFilter):
+    predicate: Callable[[Email], bool]
+
+    def evaluate(self, email: Email) -> bool:
+        return self.predicate(email)
+
+
+class RuleFromEqAndTrackCompilations(RuleFromEq):
+    compilations: ClassVar[list[str]] = []
+
+    def compile(self, compiler: RuleFilterCompiler | None = None) -> CompiledRuleFilter:
+        self.compilations.append(self.text)
+        return super().compile(compiler)
+
+
+def create_inbox(filter_expr: RuleFilter) -> EmailAccountSettings:
+    return EmailAccountSettings(
+        folders=[FOLDER],
+        tags=[TAG],
+        rule_files=[
+            RuleFile(
+                file_name="file",
+                rules=[
+                    Rule(filter_expr=filter_expr, actions=[RuleActionAddTag(tag_to_apply=TAG)]),
+                    Rule(
+                        filter_expr=RuleSubjectContains.create("subject", case_sensitive=False),
+                        actions=[RuleActionMoveToFolder(folder=FOLDER)],
+                    ),
+                ],
+            )
+        ],
+    )
+
+
+class TestEmailAccountSettingsCache:
+    def test_save_and_load(self, tmp_path: Path, generic_email: Email) -> None:
+        cache = EmailAccountSettingsCache(tmp_path)
+        inbox = create_inbox(RuleFromEq.create("from@example.com"))
+        expected_email_state = inbox.get_final_email_state_after_filtering(generic_email)
+
+        assert cache.save(inbox)
+        loaded_inbox = cache.load(inbox.content_hash)
+        assert loaded_inbox is not None
+        assert loaded_inbox is not inbox
+        assert loaded_inbox.content_hash == inbox.content_hash
+        assert loaded_inbox.get_final_email_state_after_filtering(generic_email) == expected_email_state
+        assert expected_email_state.tags == {TAG}
+
+    def test_save_and_load_aggregated_filters(self, tmp_path: Path, generic_email: Email) -> None:
+        cache = EmailAccountSettingsCache(tmp_path)
+        inbox = create_inbox(RuleFromEq.create("from@example.com") & ~RuleSubjectContains.create("missing"))
+        assert cache.save(inbox)
+        loaded_inbox = cache.load(inbox.content_hash)
+        assert loaded_inbox is not None
+        assert loaded_inbox.get_final_email_state_after_filtering(
+            generic_email
+        ) == inbox.get_final_email_state_after_filtering(generic_email)
+
+    def test_filters_are_compiled_when_first_evaluated_after_loading(
+        self, tmp_path: Path, generic_email: Email
+    ) -> None:
+        cache = EmailAccountSettingsCache(tmp_path)
+        inbox = create_inbox(RuleFromEqAndTrackCompilations.create("from@example.com"))
+        inbox.rule_files[0].rules.append(
+            Rule(
+                filter_expr=RuleFromEqAndTrackCompilations.create("other@example.com"),
+                actions=[RuleActionMoveToFolder(folder=FOLDER)],
+            )
+        )
+        assert cache.save(inbox, "key")
+
+        RuleFromEqAndTrackCompilations.compilations.clear()
+        loaded_inbox = cache.load("key")
+        assert loaded_inbox is not None
+        assert RuleFromEqAndTrackCompilations.compilations == []
+        email_state = loaded_inbox.get_final_email_state_after_filtering(generic_email)
+        # The rule from other@example.com is not a candidate for the email, so its filter is never compiled
+        assert RuleFromEqAndTrackCompilations.compilations == ["from@example.com"]
+        assert email_state == inbox.get_final_email_state_after_filtering(generic_email)
+
+    def test_rules_modified_in_place_after_loading_are_applied(self, tmp_path: Path, generic_email: Email) -> None:
+        cache = EmailAccountSettingsCache(tmp_path)
+        inbox = create_inbox(RuleFromEq.create("from@example.com") & ~RuleSubjectContains.create("missing"))
+        assert cache.save(inbox, "key")
+        loaded_inbox = cache.load("key")
+        assert loaded_inbox is not None
+        assert loaded_inbox.get_final_email_state_after_filtering(generic_email).tags == {TAG}
+
+        filter_expr = loaded_inbox.rule_files[0].rules[0].filter_expr
+        assert isinstance(filter_expr, AggregatedRuleFilter)
+        filter_expr.append_arg(RuleFromEq.create("other@example.com"))
+        assert loaded_inbox.get_final_email_state_after_filtering(generic_email).tags == frozenset()
+
+    def test_load_missing(self, tmp_path: Path) -> None:
+        assert EmailAccountSettingsCache(tmp_path).load("missing") is None
+
+    def test_load_invalid(self, tmp_path: Path) -> None:
+        cache = EmailAccountSettingsCache(tmp_path)
+        cache.get_path("invalid").write_bytes(b"not a pickle")
+        assert cache.load("invalid") is None
+
+    def test_save_skips_settings_that_cannot_be_pickled(self, tmp_path: Path) -> None:
+        cache = EmailAccountSettingsCache(tmp_path)
+        inbox = create_inbox(RuleMatchesPredicate(predicate=lambda email: True))
+        assert not cache.save(inbox, "key")
+        assert cache.load("key") is None
+
+    def test_load_or_create(self, tmp_path: Path) -> None:
+        cache = EmailAccountSettingsCache(tmp_path)
+        created_inboxes: list[EmailAccountSettings] = []
+
+        def create_inbox_and_track_calls() -> EmailAccountSettings:
+            created_inboxes.append(create_inbox(RuleFromEq.create("from@example.com")))
+            return created_inboxes[-1]
+
+        inbox = cache.load_or_create("key", create_inbox_and_track_calls)
+        assert created_inboxes == [inbox]
+        loaded_inbox = cache.load_or_create("key", create_inbox_and_track_calls)
+        assert len(created_inboxes) == 1
+        assert loaded_inbox.content_hash == inbox.content_hash
+
+
+class TestGetSettingsSchemaFingerprint:
+    def test_changes_with_fields(self, tmp_path: Path) -> None:
+        cache = EmailAccountSettingsCache(tmp_path)
+        assert cache.save(create_inbox(RuleFromEq.create("from@example.com")), "key")
+        fingerprint = get_settings_schema_fingerprint()
+        assert get_settings_schema_fingerprint() == fingerprint
+
+        # Any action can be pickled as part of the settings, so defining a new one changes the fingerprint
+        class RuleActionWithField(RuleAction):
+            field: int
+
+            def apply(self, email_state: EmailState) -> EmailState:
+                return email_state
+
+        assert get_settings_schema_fingerprint() != fingerprint
+        assert cache.load("key") is None
+
+    def test_files_written_before_a_field_was_added_are_not_loaded(
+        self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        cache = EmailAccountSettingsCache(tmp_path)
+        inbox = create_inbox(RuleFromEq.create("from@example.com"))
+        # As if the settings were saved by a version without the field
+        with monkeypatch.context() as patch:
+            patch.delitem(EmailAccountSettings.__pydantic_fields__, "email_state_cache_size")
+            assert cache.save(inbox, "key")
+            assert cache.load("key") is not None
+        assert cache.load("key") is None
+
+
+class TestGetFilesContentHash:
+    def test_changes_with_content(self, tmp_path: Path) -> None:
+        path = tmp_path / "rules.py"
+        path.write_text("rules = []")
+        content_hash = get_files_content_hash([path])
+        assert get_files_content_hash([path]) == content_hash
+
+        path.write_text("rules = [1]")
+        assert get_files_content_hash([path]) != content_hash